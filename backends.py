@@ -0,0 +1,92 @@
+"""Board backends that perft, search and UCI can run on.
+
+A backend is a namespace holding the same set of functions for one board
+representation, so callers pick it by name and the rest of their code stays
+the same. Moves are shared between backends, a move generated on one can be
+played on the mailbox Board the engine keeps for the game.
+
+The mailbox backend is the default and currently the faster one, the bitboard
+backend is kept for cross-checking move generation (see README.md).
+"""
+from types import SimpleNamespace
+
+BACKEND_NAMES = ('mailbox', 'bitboard')
+DEFAULT_BACKEND = 'mailbox'
+
+
+def get_backend(name: str = DEFAULT_BACKEND) -> SimpleNamespace:
+    """Return the functions of a backend by name.
+
+    from_board(board) converts the mailbox Board of the game into a position of
+    this backend, the mailbox backend uses the board itself.
+    generate_legal_moves(position, buffer) fills a move buffer and returns the
+    count, generate_legal_captures(position, buffer) does the same for captures
+    and promotions only, legal_moves(position) returns a list for code off the
+    hot path.
+    MovePicker() hands out the legal moves of a position one at a time in search order.
+    see(position, move) is the static exchange evaluation of a capture.
+    make_null_move(position) passes the turn and unmake_null_move(position) takes it back,
+    has_non_pawn_material(position, side) tells whether side has more than king and pawns.
+    piece_count(position) counts the pieces and piece_squares(position) lists (piece, square 0-63)
+    of every one, for the endgame bitbases.
+    """
+    if name == 'mailbox':
+        from board import Board
+        from fen import fen_to_board
+        from move_gen import generate_legal_moves, generate_legal_captures, legal_moves, in_check, piece_at, MovePicker
+        from move_gen import has_non_pawn_material, piece_count, piece_squares
+        from make_move import make_move, unmake_move, make_null_move, unmake_null_move
+        from eval import evaluate
+        from see import see
+        from perft import perft
+
+        def from_fen(fen: str) -> Board:
+            board = Board()
+            fen_to_board(board, fen)
+            return board
+
+        return SimpleNamespace(
+            name=name,
+            from_board=lambda board: board,
+            from_fen=from_fen,
+            generate_legal_moves=generate_legal_moves,
+            generate_legal_captures=generate_legal_captures,
+            legal_moves=legal_moves,
+            MovePicker=MovePicker,
+            make_move=make_move,
+            unmake_move=unmake_move,
+            make_null_move=make_null_move,
+            unmake_null_move=unmake_null_move,
+            has_non_pawn_material=has_non_pawn_material,
+            piece_count=piece_count,
+            piece_squares=piece_squares,
+            in_check=in_check,
+            piece_at=piece_at,
+            see=see,
+            evaluate=evaluate,
+            perft=perft,
+        )
+    if name == 'bitboard':
+        import bitboard
+        return SimpleNamespace(
+            name=name,
+            from_board=bitboard.from_board,
+            from_fen=bitboard.from_fen,
+            generate_legal_moves=bitboard.generate_legal_moves,
+            generate_legal_captures=bitboard.generate_legal_captures,
+            legal_moves=bitboard.legal_moves,
+            MovePicker=bitboard.MovePicker,
+            make_move=bitboard.make_move,
+            unmake_move=bitboard.unmake_move,
+            make_null_move=bitboard.make_null_move,
+            unmake_null_move=bitboard.unmake_null_move,
+            has_non_pawn_material=bitboard.has_non_pawn_material,
+            piece_count=bitboard.piece_count,
+            piece_squares=bitboard.piece_squares,
+            in_check=bitboard.in_check,
+            piece_at=bitboard.piece_at,
+            see=bitboard.see,
+            evaluate=bitboard.evaluate,
+            perft=bitboard.perft,
+        )
+    raise ValueError(f"Unknown backend {name!r}, expected one of {', '.join(BACKEND_NAMES)}")
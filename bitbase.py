@@ -0,0 +1,387 @@
+"""Endgame bitbases: king and pawn, king and rook, king and queen against a lone king.
+
+The tables are made by retrograde analysis. Every position is classified once
+(illegal, checkmate, or how many moves the lone king has), then the wins are
+spread backwards: a position White can move into a lost one from is won, a
+position with Black to move is lost once every one of its king moves leads
+to a won one. Level by level this gives the distance to mate in plies.
+
+A king and pawn win ends in a promotion the other two tables call won, so
+they are generated first, and its distance counts the plies to that
+promotion (or to mate, rarely) instead. Playing the move with the shortest
+distance always makes progress, where a bare won/drawn bit lets the winning
+side shuffle its king into a repetition.
+
+Each file packs FIELD_BITS[table] bits per position: plies + 1 of White's
+wins, 0 for draws (stalemates and the piece falling) and illegal positions.
+
+Positions are indexed side to move << 18 | white king << 12 | black king << 6
+| piece, squares 0-63 from a8, White always the side with the piece. The
+classification runs one white king square per task across worker processes,
+and the result does not depend on how the work was split, so the files always
+hash to TABLE_SHA256. Bitbases.prepare() writes them to a cache directory
+if they are not there yet and maps them, usually on a background thread
+(Bitbases.start()) so no search waits for them.
+
+    python bitbase.py --jobs 4
+"""
+import hashlib
+import mmap
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from constants import PAWN, ROOK, QUEEN, KING
+
+WHITE, BLACK = 0, 1
+WIN, DRAW, LOSS = 1, 0, -1 #Probe results for the side to move
+
+TABLES = ('kqk', 'krk', 'kpk') #In generation order, kpk promotes into the other two
+TABLE_PIECES = {'kqk': QUEEN, 'krk': ROOK, 'kpk': PAWN}
+FIELD_BITS = {'kqk': 5, 'krk': 6, 'kpk': 6} #Longest wins: mate in 20 and 32 plies, promotion in 38
+PIECE_TABLES = {piece: kind for kind, piece in TABLE_PIECES.items()}
+POSITIONS = 2 << 18
+MAX_PIECES = 3 #Kings included, positions with more are in no table
+INVALID = 255 #Move count of positions that cannot occur
+CACHE_DIR_ENV = 'SCE_BITBASE_DIR'
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'sce', 'bitbases')
+TABLE_SHA256 = {
+    'kqk': 'a4e56ddaf7282dd9d94f8e0fb71ad2cb1b9b0411da62fb4106d6b9d35f11bc8d',
+    'krk': '0ea7a4595eff765204253b07b2b118a679be6b6e711319cc06fefa67c8b7e6c0',
+    'kpk': '684addfa2a56cba7f0b854d0508d808ab811b4c55492d84d93ca1a543c887492',
+}
+
+
+def _king_moves(sq: int) -> tuple:
+    row, col = divmod(sq, 8)
+    return tuple(target for target in range(64)
+                 if target != sq and abs(target // 8 - row) <= 1 and abs(target % 8 - col) <= 1)
+
+
+def _rays(directions: tuple) -> list:
+    """Squares a slider on each square reaches in each direction, nearest first."""
+    rays = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        square_rays = []
+        for row_step, col_step in directions:
+            ray = []
+            r, c = row + row_step, col + col_step
+            while 0 <= r < 8 and 0 <= c < 8:
+                ray.append(r * 8 + c)
+                r, c = r + row_step, c + col_step
+            square_rays.append(tuple(ray))
+        rays.append(tuple(square_rays))
+    return rays
+
+
+def _slider_paths(rays: list) -> list:
+    """paths[piece << 6 | target], mask of the squares between that must be empty for an attack, -1 for none."""
+    paths = [-1] * 4096
+    for sq in range(64):
+        for ray in rays[sq]:
+            between = 0
+            for target in ray:
+                paths[sq << 6 | target] = between
+                between |= 1 << target
+    return paths
+
+
+def _pawn_paths() -> list:
+    """The same for a white pawn, its two diagonal captures."""
+    paths = [-1] * 4096
+    for sq in range(8, 56):
+        if sq % 8:
+            paths[sq << 6 | sq - 9] = 0
+        if sq % 8 != 7:
+            paths[sq << 6 | sq - 7] = 0
+    return paths
+
+
+ROOK_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + ((-1, -1), (-1, 1), (1, -1), (1, 1))
+KING_MOVES = [_king_moves(sq) for sq in range(64)]
+KING_MASKS = [sum(1 << target for target in moves) for moves in KING_MOVES]
+RAYS = {ROOK: _rays(ROOK_DIRECTIONS), QUEEN: _rays(QUEEN_DIRECTIONS)}
+ATTACK_PATHS = {ROOK: _slider_paths(RAYS[ROOK]), QUEEN: _slider_paths(RAYS[QUEEN]), PAWN: _pawn_paths()}
+
+
+def table_path(directory: str, kind: str) -> str:
+    return os.path.join(directory, kind + '.bin')
+
+
+def _open(directory: str, kind: str) -> mmap.mmap:
+    with open(table_path(directory, kind), 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _read(table, bits: int, i: int) -> int:
+    """Field i of a packed table, it lies in two bytes at most."""
+    offset = i * bits
+    byte = offset >> 3
+    return (table[byte] | table[byte + 1] << 8) >> (offset & 7) & ((1 << bits) - 1)
+
+
+def _pack(values: bytearray, bits: int) -> bytes:
+    """values as bits wide fields, with a spare byte at the end so _read never runs past it."""
+    packed = bytearray((len(values) * bits + 7) // 8 + 1)
+    offset = 0
+    for value in values:
+        if value:
+            field = value << (offset & 7)
+            packed[offset >> 3] |= field & 255
+            packed[(offset >> 3) + 1] |= field >> 8
+        offset += bits
+    return bytes(packed)
+
+
+def _classify(kind: str, wk: int, directory: str = None) -> tuple:
+    """Positions with the white king on wk: (White to move counts, Black to move counts, mates, promotion wins).
+
+    A count is INVALID for positions that cannot occur, else for Black to move
+    the number of king moves Black has (0 for White to move). Mates and wins are
+    position indexes, wins are king and pawn positions where White promotes to a
+    won queen or rook ending, looked up in the tables in directory.
+    """
+    piece = TABLE_PIECES[kind]
+    paths = ATTACK_PATHS[piece]
+    near_king = KING_MASKS[wk]
+    blockers = 1 << wk #The black king moves off its square, only the white one blocks the piece
+    promotion_tables = [(name, _open(directory, name)) for name in ('kqk', 'krk')] if piece == PAWN else []
+    white_counts = bytearray(4096)
+    black_counts = bytearray(4096)
+    mates = []
+    wins = []
+    for bk in range(64):
+        for p in range(64):
+            i = bk << 6 | p
+            if (bk == wk or p == wk or p == bk or near_king >> bk & 1
+                    or (piece == PAWN and not 8 <= p < 56)):
+                white_counts[i] = black_counts[i] = INVALID
+                continue
+            path = paths[p << 6 | bk]
+            in_check = path >= 0 and not path & blockers
+            if in_check:
+                white_counts[i] = INVALID #Black cannot be in check with White to move
+            elif p < 16 and piece == PAWN and p - 8 != wk and p - 8 != bk:
+                promoted = BLACK << 18 | wk << 12 | bk << 6 | p - 8
+                if any(_read(table, FIELD_BITS[name], promoted) for name, table in promotion_tables):
+                    wins.append(wk << 12 | i)
+            #Black king moves, taking the piece when the white king does not guard it
+            moves = 0
+            for target in KING_MOVES[bk]:
+                if near_king >> target & 1:
+                    continue
+                if target != p:
+                    path = paths[p << 6 | target]
+                    if path >= 0 and not path & blockers:
+                        continue
+                moves += 1
+            black_counts[i] = moves
+            if not moves and in_check:
+                mates.append(BLACK << 18 | wk << 12 | i)
+    for _, table in promotion_tables:
+        table.close()
+    return bytes(white_counts), bytes(black_counts), mates, wins
+
+
+def generate(kind: str, directory: str = None, jobs: int = 1) -> bytes:
+    """Retrograde analysis of one table, returns the contents of its file.
+
+    kpk needs kqk and krk in directory. jobs > 1 classifies the positions in that many processes.
+    """
+    piece = TABLE_PIECES[kind]
+    kinds = [kind] * 64
+    directories = [directory] * 64
+    if jobs > 1:
+        with ProcessPoolExecutor(jobs) as pool:
+            chunks = list(pool.map(_classify, kinds, range(64), directories))
+    else:
+        chunks = list(map(_classify, kinds, range(64), directories))
+
+    counts = bytearray(POSITIONS)
+    distance = bytearray(POSITIONS) #Plies to the win + 1 of White's wins, 0 while not known to be won
+    lost = [] #Black to move positions lost in the current number of plies
+    won = []  #White to move positions won in one ply more
+    for wk, (white_counts, black_counts, mates, wins) in enumerate(chunks):
+        counts[wk << 12:(wk + 1) << 12] = white_counts
+        counts[BLACK << 18 | wk << 12:BLACK << 18 | (wk + 1) << 12] = black_counts
+        lost += mates
+        won += wins
+    for i in lost:
+        distance[i] = 1
+    for i in won:
+        distance[i] = 2
+
+    rays = RAYS.get(piece)
+    plies = 0
+    while lost or won:
+        #White moves into a lost position: un-move the white king or the piece
+        for i in lost:
+            wk, bk, p = i >> 12 & 63, i >> 6 & 63, i & 63
+            rest = bk << 6 | p
+            predecessors = [s << 12 | rest for s in KING_MOVES[wk]]
+            occupied = 1 << wk | 1 << bk
+            if piece == PAWN:
+                s = p + 8
+                if s < 56 and not occupied >> s & 1:
+                    predecessors.append(wk << 12 | bk << 6 | s)
+                    if p >> 3 == 4 and not occupied >> s + 8 & 1:
+                        predecessors.append(wk << 12 | bk << 6 | s + 8)
+            else:
+                for ray in rays[p]:
+                    for s in ray:
+                        if occupied >> s & 1:
+                            break
+                        predecessors.append(wk << 12 | bk << 6 | s)
+            for j in predecessors:
+                if counts[j] != INVALID and not distance[j]:
+                    distance[j] = plies + 2
+                    won.append(j)
+        lost = []
+        #Black king moves into a won position, the last of them loses
+        for i in won:
+            rest = BLACK << 18 | (i & 0o770077)
+            for s in KING_MOVES[i >> 6 & 63]:
+                j = rest | s << 6
+                if counts[j] != INVALID and not distance[j]:
+                    counts[j] -= 1
+                    if not counts[j]:
+                        distance[j] = plies + 3
+                        lost.append(j)
+        won = []
+        plies += 2
+
+    return _pack(distance, FIELD_BITS[kind])
+
+
+def file_digest(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def verify(directory: str) -> dict:
+    """{table: does its file exist with the expected hash}."""
+    return {kind: os.path.exists(table_path(directory, kind))
+                  and file_digest(table_path(directory, kind)) == TABLE_SHA256[kind] for kind in TABLES}
+
+
+def ensure_tables(directory: str, jobs: int = None) -> list:
+    """Generate the tables of directory that are missing or do not match their hash, returns their names."""
+    os.makedirs(directory, exist_ok=True)
+    jobs = jobs or os.cpu_count() or 1
+    made = []
+    for kind, valid in verify(directory).items():
+        if valid:
+            continue
+        data = generate(kind, directory, jobs)
+        #Written aside and renamed so another process never maps half a file
+        temporary = f"{table_path(directory, kind)}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, table_path(directory, kind))
+        made.append(kind)
+    return made
+
+
+class Bitbases:
+    """The tables of a cache directory, read through mmap.
+
+    directory defaults to $SCE_BITBASE_DIR, else DEFAULT_CACHE_DIR. Probes find
+    nothing until prepare() or map_files() has run, a search never waits for
+    the tables to be generated.
+    """
+
+    def __init__(self, directory: str = None, jobs: int = None):
+        self.directory = directory or os.environ.get(CACHE_DIR_ENV) or DEFAULT_CACHE_DIR
+        self.jobs = jobs
+        self.tables = {}
+        self.thread = None
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.tables)
+
+    def map_files(self):
+        """Map the files as they are, for processes whose parent has prepared them."""
+        self.tables = {kind: _open(self.directory, kind) for kind in TABLES}
+
+    def prepare(self):
+        """Generate the tables that are missing or fail their hash, then map them."""
+        if not self.tables:
+            ensure_tables(self.directory, self.jobs)
+            self.map_files()
+
+    def start(self):
+        """prepare() on a background thread, unless it already ran or is running."""
+        if self.thread is None and not self.tables:
+            self.thread = threading.Thread(target=self._prepare_quietly, daemon=True)
+            self.thread.start()
+
+    def _prepare_quietly(self):
+        try:
+            self.prepare()
+        except OSError:
+            pass #No cache directory to write to, the search goes on without the tables
+
+    def probe(self, pieces: list, side_to_move: int):
+        """(WIN, DRAW or LOSS for the side to move, plies, mate) of a position, None if no table has it.
+
+        pieces is [(piece code, square 0-63), ...] of every piece on the board.
+        plies is the distance of a win or loss, to mate when mate is True and to
+        the promotion in king and pawn endings. Kings alone or with a knight or
+        bishop are drawn without a table. Nothing is found before the tables are ready.
+        """
+        tables = self.tables
+        if not tables:
+            return None
+        if len(pieces) == 2:
+            return DRAW, 0, False
+        if len(pieces) != 3:
+            return None
+        for piece, square in pieces:
+            if piece & 7 == KING:
+                if piece >> 3:
+                    black_king = square
+                else:
+                    white_king = square
+            else:
+                other, piece_square = piece, square
+        kind = PIECE_TABLES.get(other & 7)
+        if kind is None:
+            return DRAW, 0, False
+        strong = other >> 3
+        if strong:
+            #Black has the piece, the tables hold the position flipped with the colours swapped
+            wk, bk, p = black_king ^ 56, white_king ^ 56, piece_square ^ 56
+        else:
+            wk, bk, p = white_king, black_king, piece_square
+        stm = side_to_move ^ strong
+        value = _read(tables[kind], FIELD_BITS[kind], stm << 18 | wk << 12 | bk << 6 | p)
+        if not value:
+            return DRAW, 0, False
+        return (LOSS if stm else WIN), value - 1, kind != 'kpk'
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        self.tables = {}
+
+
+def main(argv: list = None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="Generate the endgame bitbases and check them against their hashes")
+    parser.add_argument("--dir", default=os.environ.get(CACHE_DIR_ENV) or DEFAULT_CACHE_DIR)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+    start = time.monotonic()
+    made = ensure_tables(args.dir, args.jobs)
+    print(f"Generated {', '.join(made) or 'nothing'} in {time.monotonic() - start:.1f}s, {args.jobs} jobs")
+    for kind in TABLES:
+        print(f"  {table_path(args.dir, kind)} {file_digest(table_path(args.dir, kind))}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,892 @@
+"""Bitboard position backend for SCE.
+
+Squares use the same 0..63 numbering as Board.mailbox64 (a8 = 0, h1 = 63) and
+bit n of a bitboard stands for square n. Moves use the packed encoding
+of move_encoding.py, whose squares are these same 64 indices, so moves,
+perft divides and search results can be compared one to one between the two
+backends.
+
+Slider attacks come from per-square lookup tables indexed by the relevant
+occupancy of the rank, the file or the two diagonals through the square.
+In Python a dict lookup on the masked occupancy does the job of the magic
+multiply, so there are no magic numbers to search for at import time.
+"""
+from board import Board, UNDO_STACK_SIZE
+from constants import NUM_PIECE_CODES, CASTLE_WK, CASTLE_WQ, CASTLE_BK, CASTLE_BQ
+from constants import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+from constants import WP, WN, WB, WR, WQ, WK, BP, BN, BB, BR, BQ, BK
+from constants import DOUBLE_PUSH, CASTLE_SHORT, CASTLE_LONG, CAPTURE, EN_PASSANT
+from constants import PROMO_N, PROMO_B, PROMO_R, PROMO_Q, PROMO_FLAG, PIECE_VALUES, BAD_CAPTURE_SEE
+from eval import MG_TABLE, EG_TABLE, PHASE_INC, taper
+from fen import fen_to_board
+from move_encoding import new_move_buffer, NULL_MOVE
+from perft_table import PerftTable, hashed_perft
+from zobrist import PIECE_KEYS, SIDE_KEY, CASTLE_HASH, EN_PASSANT_KEYS
+
+FULL = (1 << 64) - 1
+BITS = [1 << sq for sq in range(64)] #Single square bitboards, cheaper to look up than to shift
+
+#Square conversion between the 64 and 120 layouts
+SQ120 = [21 + (sq >> 3) * 10 + (sq & 7) for sq in range(64)]
+SQ64 = [-1] * 120
+for _sq in range(64):
+    SQ64[SQ120[_sq]] = _sq
+
+FILE_A = sum(1 << (row * 8) for row in range(8))
+FILE_H = FILE_A << 7
+ROW_BBS = [0xFF << (row * 8) for row in range(8)] #row 0 is rank 8, row 7 is rank 1
+FILE_BBS = [FILE_A << file for file in range(8)]
+
+#Castling rights that survive a move touching each square
+CASTLE_MASK = [15] * 64
+CASTLE_MASK[60] = 15 & ~(CASTLE_WK | CASTLE_WQ) #e1
+CASTLE_MASK[63] = 15 & ~CASTLE_WK               #h1
+CASTLE_MASK[56] = 15 & ~CASTLE_WQ               #a1
+CASTLE_MASK[4] = 15 & ~(CASTLE_BK | CASTLE_BQ)  #e8
+CASTLE_MASK[7] = 15 & ~CASTLE_BK                #h8
+CASTLE_MASK[0] = 15 & ~CASTLE_BQ                #a8
+
+#Zobrist keys re-indexed for 64 squares, these give the same key as the
+#mailbox board for the same position
+PIECE_KEYS64 = [[keys[SQ120[sq]] for sq in range(64)] for keys in PIECE_KEYS]
+
+
+def _step(sq: int, df: int, dr: int) -> int:
+    """Square reached from sq by (file, row) delta, or -1 when off the board."""
+    file = (sq & 7) + df
+    row = (sq >> 3) + dr
+    if 0 <= file < 8 and 0 <= row < 8:
+        return row * 8 + file
+    return -1
+
+
+def _jumps(sq: int, deltas) -> int:
+    bb = 0
+    for df, dr in deltas:
+        target = _step(sq, df, dr)
+        if target != -1:
+            bb |= 1 << target
+    return bb
+
+
+def _slide(sq: int, occupied: int, deltas) -> int:
+    bb = 0
+    for df, dr in deltas:
+        target = _step(sq, df, dr)
+        while target != -1:
+            bb |= 1 << target
+            if occupied & (1 << target):
+                break
+            target = _step(target, df, dr)
+    return bb
+
+
+KNIGHT_DELTAS = [(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)]
+KING_DELTAS = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+RANK_DELTAS = [(1, 0), (-1, 0)]
+FILE_DELTAS = [(0, 1), (0, -1)]
+DIAG_DELTAS = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+KNIGHT_ATTACKS = [_jumps(sq, KNIGHT_DELTAS) for sq in range(64)]
+KING_ATTACKS = [_jumps(sq, KING_DELTAS) for sq in range(64)]
+#PAWN_ATTACKS[side][sq] - squares a pawn of that side on sq attacks (white moves towards row 0)
+PAWN_ATTACKS = [
+    [_jumps(sq, [(-1, -1), (1, -1)]) for sq in range(64)],
+    [_jumps(sq, [(-1, 1), (1, 1)]) for sq in range(64)],
+]
+
+
+def _edges(sq: int) -> int:
+    """Edge squares that can never block a slider standing on sq."""
+    rows = (ROW_BBS[0] | ROW_BBS[7]) & ~ROW_BBS[sq >> 3]
+    files = (FILE_BBS[0] | FILE_BBS[7]) & ~FILE_BBS[sq & 7]
+    return rows | files
+
+
+def _line_tables(deltas):
+    """Relevant-occupancy masks and {masked occupancy: attacks} tables per square."""
+    masks = []
+    tables = []
+    for sq in range(64):
+        mask = _slide(sq, 0, deltas) & ~_edges(sq)
+        table = {}
+        subset = 0
+        while True:
+            table[subset] = _slide(sq, subset, deltas)
+            subset = (subset - mask) & mask #Carry-rippler walk over all subsets of the mask
+            if subset == 0:
+                break
+        masks.append(mask)
+        tables.append(table)
+    return masks, tables
+
+
+RANK_MASKS, RANK_ATTACKS = _line_tables(RANK_DELTAS)
+FILE_MASKS, FILE_ATTACKS = _line_tables(FILE_DELTAS)
+DIAG_MASKS, DIAG_ATTACKS = _line_tables(DIAG_DELTAS)
+
+#Empty board slider rays, used to find pinning pieces
+ROOK_RAYS = [_slide(sq, 0, RANK_DELTAS + FILE_DELTAS) for sq in range(64)]
+BISHOP_RAYS = [_slide(sq, 0, DIAG_DELTAS) for sq in range(64)]
+
+#BETWEEN[a][b] - squares strictly between two aligned squares
+#LINE[a][b] - the whole line through two aligned squares (0 when not aligned)
+BETWEEN = [[0] * 64 for _ in range(64)]
+LINE = [[0] * 64 for _ in range(64)]
+for _a in range(64):
+    for _df, _dr in KING_DELTAS:
+        _full = (1 << _a) | _slide(_a, 0, [(_df, _dr), (-_df, -_dr)])
+        _walked = 0
+        _b = _step(_a, _df, _dr)
+        while _b != -1:
+            BETWEEN[_a][_b] = _walked
+            LINE[_a][_b] = _full
+            _walked |= 1 << _b
+            _b = _step(_b, _df, _dr)
+
+
+def bishop_attacks(sq: int, occupied: int) -> int:
+    return DIAG_ATTACKS[sq][occupied & DIAG_MASKS[sq]]
+
+
+def rook_attacks(sq: int, occupied: int) -> int:
+    return RANK_ATTACKS[sq][occupied & RANK_MASKS[sq]] | FILE_ATTACKS[sq][occupied & FILE_MASKS[sq]]
+
+
+def queen_attacks(sq: int, occupied: int) -> int:
+    return bishop_attacks(sq, occupied) | rook_attacks(sq, occupied)
+
+
+class BitBoard:
+    """Position stored as one bitboard per piece code plus colour occupancy."""
+
+    __slots__ = (
+        'pieces', 'occupancy', 'squares', 'side_to_move', 'castling', 'ep_square',
+        'half_move_counter', 'full_move_counter', 'hash_key', 'mg_score', 'eg_score', 'phase',
+        'ply', 'undo_hash', 'undo_state',
+    )
+
+    def __init__(self):
+        self.pieces = [0] * NUM_PIECE_CODES #bitboard per piece code
+        self.occupancy = [0, 0]             #white, black
+        self.squares = bytearray(64)        #piece code on each square for capture lookups
+
+        self.side_to_move = 0
+        self.castling = 0                   #CASTLE_* bits
+        self.ep_square = -1                 #64-square en passant target or -1
+        self.half_move_counter = 0
+        self.full_move_counter = 1
+        self.hash_key = 0
+        self.mg_score = 0                   #Running eval sums, see eval.py
+        self.eg_score = 0
+        self.phase = 0
+
+        #Undo stack: the keys on their own for the repetition checks, like Board, and the rest of each
+        #ply packed in one (move, captured, castling, ep_square, half_move_counter, mg, eg, phase) tuple.
+        #One tuple is cheaper to push and pop than eight parallel arrays
+        self.ply = 0
+        self.undo_hash = [0] * UNDO_STACK_SIZE
+        self.undo_state = [None] * UNDO_STACK_SIZE
+
+    def grow_undo_stack(self):
+        """Double the undo stack when a long game fills it."""
+        self.undo_hash.extend([0] * len(self.undo_hash))
+        self.undo_state.extend([None] * len(self.undo_state))
+
+    def set_key_history(self, keys):
+        """Put the keys of the positions before this one on the undo stack.
+
+        They are there for repetition checks only, the moves that led to them cannot be unmade.
+        """
+        while len(self.undo_hash) <= len(keys):
+            self.grow_undo_stack()
+        self.undo_hash[:len(keys)] = keys
+        self.ply = len(keys)
+
+
+def from_board(board: Board) -> BitBoard:
+    """Build a bitboard position from a mailbox Board."""
+    pos = BitBoard()
+    for sq in range(64):
+        piece = board.board_play[SQ120[sq]]
+        if piece:
+            bit = 1 << sq
+            pos.pieces[piece] |= bit
+            pos.occupancy[piece >> 3] |= bit
+            pos.squares[sq] = piece
+    pos.side_to_move = board.side_to_move
+    pos.castling = board.castling
+    pos.ep_square = SQ64[board.ep_square] if board.ep_square != -1 else -1
+    pos.half_move_counter = board.half_move_counter
+    pos.full_move_counter = board.full_move_counter
+    pos.hash_key = board.hash_key
+    pos.mg_score = board.mg_score
+    pos.eg_score = board.eg_score
+    pos.phase = board.phase
+    #The game so far, for repetition checks
+    pos.set_key_history(board.undo_hash[:board.ply])
+    return pos
+
+
+def from_fen(fen: str) -> BitBoard:
+    """Parse a FEN into a bitboard position."""
+    board = Board()
+    fen_to_board(board, fen)
+    return from_board(board)
+
+
+def compute_hash(pos: BitBoard) -> int:
+    """Compute the Zobrist key of a bitboard position from scratch."""
+    key = 0
+    for sq in range(64):
+        piece = pos.squares[sq]
+        if piece:
+            key ^= PIECE_KEYS64[piece][sq]
+    if pos.side_to_move == 1:
+        key ^= SIDE_KEY
+    key ^= CASTLE_HASH[pos.castling]
+    if pos.ep_square != -1:
+        key ^= EN_PASSANT_KEYS[pos.ep_square & 7]
+    return key
+
+
+def attackers_to(pos: BitBoard, sq: int, occupied: int) -> int:
+    """All pieces of both sides attacking sq with the given occupancy."""
+    pieces = pos.pieces
+    queens = pieces[WQ] | pieces[BQ]
+    bishops = pieces[WB] | pieces[BB] | queens
+    rooks = pieces[WR] | pieces[BR] | queens
+    return (
+        (PAWN_ATTACKS[1][sq] & pieces[WP])
+        | (PAWN_ATTACKS[0][sq] & pieces[BP])
+        | (KNIGHT_ATTACKS[sq] & (pieces[WN] | pieces[BN]))
+        | (KING_ATTACKS[sq] & (pieces[WK] | pieces[BK]))
+        | (bishop_attacks(sq, occupied) & bishops)
+        | (rook_attacks(sq, occupied) & rooks)
+    )
+
+
+def is_square_attacked(pos: BitBoard, sq: int, side: int) -> bool:
+    """Check if a 64-square is attacked by the GIVEN side."""
+    occupied = pos.occupancy[0] | pos.occupancy[1]
+    return bool(attackers_to(pos, sq, occupied) & pos.occupancy[side])
+
+
+def in_check(pos: BitBoard) -> bool:
+    """Is the side to move in check."""
+    side = pos.side_to_move
+    ksq = pos.pieces[(side << 3) | KING].bit_length() - 1
+    return is_square_attacked(pos, ksq, 1 - side)
+
+
+def compute_eval(pos: BitBoard) -> tuple:
+    """Full recompute of (mg_score, eg_score, phase), same as eval.compute_eval."""
+    mg = eg = phase = 0
+    for piece, bb in enumerate(pos.pieces):
+        while bb:
+            bit = bb & -bb
+            bb ^= bit
+            sq = bit.bit_length() - 1
+            mg += MG_TABLE[piece][sq]
+            eg += EG_TABLE[piece][sq]
+            phase += PHASE_INC[piece]
+    return mg, eg, phase
+
+
+def evaluate(pos: BitBoard) -> int:
+    """Tapered evaluation from White's point of view, same as eval.evaluate."""
+    return taper(pos.mg_score, pos.eg_score, pos.phase)
+
+
+def verify_eval(pos: BitBoard):
+    """Raise AssertionError if the incremental sums drifted from a full recompute."""
+    if (pos.mg_score, pos.eg_score, pos.phase) != compute_eval(pos):
+        raise AssertionError("Incremental eval mismatch in bitboard position")
+
+
+#The from and to squares of a move (move & 4095) as one bitboard, and the key and eval changes of
+#each piece code going between them, so make_move looks each up once instead of twice
+MOVE_BITS = [BITS[ft & 63] | BITS[ft >> 6] for ft in range(4096)]
+MOVE_KEYS = [[keys[ft & 63] ^ keys[ft >> 6] for ft in range(4096)] if any(keys) else None for keys in PIECE_KEYS64]
+MOVE_MG = [[table[ft >> 6] - table[ft & 63] for ft in range(4096)] if any(table) else None for table in MG_TABLE]
+MOVE_EG = [[table[ft >> 6] - table[ft & 63] for ft in range(4096)] if any(table) else None for table in EG_TABLE]
+
+CAPTURE_BITS = CAPTURE << 12
+PROMO_BITS = (PROMO_Q << 12, PROMO_R << 12, PROMO_B << 12, PROMO_N << 12)
+WHITE_CASTLE_SHORT = 60 | (62 << 6) | (CASTLE_SHORT << 12)
+WHITE_CASTLE_LONG = 60 | (58 << 6) | (CASTLE_LONG << 12)
+BLACK_CASTLE_SHORT = 4 | (6 << 6) | (CASTLE_SHORT << 12)
+BLACK_CASTLE_LONG = 4 | (2 << 6) | (CASTLE_LONG << 12)
+
+
+def generate_legal_moves(pos: BitBoard, buffer, captures_only: bool = False) -> int:
+    """Generate only legal moves into buffer using check and pin information, returns the count.
+
+    With captures_only just captures and promotions are generated (for quiescence search).
+    """
+    us = pos.side_to_move
+    them = 1 - us
+    base = us << 3
+    pieces = pos.pieces
+    occ_us = pos.occupancy[us]
+    occ_them = pos.occupancy[them]
+    occupied = occ_us | occ_them
+    empty = ~occupied & FULL
+    n = 0
+
+    king_bb = pieces[base | KING]
+    ksq = king_bb.bit_length() - 1
+    checkers = attackers_to(pos, ksq, occupied) & occ_them
+
+    #King moves, the king is taken off the board so it cannot hide behind itself. Only their
+    #pieces are looked up for each target, not every attacker of both sides
+    targets = KING_ATTACKS[ksq] & (occ_them if captures_only else ~occ_us)
+    if targets:
+        their = them << 3
+        no_king = occupied ^ king_bb
+        queens = pieces[their | QUEEN]
+        diagonal = pieces[their | BISHOP] | queens
+        straight = pieces[their | ROOK] | queens
+        knights = pieces[their | KNIGHT]
+        their_pawns = pieces[their | PAWN]
+        their_king = pieces[their | KING]
+        pawn_attacks = PAWN_ATTACKS[us]
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            to = bit.bit_length() - 1
+            if (KNIGHT_ATTACKS[to] & knights or pawn_attacks[to] & their_pawns or KING_ATTACKS[to] & their_king
+                    or bishop_attacks(to, no_king) & diagonal or rook_attacks(to, no_king) & straight):
+                continue
+            buffer[n] = ksq | (to << 6) | (CAPTURE_BITS if bit & occ_them else 0)
+            n += 1
+
+    if checkers & (checkers - 1):
+        return n #Double check - only the king can move
+
+    if checkers:
+        csq = checkers.bit_length() - 1
+        target_mask = BETWEEN[ksq][csq] | checkers
+    else:
+        target_mask = ~occ_us & FULL
+    push_mask = target_mask #Pawn pushes, cut down to promotions below when captures_only
+    if captures_only:
+        target_mask &= occ_them
+    elif not checkers:
+        #Castling, the king may not be in, pass through or land in check
+        if us == 0:
+            if pos.castling & CASTLE_WK and not occupied & 0x6000000000000000:
+                if not (attackers_to(pos, 61, occupied) & occ_them) and not (attackers_to(pos, 62, occupied) & occ_them):
+                    buffer[n] = WHITE_CASTLE_SHORT
+                    n += 1
+            if pos.castling & CASTLE_WQ and not occupied & 0x0E00000000000000:
+                if not (attackers_to(pos, 59, occupied) & occ_them) and not (attackers_to(pos, 58, occupied) & occ_them):
+                    buffer[n] = WHITE_CASTLE_LONG
+                    n += 1
+        else:
+            if pos.castling & CASTLE_BK and not occupied & 0x60:
+                if not (attackers_to(pos, 5, occupied) & occ_them) and not (attackers_to(pos, 6, occupied) & occ_them):
+                    buffer[n] = BLACK_CASTLE_SHORT
+                    n += 1
+            if pos.castling & CASTLE_BQ and not occupied & 0x0E:
+                if not (attackers_to(pos, 3, occupied) & occ_them) and not (attackers_to(pos, 2, occupied) & occ_them):
+                    buffer[n] = BLACK_CASTLE_LONG
+                    n += 1
+
+    #Pinned pieces: exactly one of our pieces between the king and an enemy slider
+    pinned = 0
+    queens = pieces[(them << 3) | QUEEN]
+    snipers = (ROOK_RAYS[ksq] & (pieces[(them << 3) | ROOK] | queens)) | (BISHOP_RAYS[ksq] & (pieces[(them << 3) | BISHOP] | queens))
+    while snipers:
+        bit = snipers & -snipers
+        snipers ^= bit
+        blockers = BETWEEN[ksq][bit.bit_length() - 1] & occupied
+        if blockers and not blockers & (blockers - 1) and blockers & occ_us:
+            pinned |= blockers
+
+    #Knights - a pinned knight can never move
+    bb = pieces[base | KNIGHT] & ~pinned
+    while bb:
+        bit = bb & -bb
+        bb ^= bit
+        frm = bit.bit_length() - 1
+        targets = KNIGHT_ATTACKS[frm] & target_mask
+        while targets:
+            tbit = targets & -targets
+            targets ^= tbit
+            buffer[n] = frm | ((tbit.bit_length() - 1) << 6) | (CAPTURE_BITS if tbit & occ_them else 0)
+            n += 1
+
+    #Sliders
+    for piece_type, attacks in ((BISHOP, bishop_attacks), (ROOK, rook_attacks), (QUEEN, queen_attacks)):
+        bb = pieces[base | piece_type]
+        while bb:
+            bit = bb & -bb
+            bb ^= bit
+            frm = bit.bit_length() - 1
+            targets = attacks(frm, occupied) & target_mask
+            if bit & pinned:
+                targets &= LINE[ksq][frm]
+            while targets:
+                tbit = targets & -targets
+                targets ^= tbit
+                buffer[n] = frm | ((tbit.bit_length() - 1) << 6) | (CAPTURE_BITS if tbit & occ_them else 0)
+                n += 1
+
+    #Pawns, generated set-wise then split into single moves
+    pawns = pieces[base | PAWN]
+    if us == 0:
+        single = (pawns >> 8) & empty
+        double = ((single & ROW_BBS[5]) >> 8) & empty
+        left = ((pawns & ~FILE_A) >> 9) & occ_them
+        right = ((pawns & ~FILE_H) >> 7) & occ_them
+        left_back, right_back = 9, 7
+        promo_row = ROW_BBS[0]
+        push = 8
+    else:
+        single = (pawns << 8) & empty
+        double = ((single & ROW_BBS[2]) << 8) & empty
+        left = ((pawns & ~FILE_A) << 7) & occ_them
+        right = ((pawns & ~FILE_H) << 9) & occ_them
+        left_back, right_back = -7, -9
+        promo_row = ROW_BBS[7]
+        push = -8
+    single &= push_mask
+    double &= push_mask
+    left &= target_mask
+    right &= target_mask
+    if captures_only:
+        single &= promo_row
+        double = 0
+
+    #A pinned pawn keeps only the targets on its pin line, taken out of the sets before they are split
+    pinned_pawns = pawns & pinned
+    while pinned_pawns:
+        bit = pinned_pawns & -pinned_pawns
+        pinned_pawns ^= bit
+        frm = bit.bit_length() - 1
+        off_line = ~LINE[ksq][frm]
+        single &= ~(BITS[frm - push] & off_line)
+        if 0 <= frm - 2 * push < 64:
+            double &= ~(BITS[frm - 2 * push] & off_line)
+        if 0 <= frm - left_back < 64:
+            left &= ~(BITS[frm - left_back] & off_line)
+        if 0 <= frm - right_back < 64:
+            right &= ~(BITS[frm - right_back] & off_line)
+
+    for targets, back, flag_bits in ((single, push, 0), (left, left_back, CAPTURE_BITS), (right, right_back, CAPTURE_BITS)):
+        promotions = targets & promo_row
+        targets ^= promotions
+        while targets:
+            tbit = targets & -targets
+            targets ^= tbit
+            to = tbit.bit_length() - 1
+            buffer[n] = (to + back) | (to << 6) | flag_bits
+            n += 1
+        while promotions:
+            tbit = promotions & -promotions
+            promotions ^= tbit
+            to = tbit.bit_length() - 1
+            move = (to + back) | (to << 6) | flag_bits
+            for promo in PROMO_BITS:
+                buffer[n] = move | promo
+                n += 1
+
+    back = 2 * push
+    while double:
+        tbit = double & -double
+        double ^= tbit
+        to = tbit.bit_length() - 1
+        buffer[n] = (to + back) | (to << 6) | (DOUBLE_PUSH << 12)
+        n += 1
+
+    #En passant, checked by playing it out on the occupancy (covers the case
+    #where both pawns leaving the rank uncovers a check on our king)
+    ep = pos.ep_square
+    if ep != -1:
+        cap_sq = ep + push
+        capturers = PAWN_ATTACKS[them][ep] & pawns
+        while capturers:
+            bit = capturers & -capturers
+            capturers ^= bit
+            after = (occupied ^ bit ^ (1 << cap_sq)) | (1 << ep)
+            if not attackers_to(pos, ksq, after) & occ_them & after:
+                buffer[n] = (bit.bit_length() - 1) | (ep << 6) | (EN_PASSANT << 12)
+                n += 1
+
+    return n
+
+
+def generate_legal_captures(pos: BitBoard, buffer) -> int:
+    """Legal captures and promotions only, for quiescence search."""
+    return generate_legal_moves(pos, buffer, True)
+
+
+def piece_at(pos: BitBoard, sq: int) -> int:
+    """Piece code on a 64 square."""
+    return pos.squares[sq]
+
+
+def legal_moves(pos: BitBoard) -> list:
+    """Legal moves as a new list, for callers outside the hot paths."""
+    buffer = new_move_buffer()
+    return buffer[:generate_legal_moves(pos, buffer)].tolist()
+
+
+SEE_VALUES = [abs(value) for value in PIECE_VALUES]
+
+
+def see(pos: BitBoard, move: int) -> int:
+    """Static exchange evaluation, same result as see.see on the mailbox Board.
+
+    Captured-with pieces are cleared from a copy of the occupancy, recomputing
+    the slider attacks on it brings in the x-ray attackers behind them.
+    """
+    pieces = pos.pieces
+    squares = pos.squares
+    frm = move & 63
+    to = (move >> 6) & 63
+    flag = move >> 12
+
+    piece = squares[frm]
+    occupied = (pos.occupancy[0] | pos.occupancy[1]) ^ BITS[frm]
+    if flag == EN_PASSANT:
+        gain = SEE_VALUES[WP]
+        occupied ^= BITS[to + 8 if piece == WP else to - 8]
+    else:
+        gain = SEE_VALUES[squares[to]]
+    if flag & PROMO_FLAG:
+        piece = (piece & 8) | (KNIGHT + (flag & 3))
+        gain += SEE_VALUES[piece] - SEE_VALUES[WP]
+
+    gains = [gain]
+    on_square = SEE_VALUES[piece]
+    side = 1 - (piece >> 3)
+    attackers = attackers_to(pos, to, occupied) & occupied
+    while True:
+        ours = attackers & pos.occupancy[side]
+        if not ours:
+            break
+        #Least valuable attacker of the side to recapture
+        first = (side << 3) | PAWN
+        for attacker in range(first, first + 6):
+            bb = ours & pieces[attacker]
+            if bb:
+                break
+        bb &= -bb
+        if attacker & 7 == KING and attackers_to(pos, to, occupied ^ bb) & occupied & pos.occupancy[1 - side]:
+            #The king may not capture onto a defended square
+            break
+        gains.append(on_square - gains[-1])
+        on_square = SEE_VALUES[attacker]
+        occupied ^= bb
+        #Sliders behind the piece that just captured join in
+        attackers = attackers_to(pos, to, occupied) & occupied
+        side = 1 - side
+
+    for i in range(len(gains) - 1, 0, -1):
+        gains[i - 1] = -max(-gains[i - 1], gains[i])
+    return gains[0]
+
+
+def mvv_lva(pos: BitBoard, move: int) -> int:
+    """Capture order key, same as move_gen.mvv_lva."""
+    squares = pos.squares
+    flag = move >> 12
+    victim = squares[(move >> 6) & 63] & 7 or PAWN
+    if flag & PROMO_FLAG:
+        victim += KNIGHT + (flag & 3)
+    return victim * 8 - (squares[move & 63] & 7)
+
+
+class MovePicker:
+    """Same interface as move_gen.MovePicker.
+
+    Bitboard generation is legal from the start and cheap, so the whole list is
+    generated on the first pull and handed out in the same stage order: hash move,
+    captures by MVV-LVA that do not lose material, push promotions, killers, quiet
+    moves by history score, then the captures losing BAD_CAPTURE_SEE or more.
+    """
+    __slots__ = ('buffer', 'pos', 'hash_move', 'killers', 'history', 'moves', 'index', 'generations')
+
+    def __init__(self):
+        self.buffer = new_move_buffer()
+        self.moves = None
+        self.generations = 0 #Move lists generated over the picker's life, for the search stats
+
+    def reset(self, pos: BitBoard, hash_move: int = 0, killers: tuple = (), history: list = None):
+        self.pos = pos
+        self.hash_move = hash_move
+        self.killers = killers
+        self.history = history
+        self.moves = None
+        self.index = 0
+
+    def _order(self, move: int) -> tuple:
+        if move == self.hash_move:
+            return 0, 0
+        if move & (CAPTURE << 12):
+            squares = self.pos.squares
+            #Only a capture of a cheaper piece can lose material
+            if SEE_VALUES[squares[(move >> 6) & 63]] < SEE_VALUES[squares[move & 63]] and see(self.pos, move) <= BAD_CAPTURE_SEE:
+                return 5, -mvv_lva(self.pos, move)
+            return 1, -mvv_lva(self.pos, move)
+        if move & (PROMO_FLAG << 12):
+            return 2, 0
+        if move in self.killers:
+            return 3, 0
+        return 4, -self.history[move & 4095] if self.history is not None else 0
+
+    def next_move(self) -> int:
+        """The next legal move, 0 once there are none left"""
+        if self.moves is None:
+            count = generate_legal_moves(self.pos, self.buffer)
+            self.generations += 1
+            self.moves = sorted(self.buffer[:count], key=self._order)
+        if self.index < len(self.moves):
+            self.index += 1
+            return self.moves[self.index - 1]
+        return 0
+
+
+def make_move(pos: BitBoard, move: int):
+    """Make a packed move on the bitboard position, pushing undo info onto its undo stack."""
+    frm = move & 63
+    to = (move >> 6) & 63
+    flag = move >> 12
+    pieces = pos.pieces
+    squares = pos.squares
+    occupancy = pos.occupancy
+    us = pos.side_to_move
+
+    piece = squares[frm]
+    captured = squares[to]
+    ply = pos.ply
+    if ply == len(pos.undo_hash):
+        pos.grow_undo_stack()
+    key = pos.hash_key
+    mg = pos.mg_score
+    eg = pos.eg_score
+    castling = pos.castling
+    ep_square = pos.ep_square
+    pos.undo_hash[ply] = key
+    pos.undo_state[ply] = move, captured, castling, ep_square, pos.half_move_counter, mg, eg, pos.phase
+    pos.ply = ply + 1
+
+    key ^= SIDE_KEY
+    if ep_square != -1:
+        key ^= EN_PASSANT_KEYS[ep_square & 7]
+        pos.ep_square = -1
+
+    if captured:
+        to_bit = BITS[to]
+        pieces[captured] ^= to_bit
+        occupancy[1 - us] ^= to_bit
+        key ^= PIECE_KEYS64[captured][to]
+        mg -= MG_TABLE[captured][to]
+        eg -= EG_TABLE[captured][to]
+        pos.phase -= PHASE_INC[captured]
+        pos.half_move_counter = 0
+    elif piece & 7 == PAWN:
+        pos.half_move_counter = 0
+    else:
+        pos.half_move_counter += 1
+
+    from_to = move & 4095
+    move_bits = MOVE_BITS[from_to]
+    pieces[piece] ^= move_bits
+    occupancy[us] ^= move_bits
+    squares[frm] = 0
+    squares[to] = piece
+    key ^= MOVE_KEYS[piece][from_to]
+    mg += MOVE_MG[piece][from_to]
+    eg += MOVE_EG[piece][from_to]
+
+    if flag & ~CAPTURE:
+        if flag == DOUBLE_PUSH:
+            pos.ep_square = (frm + to) >> 1
+            key ^= EN_PASSANT_KEYS[to & 7]
+        elif flag == EN_PASSANT:
+            cap_sq = to + 8 if us == 0 else to - 8
+            cap_piece = squares[cap_sq]
+            pieces[cap_piece] ^= BITS[cap_sq]
+            occupancy[1 - us] ^= BITS[cap_sq]
+            squares[cap_sq] = 0
+            key ^= PIECE_KEYS64[cap_piece][cap_sq]
+            mg -= MG_TABLE[cap_piece][cap_sq]
+            eg -= EG_TABLE[cap_piece][cap_sq]
+        elif flag & PROMO_FLAG:
+            promo = (us << 3) | (KNIGHT + (flag & 3))
+            to_bit = BITS[to]
+            pieces[piece] ^= to_bit
+            pieces[promo] ^= to_bit
+            squares[to] = promo
+            key ^= PIECE_KEYS64[piece][to] ^ PIECE_KEYS64[promo][to]
+            mg += MG_TABLE[promo][to] - MG_TABLE[piece][to]
+            eg += EG_TABLE[promo][to] - EG_TABLE[piece][to]
+            pos.phase += PHASE_INC[promo]
+        else:
+            if flag == CASTLE_SHORT:
+                rook_from, rook_to = frm + 3, frm + 1
+            else:
+                rook_from, rook_to = frm - 4, frm - 1
+            rook = squares[rook_from]
+            rook_bits = BITS[rook_from] | BITS[rook_to]
+            pieces[rook] ^= rook_bits
+            occupancy[us] ^= rook_bits
+            squares[rook_from] = 0
+            squares[rook_to] = rook
+            key ^= PIECE_KEYS64[rook][rook_from] ^ PIECE_KEYS64[rook][rook_to]
+            mg += MG_TABLE[rook][rook_to] - MG_TABLE[rook][rook_from]
+            eg += EG_TABLE[rook][rook_to] - EG_TABLE[rook][rook_from]
+
+    if castling:
+        new_castling = castling & CASTLE_MASK[frm] & CASTLE_MASK[to]
+        if new_castling != castling:
+            key ^= CASTLE_HASH[castling] ^ CASTLE_HASH[new_castling]
+            pos.castling = new_castling
+
+    if us == 1:
+        pos.full_move_counter += 1
+        pos.side_to_move = 0
+    else:
+        pos.side_to_move = 1
+    pos.hash_key = key
+    pos.mg_score = mg
+    pos.eg_score = eg
+
+
+def unmake_move(pos: BitBoard):
+    """Undo the last move on the position's undo stack."""
+    ply = pos.ply - 1
+    pos.ply = ply
+    move, captured, pos.castling, pos.ep_square, pos.half_move_counter, pos.mg_score, pos.eg_score, pos.phase = pos.undo_state[ply]
+    pos.hash_key = pos.undo_hash[ply]
+    frm = move & 63
+    to = (move >> 6) & 63
+    flag = move >> 12
+    pieces = pos.pieces
+    squares = pos.squares
+    occupancy = pos.occupancy
+    us = 1 - pos.side_to_move
+
+    piece = squares[to]
+    if flag > CAPTURE:
+        if flag == EN_PASSANT:
+            cap_sq = to + 8 if us == 0 else to - 8
+            cap_piece = ((1 - us) << 3) | PAWN
+            pieces[cap_piece] ^= BITS[cap_sq]
+            occupancy[1 - us] ^= BITS[cap_sq]
+            squares[cap_sq] = cap_piece
+        else:
+            #Turn the promoted piece back into the pawn
+            to_bit = BITS[to]
+            pieces[piece] ^= to_bit
+            piece = (us << 3) | PAWN
+            pieces[piece] ^= to_bit
+    elif flag == CASTLE_SHORT or flag == CASTLE_LONG:
+        if flag == CASTLE_SHORT:
+            rook_from, rook_to = frm + 3, frm + 1
+        else:
+            rook_from, rook_to = frm - 4, frm - 1
+        rook = squares[rook_to]
+        rook_bits = BITS[rook_from] | BITS[rook_to]
+        pieces[rook] ^= rook_bits
+        occupancy[us] ^= rook_bits
+        squares[rook_to] = 0
+        squares[rook_from] = rook
+
+    move_bits = MOVE_BITS[move & 4095]
+    pieces[piece] ^= move_bits
+    occupancy[us] ^= move_bits
+    squares[frm] = piece
+    squares[to] = captured
+
+    if captured:
+        to_bit = BITS[to]
+        pieces[captured] ^= to_bit
+        occupancy[1 - us] ^= to_bit
+
+    if us == 1:
+        pos.full_move_counter -= 1
+    pos.side_to_move = us
+
+
+def make_null_move(pos: BitBoard):
+    """Pass the move to the other side, for null move pruning. Pushed on the undo stack like a move."""
+    ply = pos.ply
+    if ply == len(pos.undo_hash):
+        pos.grow_undo_stack()
+    pos.undo_hash[ply] = pos.hash_key
+    pos.undo_state[ply] = NULL_MOVE, 0, pos.castling, pos.ep_square, pos.half_move_counter, pos.mg_score, pos.eg_score, pos.phase
+    pos.ply = ply + 1
+
+    key = pos.hash_key ^ SIDE_KEY
+    if pos.ep_square != -1:
+        key ^= EN_PASSANT_KEYS[pos.ep_square & 7]
+        pos.ep_square = -1
+    pos.hash_key = key
+    #Positions before a null move cannot repeat after it, the repetition scan stops here
+    pos.half_move_counter = 0
+    if pos.side_to_move == 1:
+        pos.full_move_counter += 1
+    pos.side_to_move = 1 - pos.side_to_move
+
+
+def unmake_null_move(pos: BitBoard):
+    """Undo make_null_move."""
+    ply = pos.ply - 1
+    pos.ply = ply
+    pos.side_to_move = 1 - pos.side_to_move
+    if pos.side_to_move == 1:
+        pos.full_move_counter -= 1
+    _, _, _, pos.ep_square, pos.half_move_counter, _, _, _ = pos.undo_state[ply]
+    pos.hash_key = pos.undo_hash[ply]
+
+
+def has_non_pawn_material(pos: BitBoard, side: int) -> bool:
+    """Does side have a piece other than pawns and the king."""
+    pieces = pos.pieces
+    base = side << 3
+    return bool(pieces[base | KNIGHT] | pieces[base | BISHOP] | pieces[base | ROOK] | pieces[base | QUEEN])
+
+
+def piece_count(pos: BitBoard) -> int:
+    """Number of pieces on the board, kings and pawns included."""
+    return (pos.occupancy[0] | pos.occupancy[1]).bit_count()
+
+
+def piece_squares(pos: BitBoard) -> list:
+    """(piece, square) of every piece on the board."""
+    squares = []
+    for piece, bb in enumerate(pos.pieces):
+        while bb:
+            bit = bb & -bb
+            bb ^= bit
+            squares.append((piece, bit.bit_length() - 1))
+    return squares
+
+
+def perft(pos: BitBoard, depth: int, check_hash: bool = False, check_eval: bool = False, table: PerftTable = None) -> int:
+    """Count all leaf nodes at the given depth on a bitboard position, see perft.perft."""
+    if table is not None:
+        return hashed_perft(pos, depth, table, generate_legal_moves, make_move, unmake_move)
+    buffers = [new_move_buffer() for _ in range(depth + 1)]
+    return _perft(pos, depth, check_hash, check_eval, buffers)
+
+
+def _perft(pos: BitBoard, depth: int, check_hash: bool, check_eval: bool, buffers: list) -> int:
+    if check_hash and pos.hash_key != compute_hash(pos):
+        raise AssertionError("Zobrist key mismatch in bitboard position")
+    if check_eval:
+        verify_eval(pos)
+    if depth == 0:
+        return 1
+
+    buffer = buffers[depth]
+    nodes = 0
+    for i in range(generate_legal_moves(pos, buffer)):
+        make_move(pos, buffer[i])
+        nodes += _perft(pos, depth - 1, check_hash, check_eval, buffers)
+        unmake_move(pos)
+    return nodes
@@ -1,23 +1,7 @@
-class Board:
-    def __init__(self):
-    #States of the game
-        self.side_to_move = 0 #0 - white, 1 - black
-
-        self.castle_white_short = 1
-        self.castle_white_long = 1
-        self.castle_black_short = 1
-        self.castle_black_long = 1
-
-        self.en_passant = None #Stores target square
-
-        self.half_move_counter = 0 #half-moves since the last pawn advance or capture, half moves means move by 1 player
-        self.full_move_counter = 1 #Full move meaning move by both players, starts at 1 for some reason, increase after black move
-        
-        self.reversible_moves = 0 #Moves by pieces (not pawns) to empty squares, not sure if this usefull
-        
+from constants import NUM_PIECE_CODES, CASTLE_WK, CASTLE_WQ, CASTLE_BK, CASTLE_BQ
 
-    #Mailbox representation for 120 and 64 squares for mapping
-        self.mailbox120 = [
+#Mailbox representation for 120 and 64 squares for mapping, shared by all boards
+MAILBOX120 = [
      -1, -1, -1, -1, -1, -1, -1, -1, -1, -1,
      -1, -1, -1, -1, -1, -1, -1, -1, -1, -1,
      -1,  0,  1,  2,  3,  4,  5,  6,  7, -1, #8 row
@@ -30,8 +14,8 @@ class Board:
      -1, 56, 57, 58, 59, 60, 61, 62, 63, -1,
      -1, -1, -1, -1, -1, -1, -1, -1, -1, -1,
      -1, -1, -1, -1, -1, -1, -1, -1, -1, -1]
-        
-        self.mailbox64 = [
+
+MAILBOX64 = [
     21, 22, 23, 24, 25, 26, 27, 28, #8 row
     31, 32, 33, 34, 35, 36, 37, 38, #7 row...
     41, 42, 43, 44, 45, 46, 47, 48,
@@ -40,40 +24,115 @@ class Board:
     71, 72, 73, 74, 75, 76, 77, 78,
     81, 82, 83, 84, 85, 86, 87, 88,
     91, 92, 93, 94, 95, 96, 97, 98]
-        
-        #Actual board for storing pieces
-        self.board_play = [0] * 120
-
-        #Add piece lists for move generation
-        self.piece_list = {
-            'P': [],
-            'N': [],
-            'B': [],
-            'R': [],
-            'Q': [],
-            'K': [],
-            'p': [],
-            'n': [],
-            'b': [],
-            'r': [],
-            'q': [],
-            'k': []}
-    #Function for updating the list 
+
+UNDO_STACK_SIZE = 256 #Initial plies of undo stack, doubled when a long game fills it
+
+
+class Board:
+    __slots__ = (
+        'side_to_move', 'castling', 'ep_square', 'half_move_counter', 'full_move_counter',
+        'reversible_moves', 'hash_key', 'mg_score', 'eg_score', 'phase',
+        'board_play', 'piece_list', 'piece_index',
+        'ply', 'undo_move', 'undo_captured', 'undo_castling', 'undo_ep_square',
+        'undo_half_move', 'undo_hash', 'undo_mg', 'undo_eg', 'undo_phase',
+    )
+
+    #Static tables live at module level, boards only hold references
+    mailbox120 = MAILBOX120
+    mailbox64 = MAILBOX64
+
+    def __init__(self):
+    #States of the game
+        self.side_to_move = 0 #0 - white, 1 - black
+
+        self.castling = CASTLE_WK | CASTLE_WQ | CASTLE_BK | CASTLE_BQ #Castling rights bits
+
+        self.ep_square = -1 #En passant target square as 120 index, -1 if none
+
+        self.half_move_counter = 0 #half-moves since the last pawn advance or capture, half moves means move by 1 player
+        self.full_move_counter = 1 #Full move meaning move by both players, starts at 1 for some reason, increase after black move
+
+        self.reversible_moves = 0 #Moves by pieces (not pawns) to empty squares, not sure if this usefull
+
+        self.hash_key = 0 #64-bit Zobrist key, set by fen_to_board and kept up to date by make/unmake
+
+        #Running evaluation sums (see eval.py), kept up to date the same way as hash_key
+        self.mg_score = 0
+        self.eg_score = 0
+        self.phase = 0
+
+        #Actual board for storing pieces, one integer piece code per square (0 = empty)
+        self.board_play = bytearray(120)
+
+        #Piece lists for move generation, indexed by piece code. Each list holds the
+        #squares of that piece and piece_index maps a square back to its slot in the
+        #list, so pieces can be added and removed in O(1) (see add_piece/remove_piece)
+        self.piece_list = [[] for _ in range(NUM_PIECE_CODES)]
+        self.piece_index = [0] * 120
+
+        #Undo stack as parallel arrays, make_move writes slot ply and unmake_move reads it back,
+        #so no undo object is allocated per move
+        self.ply = 0 #Moves currently on the undo stack
+        self.undo_move = [0] * UNDO_STACK_SIZE
+        self.undo_captured = [0] * UNDO_STACK_SIZE
+        self.undo_castling = [0] * UNDO_STACK_SIZE
+        self.undo_ep_square = [0] * UNDO_STACK_SIZE
+        self.undo_half_move = [0] * UNDO_STACK_SIZE
+        self.undo_hash = [0] * UNDO_STACK_SIZE
+        self.undo_mg = [0] * UNDO_STACK_SIZE
+        self.undo_eg = [0] * UNDO_STACK_SIZE
+        self.undo_phase = [0] * UNDO_STACK_SIZE
+
+    def grow_undo_stack(self):
+        """Double the undo stack when a long game fills it."""
+        for name in ('undo_move', 'undo_captured', 'undo_castling', 'undo_ep_square', 'undo_half_move', 'undo_hash',
+                     'undo_mg', 'undo_eg', 'undo_phase'):
+            stack = getattr(self, name)
+            stack.extend([stack[0]] * len(stack))
+
+    def set_key_history(self, keys):
+        """Put the keys of the positions before this one on the undo stack.
+
+        They are there for repetition checks only, the moves that led to them cannot be unmade.
+        """
+        while len(self.undo_hash) <= len(keys):
+            self.grow_undo_stack()
+        self.undo_hash[:len(keys)] = keys
+        self.ply = len(keys)
+
+    #Function for updating the list
     def update_piece_list(self):
-        for key in self.piece_list:
-            self.piece_list[key] = []
-        
+        for piece_squares in self.piece_list:
+            piece_squares.clear()
+
         for index64 in range(64):
-            sq120 = self.mailbox64[index64]
+            sq120 = MAILBOX64[index64]
             piece = self.board_play[sq120]
             if piece != 0:
-                self.piece_list[piece].append(sq120)
-                
-    #Convert algebraic enpassant square to 120 index
-    def en_passant_to_index(self) -> int:
-        if self.en_passant is None:
-            return -1
-        file = ord(self.en_passant[0]) - ord('a')  #0-7
-        rank = int(self.en_passant[1])  #1-8
-        index64 = (8 - rank) * 8 + file
-        return self.mailbox64[index64]
\ No newline at end of file
+                self.add_piece(piece, sq120)
+
+    def add_piece(self, piece: int, sq120: int):
+        """Put a piece on an empty square."""
+        squares = self.piece_list[piece]
+        self.piece_index[sq120] = len(squares)
+        squares.append(sq120)
+        self.board_play[sq120] = piece
+
+    def remove_piece(self, sq120: int):
+        """Take the piece off a square, the last slot of its list fills the hole."""
+        squares = self.piece_list[self.board_play[sq120]]
+        last = squares.pop()
+        if last != sq120:
+            slot = self.piece_index[sq120]
+            squares[slot] = last
+            self.piece_index[last] = slot
+        self.board_play[sq120] = 0
+
+    def move_piece(self, from_sq: int, to_sq: int):
+        """Move a piece to an empty square, keeping its slot in the piece list."""
+        piece = self.board_play[from_sq]
+        slot = self.piece_index[from_sq]
+        self.piece_list[piece][slot] = to_sq
+        self.piece_index[to_sq] = slot
+        self.board_play[to_sq] = piece
+        self.board_play[from_sq] = 0
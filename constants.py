@@ -43,25 +43,59 @@ ROW_1 = {91, 92, 93, 94, 95, 96, 97, 98}
 #Pieces symbols
 PIECES = ['r','n','b','q','k','p','P','R','N','B','Q','K']
 
+#Integer piece codes, the piece type is in the low 3 bits and bit 3 is the colour
+#so piece >> 3 gives 0 for white and 1 for black (same as side_to_move)
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+BLACK_BIT = 8
+WP, WN, WB, WR, WQ, WK = 1, 2, 3, 4, 5, 6
+BP, BN, BB, BR, BQ, BK = 9, 10, 11, 12, 13, 14
+PIECE_CODES = [WP, WN, WB, WR, WQ, WK, BP, BN, BB, BR, BQ, BK]
+NUM_PIECE_CODES = 15 #size of tables indexed by piece code (0, 7 and 8 unused)
+
+#Castling rights bits (Board.castling)
+CASTLE_WK = 1   #white short
+CASTLE_WQ = 2   #white long
+CASTLE_BK = 4   #black short
+CASTLE_BQ = 8   #black long
+
+#Move flags, the top 4 bits of a packed move (see move_encoding.py)
+QUIET = 0
+DOUBLE_PUSH = 1
+CASTLE_SHORT = 2
+CASTLE_LONG = 3
+CAPTURE = 4
+EN_PASSANT = 5
+PROMO_N = 8
+PROMO_B = 9
+PROMO_R = 10
+PROMO_Q = 11
+CAPTURE_FLAG = 4    #set on captures, en passant and capture promotions
+PROMO_FLAG = 8      #set on promotions, the low 2 bits give the piece (N, B, R, Q)
+
+#Conversion between codes and FEN characters
+PIECE_CHARS = '.PNBRQK..pnbrqk'
+CHAR_TO_PIECE = {char: code for code, char in enumerate(PIECE_CHARS) if char != '.'}
+
 #Timing defaults used by the UCI time allocator
 
 DEFAULT_MOVES_TO_GO = 40            #default moves to go when movestogo not provided
 TIME_SAFETY_MARGIN_MS = 50          #ms to subtract as safety slack when allocating time
 MIN_THINK_TIME_MS = 10              #minimum thinking time allocated in ms
+INCREMENT_SHARE = 0.75              #part of the increment planned into each move
+HARD_TIME_FACTOR = 4                #hard limit as a multiple of the soft one
+MAX_TIME_SHARE = 0.5                #hard limit cap as a share of the clock, with moves still to go
 
 #Stuff for eval
 
-PIECE_VALUES = {
-    'P': 100,
-    'N': 320,
-    'B': 330,
-    'R': 500,
-    'Q': 900,
-    'K': 20000,
-    'p': -100,
-    'n': -320,
-    'b': -330,
-    'r': -500,
-    'q': -900,
-    'k': -20000,
-}
\ No newline at end of file
+#Indexed by piece code, positive for white and negative for black
+PIECE_VALUES = [
+    0,
+    100, 320, 330, 500, 900, 20000,         #P N B R Q K
+    0, 0,
+    -100, -320, -330, -500, -900, -20000,   #p n b r q k
+]
+
+#Move pickers try captures whose exchange (see.py) loses this much or more after the quiet moves.
+#A pawn's worth, so a bishop for a knight still counts as an even trade
+BAD_CAPTURE_SEE = -100
@@ -0,0 +1,127 @@
+"""Perft suite runner for EPD files.
+
+Each line holds a FEN followed by the expected counts, the usual perft EPD
+format:
+
+    rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1 ;D1 20 ;D2 400 ;D3 8902
+
+The file is read one line at a time and at most a few positions per worker
+are in flight, so memory stays flat however long the suite is. Results are
+taken in file order, the first wrong count stops the run and the failing
+position is divided at that depth to show which move is off.
+
+    python epd_perft.py suite.epd --max-depth 4 --jobs 8
+"""
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from board import Board
+from fen import fen_to_board
+from perft import perft, debug_perft
+
+TASKS_PER_WORKER = 4 #Positions queued per worker, enough to keep them busy without reading ahead
+
+
+def parse_epd_line(line: str) -> tuple:
+    """(fen, {depth: expected nodes}) of one EPD line, None for blank and comment lines."""
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    fields = line.split(';')
+    depths = {}
+    for field in fields[1:]:
+        parts = field.split()
+        if len(parts) == 2 and parts[0][:1] == 'D' and parts[0][1:].isdigit():
+            depths[int(parts[0][1:])] = int(parts[1])
+    return fields[0].strip(), depths
+
+
+def iter_epd(lines, max_depth: int = None):
+    """Yield (line number, fen, [(depth, expected), ...]) for each position, shallow depths first."""
+    for line_no, line in enumerate(lines, start=1):
+        parsed = parse_epd_line(line)
+        if parsed is None:
+            continue
+        fen, depths = parsed
+        checks = sorted((depth, expected) for depth, expected in depths.items()
+                        if max_depth is None or depth <= max_depth)
+        yield line_no, fen, checks
+
+
+def check_position(line_no: int, fen: str, checks: list) -> tuple:
+    """Run perft for each depth of a position, stopping at the first wrong count.
+
+    Returns (line number, fen, nodes counted, (depth, expected, got) of the mismatch or None).
+    """
+    board = Board()
+    fen_to_board(board, fen)
+    nodes = 0
+    for depth, expected in checks:
+        got = perft(board, depth)
+        nodes += got
+        if got != expected:
+            return line_no, fen, nodes, (depth, expected, got)
+    return line_no, fen, nodes, None
+
+
+def _run_tasks(tasks, jobs: int):
+    """Results of check_position for each task in order, through a bounded window of worker processes."""
+    if jobs == 1:
+        for task in tasks:
+            yield check_position(*task)
+        return
+    pool = ProcessPoolExecutor(jobs)
+    pending = deque()
+    try:
+        for task in tasks:
+            pending.append(pool.submit(check_position, *task))
+            if len(pending) >= jobs * TASKS_PER_WORKER:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        #Reached on a mismatch too, drop whatever is still queued
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def run_epd(lines, max_depth: int = None, jobs: int = 1, divide: bool = True) -> dict:
+    """Check every position of an EPD stream.
+
+    Returns {'positions', 'nodes', 'elapsed', 'nps', 'failure'} where failure is
+    (line number, fen, depth, expected, got) of the first mismatch or None.
+    """
+    start = time.perf_counter()
+    positions = 0
+    total = 0
+    failure = None
+    results = _run_tasks(iter_epd(lines, max_depth), jobs)
+    for line_no, fen, nodes, mismatch in results:
+        positions += 1
+        total += nodes
+        if mismatch:
+            failure = (line_no, fen) + mismatch
+            results.close()
+            break
+    elapsed = time.perf_counter() - start
+
+    if failure:
+        line_no, fen, depth, expected, got = failure
+        print(f"Line {line_no}: depth {depth} gave {got} nodes, expected {expected}")
+        if divide:
+            debug_perft(fen, depth)
+    nps = int(total / elapsed) if elapsed > 0 else 0
+    print(f"{positions} positions, {total:,} nodes in {elapsed:.3f}s ({nps:,} nps)")
+    return {'positions': positions, 'nodes': total, 'elapsed': elapsed, 'nps': nps, 'failure': failure}
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Check perft counts of an EPD suite")
+    parser.add_argument("epd", help="EPD file, lines of 'fen ;D1 n ;D2 n ...'")
+    parser.add_argument("--max-depth", type=int, help="skip deeper counts")
+    parser.add_argument("--jobs", type=int, default=1, help="worker processes")
+    args = parser.parse_args()
+    with open(args.epd) as f:
+        summary = run_epd(f, args.max_depth, args.jobs)
+    sys.exit(1 if summary['failure'] else 0)
@@ -1,5 +1,9 @@
 from board import Board
-from constants import PIECES
+from constants import CHAR_TO_PIECE, PIECE_CHARS, CASTLE_WK, CASTLE_WQ, CASTLE_BK, CASTLE_BQ
+from zobrist import compute_hash
+from eval import compute_eval
+
+CASTLE_CHARS = (('K', CASTLE_WK), ('Q', CASTLE_WQ), ('k', CASTLE_BK), ('q', CASTLE_BQ))
 
 def fen_to_board(board: Board, fen: str):
     parts = fen.split()
@@ -11,17 +15,17 @@ def fen_to_board(board: Board, fen: str):
     if len(rows) != 8:
         raise ValueError("FEN must have 8 ranks")
 
-    board.board_play = [0] * 120
+    board.board_play = bytearray(120)
     index = 0  #0..63 index into mailbox64
     for row in rows:
         for char in row:
             if char.isdigit():
                 index += int(char)
-            elif char in PIECES:
+            elif char in CHAR_TO_PIECE:
                 if index < 0 or index >= 64:
                     raise ValueError("Piece index out of range while parsing FEN")
                 sq120 = board.mailbox64[index]
-                board.board_play[sq120] = char
+                board.board_play[sq120] = CHAR_TO_PIECE[char]
                 index += 1
             else:
                 raise ValueError('Invalid character in FEN piece placement')
@@ -39,14 +43,19 @@ def fen_to_board(board: Board, fen: str):
 
     #castling
     castling = parts[2] if len(parts) > 2 else '-'
-    board.castle_white_short = 1 if 'K' in castling else 0
-    board.castle_white_long = 1 if 'Q' in castling else 0
-    board.castle_black_short = 1 if 'k' in castling else 0
-    board.castle_black_long = 1 if 'q' in castling else 0
+    board.castling = 0
+    for char, right in CASTLE_CHARS:
+        if char in castling:
+            board.castling |= right
 
-    #en passant
+    #en passant, stored as 120 index
     en_passant = parts[3] if len(parts) > 3 else '-'
-    board.en_passant = None if en_passant == '-' else en_passant
+    if en_passant == '-':
+        board.ep_square = -1
+    else:
+        file = ord(en_passant[0]) - ord('a')  #0-7
+        rank = int(en_passant[1])  #1-8
+        board.ep_square = board.mailbox64[(8 - rank) * 8 + file]
 
     #halfmove clock
     board.half_move_counter = int(parts[4]) if len(parts) > 4 else 0
@@ -55,6 +64,9 @@ def fen_to_board(board: Board, fen: str):
     board.full_move_counter = int(parts[5]) if len(parts) > 5 else 1
 
     board.update_piece_list()
+    board.hash_key = compute_hash(board)
+    board.mg_score, board.eg_score, board.phase = compute_eval(board)
+    board.ply = 0 #Fresh position, nothing to undo
 
 
 def board_to_fen(board: Board) -> str:
@@ -72,7 +84,7 @@ def board_to_fen(board: Board) -> str:
                 if empty:
                     parts.append(str(empty))
                     empty = 0
-                parts.append(str(piece))
+                parts.append(PIECE_CHARS[piece])
         if empty:
             parts.append(str(empty))
         ranks.append(''.join(parts))
@@ -80,18 +92,13 @@ def board_to_fen(board: Board) -> str:
     placement = '/'.join(ranks)
     side = 'w' if board.side_to_move == 0 else 'b'
 
-    castling = ''
-    if board.castle_white_short:
-        castling += 'K'
-    if board.castle_white_long:
-        castling += 'Q'
-    if board.castle_black_short:
-        castling += 'k'
-    if board.castle_black_long:
-        castling += 'q'
+    castling = ''.join(char for char, right in CASTLE_CHARS if board.castling & right)
     if castling == '':
         castling = '-'
 
-    en_pass = board.en_passant if board.en_passant is not None else '-'
+    if board.ep_square == -1:
+        en_pass = '-'
+    else:
+        en_pass = chr(ord('a') + (board.ep_square % 10) - 1) + str(10 - board.ep_square // 10)
 
     return f"{placement} {side} {castling} {en_pass} {board.half_move_counter} {board.full_move_counter}"
\ No newline at end of file
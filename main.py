@@ -1,7 +1,10 @@
+import multiprocessing
 from uci import uci_loop
 
 def main():
     uci_loop()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    #Frozen executables start their worker processes through this guard too, they must run the worker instead
+    multiprocessing.freeze_support()
+    main()
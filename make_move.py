@@ -1,196 +1,257 @@
-from board import Board
+from board import Board, MAILBOX64
+from constants import WP, WN, WB, WR, WQ, BP, BN, BB, BR, BQ
+from move_encoding import NULL_MOVE
+from constants import CASTLE_WK, CASTLE_WQ, CASTLE_BK, CASTLE_BQ
+from constants import DOUBLE_PUSH, CASTLE_SHORT, CASTLE_LONG, EN_PASSANT, PROMO_FLAG
+from zobrist import PIECE_KEYS, SIDE_KEY, CASTLE_HASH, EN_PASSANT_KEYS
+from eval import MG_TABLE120, EG_TABLE120, PHASE_INC
 
-def make_move(board: Board, move: tuple) -> dict:
+#Low 2 bits of a promotion flag -> piece code for white and black
+PROMO_PIECES = ((WN, BN), (WB, BB), (WR, BR), (WQ, BQ))
+
+#Castling rights that survive a move from or to each square (king and rook squares clear theirs)
+CASTLE_MASK = [15] * 120
+CASTLE_MASK[95] = 15 & ~(CASTLE_WK | CASTLE_WQ) #e1
+CASTLE_MASK[98] = 15 & ~CASTLE_WK               #h1
+CASTLE_MASK[91] = 15 & ~CASTLE_WQ               #a1
+CASTLE_MASK[25] = 15 & ~(CASTLE_BK | CASTLE_BQ) #e8
+CASTLE_MASK[28] = 15 & ~CASTLE_BK               #h8
+CASTLE_MASK[21] = 15 & ~CASTLE_BQ               #a8
+
+def make_move(board: Board, move: int):
     """
-    Make a move on the board. Returns undo info for unmake_move.
-    Move format: (from_sq, to_sq) or (from_sq, to_sq, flag)
+    Make a move on the board, pushing what unmake_move needs onto the board's undo stack.
+    Move format: packed int, see move_encoding.py
     """
-    from_sq = move[0]
-    to_sq = move[1]
-    flag = move[2] if len(move) > 2 else None
-    
-    #Store undo information
-    undo = {
-        'from_sq': from_sq,
-        'to_sq': to_sq,
-        'flag': flag,
-        'moved_piece': board.board_play[from_sq],
-        'captured_piece': board.board_play[to_sq],
-        'castle_white_short': board.castle_white_short,
-        'castle_white_long': board.castle_white_long,
-        'castle_black_short': board.castle_black_short,
-        'castle_black_long': board.castle_black_long,
-        'en_passant': board.en_passant,
-        'half_move_counter': board.half_move_counter,
-        'full_move_counter': board.full_move_counter,
-    }
-    
+    from_sq = MAILBOX64[move & 63]
+    to_sq = MAILBOX64[(move >> 6) & 63]
+    flag = move >> 12
+
     board_play = board.board_play
     piece_list = board.piece_list
+    piece_index = board.piece_index
 
     piece = board_play[from_sq]  #Get the piece being moved
     captured = board_play[to_sq]  #Get the piece being captured (0 if none)
 
+    #Push undo information
+    ply = board.ply
+    if ply == len(board.undo_move):
+        board.grow_undo_stack()
+    board.undo_move[ply] = move
+    board.undo_captured[ply] = captured
+    board.undo_castling[ply] = board.castling
+    board.undo_ep_square[ply] = board.ep_square
+    board.undo_half_move[ply] = board.half_move_counter
+    board.undo_hash[ply] = board.hash_key
+    board.undo_mg[ply] = board.mg_score
+    board.undo_eg[ply] = board.eg_score
+    board.undo_phase[ply] = board.phase
+    board.ply = ply + 1
+
+    key = board.hash_key ^ SIDE_KEY
+    if board.ep_square != -1:
+        key ^= EN_PASSANT_KEYS[(board.ep_square % 10) - 1]
+    mg = board.mg_score
+    eg = board.eg_score
+
     #Handle en passant capture
-    if flag == 'en_passant':
+    if flag == EN_PASSANT:
         if board.side_to_move == 0:  #White captures black pawn
             captured_pawn_sq = to_sq + 10
         else:  #Black captures white pawn
             captured_pawn_sq = to_sq - 10
-        undo['en_passant_captured_sq'] = captured_pawn_sq
-        undo['en_passant_captured_piece'] = board_play[captured_pawn_sq]
-        piece_list[board_play[captured_pawn_sq]].remove(captured_pawn_sq)
-        board_play[captured_pawn_sq] = 0
+        captured_pawn = board_play[captured_pawn_sq]
+        key ^= PIECE_KEYS[captured_pawn][captured_pawn_sq]
+        mg -= MG_TABLE120[captured_pawn][captured_pawn_sq]
+        eg -= EG_TABLE120[captured_pawn][captured_pawn_sq]
+        board.remove_piece(captured_pawn_sq)
 
-    #Remove moving and captured pieces from lists
-    piece_list[piece].remove(from_sq)
+    #Take the captured piece off the board, the last slot of its list fills the hole
     if captured != 0:
-        piece_list[captured].remove(to_sq)
-
-    #Move the piece
-    board_play[from_sq] = 0
-    final_piece = piece
-
-    #Handle promotion
-    if flag in ('promo_q', 'promo_r', 'promo_b', 'promo_n'):
-        promo_pieces = {
-            'promo_q': 'Q' if board.side_to_move == 0 else 'q',
-            'promo_r': 'R' if board.side_to_move == 0 else 'r',
-            'promo_b': 'B' if board.side_to_move == 0 else 'b',
-            'promo_n': 'N' if board.side_to_move == 0 else 'n',
-        }
-        final_piece = promo_pieces[flag]
-
-    board_play[to_sq] = final_piece
-    piece_list[final_piece].append(to_sq)
-
-    #Handle castling - move the rook and lists
-    if flag == 'castle_short':
+        squares = piece_list[captured]
+        last = squares.pop()
+        if last != to_sq:
+            slot = piece_index[to_sq]
+            squares[slot] = last
+            piece_index[last] = slot
+        key ^= PIECE_KEYS[captured][to_sq]
+        mg -= MG_TABLE120[captured][to_sq]
+        eg -= EG_TABLE120[captured][to_sq]
+        board.phase -= PHASE_INC[captured]
+
+    #Move the piece, a promotion swaps the pawn for the new piece
+    if flag & PROMO_FLAG:
+        final_piece = PROMO_PIECES[flag & 3][board.side_to_move]
+        board.remove_piece(from_sq)
+        board.add_piece(final_piece, to_sq)
+        board.phase += PHASE_INC[final_piece]
+    else:
+        final_piece = piece
+        slot = piece_index[from_sq]
+        piece_list[piece][slot] = to_sq
+        piece_index[to_sq] = slot
+        board_play[to_sq] = piece
+        board_play[from_sq] = 0
+    key ^= PIECE_KEYS[piece][from_sq] ^ PIECE_KEYS[final_piece][to_sq]
+    mg += MG_TABLE120[final_piece][to_sq] - MG_TABLE120[piece][from_sq]
+    eg += EG_TABLE120[final_piece][to_sq] - EG_TABLE120[piece][from_sq]
+
+    #Handle castling - move the rook
+    if flag == CASTLE_SHORT:
         if board.side_to_move == 0:  #White
-            rook_from, rook_to, rook_piece = 98, 96, 'R'
+            rook_from, rook_to, rook_piece = 98, 96, WR
         else:  #Black
-            rook_from, rook_to, rook_piece = 28, 26, 'r'
-        piece_list[rook_piece].remove(rook_from)
-        board_play[rook_to] = board_play[rook_from]  #Rook f file
-        board_play[rook_from] = 0
-        piece_list[rook_piece].append(rook_to)
-    elif flag == 'castle_long':
+            rook_from, rook_to, rook_piece = 28, 26, BR
+        board.move_piece(rook_from, rook_to)  #Rook f file
+        key ^= PIECE_KEYS[rook_piece][rook_from] ^ PIECE_KEYS[rook_piece][rook_to]
+        mg += MG_TABLE120[rook_piece][rook_to] - MG_TABLE120[rook_piece][rook_from]
+        eg += EG_TABLE120[rook_piece][rook_to] - EG_TABLE120[rook_piece][rook_from]
+    elif flag == CASTLE_LONG:
         if board.side_to_move == 0:  #White
-            rook_from, rook_to, rook_piece = 91, 94, 'R'
+            rook_from, rook_to, rook_piece = 91, 94, WR
         else:  #Black
-            rook_from, rook_to, rook_piece = 21, 24, 'r'
-        piece_list[rook_piece].remove(rook_from)
-        board_play[rook_to] = board_play[rook_from]  #Rook d file
-        board_play[rook_from] = 0
-        piece_list[rook_piece].append(rook_to)
-    
-    #Update en passant square
-    if flag == 'double':
-        if board.side_to_move == 0:  #White double push
-            file = (from_sq % 10) - 1  #Convert to 0-7
-            board.en_passant = chr(ord('a') + file) + '3'
-        else:  #Black double push
-            file = (from_sq % 10) - 1
-            board.en_passant = chr(ord('a') + file) + '6'
+            rook_from, rook_to, rook_piece = 21, 24, BR
+        board.move_piece(rook_from, rook_to)  #Rook d file
+        key ^= PIECE_KEYS[rook_piece][rook_from] ^ PIECE_KEYS[rook_piece][rook_to]
+        mg += MG_TABLE120[rook_piece][rook_to] - MG_TABLE120[rook_piece][rook_from]
+        eg += EG_TABLE120[rook_piece][rook_to] - EG_TABLE120[rook_piece][rook_from]
+
+    #Update en passant square, it sits between the start and end of a double push
+    if flag == DOUBLE_PUSH:
+        board.ep_square = (from_sq + to_sq) >> 1
+        key ^= EN_PASSANT_KEYS[(from_sq % 10) - 1]
     else:
-        board.en_passant = None
-    
-    #Update castling rights
-    #King moves
-    if piece == 'K':
-        board.castle_white_short = 0
-        board.castle_white_long = 0
-    elif piece == 'k':
-        board.castle_black_short = 0
-        board.castle_black_long = 0
-    #Rook moves or captured
-    if from_sq == 98 or to_sq == 98:  #h1
-        board.castle_white_short = 0
-    if from_sq == 91 or to_sq == 91:  #a1
-        board.castle_white_long = 0
-    if from_sq == 28 or to_sq == 28:  #h8
-        board.castle_black_short = 0
-    if from_sq == 21 or to_sq == 21:  #a8
-        board.castle_black_long = 0
-    
+        board.ep_square = -1
+
+    #Update castling rights, king or rook moves and rook captures clear them
+    castling = board.castling
+    if castling:
+        new_castling = castling & CASTLE_MASK[from_sq] & CASTLE_MASK[to_sq]
+        if new_castling != castling:
+            key ^= CASTLE_HASH[castling] ^ CASTLE_HASH[new_castling]
+            board.castling = new_castling
+
     #Update halfmove clock
-    if piece in ('P', 'p') or captured != 0:
+    if piece == WP or piece == BP or captured != 0:
         board.half_move_counter = 0
     else:
         board.half_move_counter += 1
-    
+
     #Update fullmove counter
     if board.side_to_move == 1:
         board.full_move_counter += 1
-    
+
     #Switch side
     board.side_to_move = 1 - board.side_to_move
-    
-    return undo
+    board.hash_key = key
+    board.mg_score = mg
+    board.eg_score = eg
 
 
-def unmake_move(board: Board, undo: dict):
-    """Undo a move using the undo info from make_move."""
-    from_sq = undo['from_sq']
-    to_sq = undo['to_sq']
-    flag = undo['flag']
-    
-    board_play = board.board_play
-    piece_list = board.piece_list
+def unmake_move(board: Board):
+    """Undo the last move on the board's undo stack."""
+    ply = board.ply - 1
+    board.ply = ply
+    move = board.undo_move[ply]
+    captured_piece = board.undo_captured[ply]
+
+    from_sq = MAILBOX64[move & 63]
+    to_sq = MAILBOX64[(move >> 6) & 63]
+    flag = move >> 12
 
     #Switch side back
     board.side_to_move = 1 - board.side_to_move
+    if board.side_to_move == 1:
+        board.full_move_counter -= 1
 
-    moved_piece = undo['moved_piece']
-    captured_piece = undo['captured_piece']
+    board_play = board.board_play
+    piece_list = board.piece_list
+    piece_index = board.piece_index
 
-    #Remove the piece that currently sits on the destination square
-    current_piece = board_play[to_sq]
-    if current_piece != 0:
-        piece_list[current_piece].remove(to_sq)
-    board_play[to_sq] = 0
+    #Move the piece back, a promotion turns back into the pawn
+    if flag & PROMO_FLAG:
+        board.remove_piece(to_sq)
+        board.add_piece(WP if board.side_to_move == 0 else BP, from_sq)
+    else:
+        moved_piece = board_play[to_sq]
+        slot = piece_index[to_sq]
+        piece_list[moved_piece][slot] = from_sq
+        piece_index[from_sq] = slot
+        board_play[from_sq] = moved_piece
+        board_play[to_sq] = 0
 
     #Handle castling - move rook back
-    if flag == 'castle_short':
+    if flag == CASTLE_SHORT:
         if board.side_to_move == 0:  #White
-            rook_from, rook_to, rook_piece = 96, 98, 'R'
+            board.move_piece(96, 98)
         else:  #Black
-            rook_from, rook_to, rook_piece = 26, 28, 'r'
-        piece_list[rook_piece].remove(rook_from)
-        board_play[rook_to] = board_play[rook_from]
-        board_play[rook_from] = 0
-        piece_list[rook_piece].append(rook_to)
-    elif flag == 'castle_long':
+            board.move_piece(26, 28)
+    elif flag == CASTLE_LONG:
         if board.side_to_move == 0:  #White
-            rook_from, rook_to, rook_piece = 94, 91, 'R'
+            board.move_piece(94, 91)
         else:  #Black
-            rook_from, rook_to, rook_piece = 24, 21, 'r'
-        piece_list[rook_piece].remove(rook_from)
-        board_play[rook_to] = board_play[rook_from]
-        board_play[rook_from] = 0
-        piece_list[rook_piece].append(rook_to)
-
-    #Restore the moved piece
-    board_play[from_sq] = moved_piece
-    piece_list[moved_piece].append(from_sq)
+            board.move_piece(24, 21)
 
     #Restore captured piece on destination square
-    board_play[to_sq] = captured_piece
     if captured_piece != 0:
-        piece_list[captured_piece].append(to_sq)
+        squares = piece_list[captured_piece]
+        piece_index[to_sq] = len(squares)
+        squares.append(to_sq)
+        board_play[to_sq] = captured_piece
 
     #Handle en passant - restore captured pawn
-    if flag == 'en_passant':
-        captured_sq = undo['en_passant_captured_sq']
-        captured_pawn = undo['en_passant_captured_piece']
-        board_play[captured_sq] = captured_pawn
-        piece_list[captured_pawn].append(captured_sq)
+    if flag == EN_PASSANT:
+        if board.side_to_move == 0:
+            board.add_piece(BP, to_sq + 10)
+        else:
+            board.add_piece(WP, to_sq - 10)
 
     #Restore board state
-    board.castle_white_short = undo['castle_white_short']
-    board.castle_white_long = undo['castle_white_long']
-    board.castle_black_short = undo['castle_black_short']
-    board.castle_black_long = undo['castle_black_long']
-    board.en_passant = undo['en_passant']
-    board.half_move_counter = undo['half_move_counter']
-    board.full_move_counter = undo['full_move_counter']
\ No newline at end of file
+    board.castling = board.undo_castling[ply]
+    board.ep_square = board.undo_ep_square[ply]
+    board.half_move_counter = board.undo_half_move[ply]
+    board.hash_key = board.undo_hash[ply]
+    board.mg_score = board.undo_mg[ply]
+    board.eg_score = board.undo_eg[ply]
+    board.phase = board.undo_phase[ply]
+
+
+def make_null_move(board: Board):
+    """Pass the move to the other side, for null move pruning. Pushed on the undo stack like a move."""
+    ply = board.ply
+    if ply == len(board.undo_move):
+        board.grow_undo_stack()
+    board.undo_move[ply] = NULL_MOVE
+    board.undo_captured[ply] = 0
+    board.undo_castling[ply] = board.castling
+    board.undo_ep_square[ply] = board.ep_square
+    board.undo_half_move[ply] = board.half_move_counter
+    board.undo_hash[ply] = board.hash_key
+    board.undo_mg[ply] = board.mg_score
+    board.undo_eg[ply] = board.eg_score
+    board.undo_phase[ply] = board.phase
+    board.ply = ply + 1
+
+    key = board.hash_key ^ SIDE_KEY
+    if board.ep_square != -1:
+        key ^= EN_PASSANT_KEYS[(board.ep_square % 10) - 1]
+        board.ep_square = -1
+    board.hash_key = key
+    #Positions before a null move cannot repeat after it, the repetition scan stops here
+    board.half_move_counter = 0
+    if board.side_to_move == 1:
+        board.full_move_counter += 1
+    board.side_to_move = 1 - board.side_to_move
+
+
+def unmake_null_move(board: Board):
+    """Undo make_null_move."""
+    ply = board.ply - 1
+    board.ply = ply
+    board.side_to_move = 1 - board.side_to_move
+    if board.side_to_move == 1:
+        board.full_move_counter -= 1
+    board.ep_square = board.undo_ep_square[ply]
+    board.half_move_counter = board.undo_half_move[ply]
+    board.hash_key = board.undo_hash[ply]
@@ -0,0 +1,73 @@
+"""Packed 16-bit move encoding shared by all backends.
+
+bits 0-5   from square (64 index, a8 = 0 ... h1 = 63, same as Board.mailbox64)
+bits 6-11  to square
+bits 12-15 flag, see the move flags in constants.py
+
+Generators write moves into preallocated array('H') buffers, one per ply, and
+return how many they wrote. The helpers below are for the edges of the engine
+(UCI, perft divide, tests), the hot paths work on the bits directly.
+"""
+from array import array
+from constants import (
+    QUIET, DOUBLE_PUSH, CASTLE_SHORT, CASTLE_LONG, EN_PASSANT,
+    PROMO_N, PROMO_B, PROMO_R, PROMO_Q, PROMO_FLAG, CAPTURE_FLAG, KNIGHT,
+)
+
+MAX_MOVES = 256 #More than the most legal moves any position has (218)
+
+NULL_MOVE = 0 #a8a8, never a real move
+
+#Names used by perft divide output, plain moves and captures have none
+FLAG_NAMES = {
+    DOUBLE_PUSH: 'double',
+    CASTLE_SHORT: 'castle_short',
+    CASTLE_LONG: 'castle_long',
+    EN_PASSANT: 'en_passant',
+    PROMO_N: 'promo_n', PROMO_B: 'promo_b', PROMO_R: 'promo_r', PROMO_Q: 'promo_q',
+    PROMO_N | CAPTURE_FLAG: 'promo_n', PROMO_B | CAPTURE_FLAG: 'promo_b',
+    PROMO_R | CAPTURE_FLAG: 'promo_r', PROMO_Q | CAPTURE_FLAG: 'promo_q',
+}
+
+
+def new_move_buffer() -> array:
+    """A buffer big enough for the moves of any position."""
+    return array('H', bytes(2 * MAX_MOVES))
+
+
+def encode_move(from_sq: int, to_sq: int, flag: int = QUIET) -> int:
+    return from_sq | (to_sq << 6) | (flag << 12)
+
+
+def move_from(move: int) -> int:
+    return move & 63
+
+
+def move_to(move: int) -> int:
+    return (move >> 6) & 63
+
+
+def move_flag(move: int) -> int:
+    return move >> 12
+
+
+def is_capture(move: int) -> bool:
+    return bool((move >> 12) & CAPTURE_FLAG)
+
+
+def promo_piece_type(move: int) -> int:
+    """Piece type a promotion turns into, 0 for other moves."""
+    flag = move >> 12
+    if flag & PROMO_FLAG:
+        return KNIGHT + (flag & 3)
+    return 0
+
+
+def square_name(sq64: int) -> str:
+    """64 index to algebraic (0 -> 'a8')."""
+    return chr(ord('a') + (sq64 & 7)) + str(8 - (sq64 >> 3))
+
+
+def square_from_name(name: str) -> int:
+    """Algebraic to 64 index ('a8' -> 0)."""
+    return (8 - int(name[1])) * 8 + ord(name[0]) - ord('a')
@@ -1,315 +1,736 @@
-from board import Board
-from constants import QUEEN_OFFSET,KING_OFFSET,BISHOP_OFFSET,KNIGHT_OFFSET,ROOK_OFFSET,ROW_2,ROW_7,ROW_5,ROW_4,ROW_8,ROW_1
-from make_move import make_move, unmake_move
+from board import Board, MAILBOX120, MAILBOX64
+from constants import KING_OFFSET,BISHOP_OFFSET,KNIGHT_OFFSET,ROOK_OFFSET,ROW_2,ROW_7,ROW_5,ROW_4,ROW_8,ROW_1
+from constants import WP, WN, WB, WR, WQ, WK, BP, BN, BB, BR, BQ, BK, CASTLE_WK, CASTLE_WQ, CASTLE_BK, CASTLE_BQ
+from constants import DOUBLE_PUSH, CASTLE_SHORT, CASTLE_LONG, CAPTURE, EN_PASSANT, PROMO_N, PROMO_B, PROMO_R, PROMO_Q
+from constants import CAPTURE_FLAG, PROMO_FLAG, PAWN, KNIGHT, BAD_CAPTURE_SEE
+from move_encoding import new_move_buffer, NULL_MOVE
 
+#Piece codes each side may capture
+WHITE_PIECES = frozenset((WP, WN, WB, WR, WQ, WK))
+BLACK_PIECES = frozenset((BP, BN, BB, BR, BQ, BK))
 
-def knight_gen(board: Board, hostile: set) -> list: 
-    """Generate a list of moves for knights"""
-    moves = []
+#Packed move = from | to << 6 | flag << 12 with 64-square indices, these are the flag parts
+CAPTURE_BITS = CAPTURE << 12
+PROMO_BITS = (PROMO_Q << 12, PROMO_R << 12, PROMO_B << 12, PROMO_N << 12)
+
+#Precomputed attack tables indexed by 120 square, empty for the border squares.
+#Targets and rays only hold on-board squares so the loops below need no bound checks
+def _on_board_targets(offsets: list) -> list:
+    table = [()] * 120
+    for sq in MAILBOX64:
+        table[sq] = tuple(sq + offset for offset in offsets if MAILBOX120[sq + offset] != -1)
+    return table
+
+def _rays(offsets: list) -> list:
+    """One tuple of squares per direction, nearest first, directions that leave the board at once are left out"""
+    table = [()] * 120
+    for sq in MAILBOX64:
+        rays = []
+        for offset in offsets:
+            ray = []
+            target = sq + offset
+            while MAILBOX120[target] != -1:
+                ray.append(target)
+                target += offset
+            if ray:
+                rays.append(tuple(ray))
+        table[sq] = tuple(rays)
+    return table
+
+def _between(offsets: list) -> list:
+    """For each square a dict of the squares on its lines -> the squares strictly between them"""
+    table = [{} for _ in range(120)]
+    for sq in MAILBOX64:
+        for offset in offsets:
+            target = sq + offset
+            between = ()
+            while MAILBOX120[target] != -1:
+                table[sq][target] = between
+                between += (target,)
+                target += offset
+    return table
+
+KNIGHT_TARGETS = _on_board_targets(KNIGHT_OFFSET)
+KING_TARGETS = _on_board_targets(KING_OFFSET)
+#Squares a pawn of each side attacks from a square, also where the other side's attacking pawns stand
+PAWN_ATTACKS = (_on_board_targets([-9, -11]), _on_board_targets([9, 11]))
+ROOK_RAYS = _rays(ROOK_OFFSET)
+BISHOP_RAYS = _rays(BISHOP_OFFSET)
+QUEEN_RAYS = [ROOK_RAYS[sq] + BISHOP_RAYS[sq] for sq in range(120)]
+ROOK_BETWEEN = _between(ROOK_OFFSET)
+BISHOP_BETWEEN = _between(BISHOP_OFFSET)
+
+#Every generator below writes packed moves into buffer starting at index n
+#and returns the new number of moves in the buffer. captures/quiets select which
+#moves are written so the move picker can generate one kind at a time
+
+
+def knight_gen(board: Board, buffer, n: int, hostile: set, captures: bool = True, quiets: bool = True) -> int:
+    """Generate moves for knights"""
     if board.side_to_move == 0:
-        knight = 'N'
+        knight = WN
     elif board.side_to_move == 1:
-        knight = 'n'
+        knight = BN
+    mailbox120 = board.mailbox120
+    board_play = board.board_play
     
     #We get the indices where are knights are from piecelist
     knight_indices = board.piece_list[knight]
     #We go to each piece
     for knight_pos in knight_indices:
-        #We move over each offset
-        for offset in KNIGHT_OFFSET:
-            #Check if the square is in bounds
-            if board.mailbox120[knight_pos + offset] != -1:
+        from64 = mailbox120[knight_pos]
+        #We move over each on-board target
+        for target in KNIGHT_TARGETS[knight_pos]:
             #If the target square is empty or hostile we add the move
-                if board.board_play[knight_pos + offset] == 0 or board.board_play[knight_pos + offset] in hostile:
-                    moves.append((knight_pos, knight_pos + offset))
-    return moves
-            
-def bishop_gen(board: Board, hostile: set) -> list:
-    """Generate a list of moves for bishops"""
-    moves = []
-    if board.side_to_move == 0:
-        bishop = 'B'
-    elif board.side_to_move == 1:
-        bishop = 'b'
-    bishop_indices = board.piece_list[bishop]
-
-    for start in bishop_indices:
-        for offset in BISHOP_OFFSET:
-            target = start + offset
-            #We need to go until we are out of bounds or we find hostile(inclusive) piece or friendly(exclusive)
-            while board.mailbox120[target] != -1:
-                piece = board.board_play[target]
-                if piece == 0:
-                    #Empty square - add move and continue sliding
-                    moves.append((start, target))
-                    target += offset
-                elif piece in hostile:
-                    #Capture - add move and stop
-                    moves.append((start, target))
-                    break
-                else:
-                    #Friendly piece - stop
-                    break
-    return moves
+            piece = board_play[target]
+            if piece == 0:
+                if quiets:
+                    buffer[n] = from64 | (mailbox120[target] << 6)
+                    n += 1
+            elif piece in hostile:
+                if captures:
+                    buffer[n] = from64 | (mailbox120[target] << 6) | CAPTURE_BITS
+                    n += 1
+    return n
 
-def rook_gen(board: Board, hostile: set)-> list:
-    '''Generate a list of moves for rooks'''
-    moves = []
-    if board.side_to_move == 0:
-        rook = 'R'
-    elif board.side_to_move == 1:
-        rook = 'r'
-    rook_indices = board.piece_list[rook]
-
-    for start in rook_indices:
-        for offset in ROOK_OFFSET:
-            target = start + offset
-            #Same as bishop
-            while board.mailbox120[target] != -1:
-                piece = board.board_play[target]
+def _slider_gen(board: Board, buffer, n: int, hostile: set, piece_squares: list, rays_table: list, captures: bool, quiets: bool) -> int:
+    """Generate moves for sliding pieces along their precomputed rays"""
+    mailbox120 = board.mailbox120
+    board_play = board.board_play
+    for start in piece_squares:
+        from64 = mailbox120[start]
+        for ray in rays_table[start]:
+            #We need to go until the ray ends or we find hostile(inclusive) piece or friendly(exclusive)
+            for target in ray:
+                piece = board_play[target]
                 if piece == 0:
                     #Empty square - add move and continue sliding
-                    moves.append((start, target))
-                    target += offset
+                    if quiets:
+                        buffer[n] = from64 | (mailbox120[target] << 6)
+                        n += 1
                 elif piece in hostile:
                     #Capture - add move and stop
-                    moves.append((start, target))
+                    if captures:
+                        buffer[n] = from64 | (mailbox120[target] << 6) | CAPTURE_BITS
+                        n += 1
                     break
                 else:
                     #Friendly piece - stop
                     break
-    return moves
+    return n
 
-def queen_gen(board: Board, hostile: set)-> list:
-    '''Generate a list of moves for queen'''
-    moves = []
-    #Same as rook or bishop
-    if board.side_to_move == 0:
-        queen = 'Q'
-    elif board.side_to_move == 1:
-        queen = 'q'
-    queen_indices = board.piece_list[queen]
-
-    for start in queen_indices:
-        for offset in QUEEN_OFFSET:
-            target = start + offset
-            #Same as rook or bishop
-            while board.mailbox120[target] != -1:
-                piece = board.board_play[target]
-                if piece == 0:
-                    #Empty square - add move and continue sliding
-                    moves.append((start, target))
-                    target += offset
-                elif piece in hostile:
-                    #Capture - add move and stop
-                    moves.append((start, target))
-                    break
-                else:
-                    #Friendly piece - stop
-                    break
-    return moves
+def bishop_gen(board: Board, buffer, n: int, hostile: set, captures: bool = True, quiets: bool = True) -> int:
+    """Generate moves for bishops"""
+    bishop = WB if board.side_to_move == 0 else BB
+    return _slider_gen(board, buffer, n, hostile, board.piece_list[bishop], BISHOP_RAYS, captures, quiets)
+
+def rook_gen(board: Board, buffer, n: int, hostile: set, captures: bool = True, quiets: bool = True) -> int:
+    '''Generate moves for rooks'''
+    rook = WR if board.side_to_move == 0 else BR
+    return _slider_gen(board, buffer, n, hostile, board.piece_list[rook], ROOK_RAYS, captures, quiets)
+
+def queen_gen(board: Board, buffer, n: int, hostile: set, captures: bool = True, quiets: bool = True) -> int:
+    '''Generate moves for queens, same as rook and bishop together'''
+    queen = WQ if board.side_to_move == 0 else BQ
+    return _slider_gen(board, buffer, n, hostile, board.piece_list[queen], QUEEN_RAYS, captures, quiets)
 
-def king_gen(board: Board, hostile: set)-> list:
-    """Generate a list of moves for a king"""
-    moves = []
+#Castling moves, encoded once: e1g1, e1c1, e8g8, e8c8
+WHITE_CASTLE_SHORT = 60 | (62 << 6) | (CASTLE_SHORT << 12)
+WHITE_CASTLE_LONG = 60 | (58 << 6) | (CASTLE_LONG << 12)
+BLACK_CASTLE_SHORT = 4 | (6 << 6) | (CASTLE_SHORT << 12)
+BLACK_CASTLE_LONG = 4 | (2 << 6) | (CASTLE_LONG << 12)
+
+def king_gen(board: Board, buffer, n: int, hostile: set, captures: bool = True, quiets: bool = True) -> int:
+    """Generate moves for a king"""
     if board.side_to_move == 0:
-        king = 'K'
+        king = WK
     elif board.side_to_move == 1:
-        king = 'k'
+        king = BK
     king_indices = board.piece_list[king]
+    mailbox120 = board.mailbox120
+    board_play = board.board_play
 
     #We start the same with capture/move moves
     for king_pos in king_indices:
-        for offset in KING_OFFSET:
-            if board.mailbox120[king_pos+offset] != -1:
-                if board.board_play[king_pos + offset] == 0 or board.board_play[king_pos + offset] in hostile:
-                    moves.append((king_pos, king_pos + offset))
+        from64 = mailbox120[king_pos]
+        for target in KING_TARGETS[king_pos]:
+            piece = board_play[target]
+            if piece == 0:
+                if quiets:
+                    buffer[n] = from64 | (mailbox120[target] << 6)
+                    n += 1
+            elif piece in hostile:
+                if captures:
+                    buffer[n] = from64 | (mailbox120[target] << 6) | CAPTURE_BITS
+                    n += 1
     #Now we need castling
     #We check board info if castling allowed at all or already not
+    if not quiets:
+        return n
     if board.side_to_move == 0:
-        if board.castle_white_short:
-            if board.board_play[96] == 0 and board.board_play[97] == 0 and is_square_attacked(board,95,1) == False and is_square_attacked(board,96,1) == False and is_square_attacked(board,97,1) == False:
-                #King moves from e1 to g1
-                moves.append((95,97,'castle_short'))
-                #We add 'castle_x' flag to the tuple so that we can later move a rook when castling
-        if board.castle_white_long:
-            if board.board_play[92] == 0 and board.board_play[93] == 0 and board.board_play[94] == 0 and is_square_attacked(board,95,1) == False and is_square_attacked(board,94,1) == False and is_square_attacked(board,93,1) == False:
+        if board.castling & CASTLE_WK:
+            if board_play[96] == 0 and board_play[97] == 0 and is_square_attacked(board,95,1) == False and is_square_attacked(board,96,1) == False and is_square_attacked(board,97,1) == False:
+                #King moves from e1 to g1, the castle flag tells make_move to move the rook too
+                buffer[n] = WHITE_CASTLE_SHORT
+                n += 1
+        if board.castling & CASTLE_WQ:
+            if board_play[92] == 0 and board_play[93] == 0 and board_play[94] == 0 and is_square_attacked(board,95,1) == False and is_square_attacked(board,94,1) == False and is_square_attacked(board,93,1) == False:
                 #King moves from e1 to c1
-                moves.append((95,93,'castle_long'))
+                buffer[n] = WHITE_CASTLE_LONG
+                n += 1
     if board.side_to_move == 1:
-        if board.castle_black_short:
-            if board.board_play[26] == 0 and board.board_play[27] == 0 and is_square_attacked(board,25,0) == False and is_square_attacked(board,26,0) == False and is_square_attacked(board,27,0) == False:
+        if board.castling & CASTLE_BK:
+            if board_play[26] == 0 and board_play[27] == 0 and is_square_attacked(board,25,0) == False and is_square_attacked(board,26,0) == False and is_square_attacked(board,27,0) == False:
                 #King moves from e8 to g8
-                moves.append((25,27,'castle_short'))
-        if board.castle_black_long:
-            if board.board_play[22] == 0 and board.board_play[23] == 0 and board.board_play[24] == 0 and is_square_attacked(board,25,0) == False and is_square_attacked(board,24,0) == False and is_square_attacked(board,23,0) == False:
+                buffer[n] = BLACK_CASTLE_SHORT
+                n += 1
+        if board.castling & CASTLE_BQ:
+            if board_play[22] == 0 and board_play[23] == 0 and board_play[24] == 0 and is_square_attacked(board,25,0) == False and is_square_attacked(board,24,0) == False and is_square_attacked(board,23,0) == False:
                 #King moves from e8 to c8
-                moves.append((25,23,'castle_long'))
-    return moves
+                buffer[n] = BLACK_CASTLE_LONG
+                n += 1
+    return n
 
-def pawn_gen(board: Board, hostile: set) -> list:
-    '''Generate pawn moves'''
-    moves = []
-    
+def pawn_gen(board: Board, buffer, n: int, hostile: set, captures: bool = True, quiets: bool = True, promotions: bool = True) -> int:
+    '''Generate pawn moves, promotions are pushes to the last row (capture promotions count as captures)'''
     if board.side_to_move == 0:  #White
-        pawn = 'P'
+        pawn = WP
         forward = -10
         start_row = ROW_2
-        passant_row = ROW_5
         promo_row = ROW_8
-        capture_offsets = [-9, -11]
     else:  #Black
-        pawn = 'p'
+        pawn = BP
         forward = 10
         start_row = ROW_7
-        passant_row = ROW_4
         promo_row = ROW_1
-        capture_offsets = [9, 11]
+    mailbox120 = board.mailbox120
+    board_play = board.board_play
     
     pawn_indexs = board.piece_list[pawn]
-    ep_target = board.en_passant_to_index() if board.en_passant else -1
+    ep_target = board.ep_square
+    capture_targets = PAWN_ATTACKS[board.side_to_move]
     
     for x in pawn_indexs:
-        #Single push
+        from64 = mailbox120[x]
+        #Single push, a pawn is never on the last row so the target is on the board
         target = x + forward
-        if board.mailbox120[target] != -1 and board.board_play[target] == 0:
+        if board_play[target] == 0:
+            move = from64 | (mailbox120[target] << 6)
             if target in promo_row:
                 # Promotion moves
-                moves.append((x, target, 'promo_q'))
-                moves.append((x, target, 'promo_r'))
-                moves.append((x, target, 'promo_b'))
-                moves.append((x, target, 'promo_n'))
-            else:
-                moves.append((x, target))
+                if promotions:
+                    for promo in PROMO_BITS:
+                        buffer[n] = move | promo
+                        n += 1
+            elif quiets:
+                buffer[n] = move
+                n += 1
             
-            #Double push (only if single push was valid and on starting row)
-            if x in start_row:
-                target2 = x + forward * 2
-                if board.board_play[target2] == 0:
-                    moves.append((x, target2, 'double'))
+                #Double push (only if single push was valid and on starting row)
+                if x in start_row:
+                    target2 = x + forward * 2
+                    if board_play[target2] == 0:
+                        buffer[n] = from64 | (mailbox120[target2] << 6) | (DOUBLE_PUSH << 12)
+                        n += 1
         
-        #Captures (including en passant)
-        for offset in capture_offsets:
-            target = x + offset
-            if board.mailbox120[target] == -1:
-                continue
-            
-            piece_at_target = board.board_play[target]
-            is_capture = piece_at_target in hostile
-            is_en_passant = (x in passant_row and target == ep_target)
-            
-            if is_capture or is_en_passant:
-                if target in promo_row:
-                    moves.append((x, target, 'promo_q'))
-                    moves.append((x, target, 'promo_r'))
-                    moves.append((x, target, 'promo_b'))
-                    moves.append((x, target, 'promo_n'))
-                elif is_en_passant:
-                    moves.append((x, target, 'en_passant'))
-                else:
-                    moves.append((x, target))
+        #Captures (including en passant, the target only equals ep_target from the right row)
+        if captures:
+            for target in capture_targets[x]:
+                to64 = mailbox120[target]
+                if board_play[target] in hostile:
+                    move = from64 | (to64 << 6) | CAPTURE_BITS
+                    if target in promo_row:
+                        for promo in PROMO_BITS:
+                            buffer[n] = move | promo
+                            n += 1
+                    else:
+                        buffer[n] = move
+                        n += 1
+                elif target == ep_target:
+                    buffer[n] = from64 | (to64 << 6) | (EN_PASSANT << 12)
+                    n += 1
     
-    return moves
+    return n
 
 def is_square_attacked(board:Board,square:int,side:int)->bool:
-    '''Check if a square is attacked by the GIVEN side'''
-    
-    #Pawn attacks
+    '''Check if a square is attacked by the GIVEN side
+
+    Looks back from the square with the precomputed tables. For sliders only the
+    pieces lined up with the square are looked at, and only the squares between
+    them and the square are walked.
+    '''
+    board_play = board.board_play
+    piece_list = board.piece_list
     if side == 0:
-        pawn_offsets = [9, 11]  #Look below for white pawns
-        pawn = 'P'
+        pawn, knight, bishop, rook, queen, king = WP, WN, WB, WR, WQ, WK
     else:
-        pawn_offsets = [-9, -11]  #Look above for black pawns
-        pawn = 'p'
-    for offset in pawn_offsets:
-        target = square + offset
-        if board.mailbox120[target] != -1:
-            if board.board_play[target] == pawn:
-                return True
-    
+        pawn, knight, bishop, rook, queen, king = BP, BN, BB, BR, BQ, BK
+
+    #Pawn attacks, an attacking pawn stands where a pawn of the other side on the square would capture
+    for target in PAWN_ATTACKS[1 - side][square]:
+        if board_play[target] == pawn:
+            return True
+
     #Knight attacks
-    knight = 'N' if side == 0 else 'n'
-    for offset in KNIGHT_OFFSET:
-        target = square + offset
-        if board.mailbox120[target] != -1:
-            if board.board_play[target] == knight:
-                return True
-    
-    #Bishop/Queen attacks (diagonal)
-    bishop = 'B' if side == 0 else 'b'
-    queen = 'Q' if side == 0 else 'q'
-    for offset in BISHOP_OFFSET:
-        target = square + offset
-        while board.mailbox120[target] != -1:
-            piece = board.board_play[target]
-            if piece == 0:
-                target += offset
-            elif piece == bishop or piece == queen:
-                return True
+    for target in KNIGHT_TARGETS[square]:
+        if board_play[target] == knight:
+            return True
+
+    #King attacks
+    for target in KING_TARGETS[square]:
+        if board_play[target] == king:
+            return True
+
+    #Slider attacks, the square is attacked if one lines up and nothing stands between
+    queens = piece_list[queen]
+    lines = BISHOP_BETWEEN[square]
+    for slider_sq in piece_list[bishop] + queens:
+        between = lines.get(slider_sq)
+        if between is not None:
+            for target in between:
+                if board_play[target]:
+                    break
             else:
-                break  #Any other piece blocks
-    
-    #Rook/Queen attacks (orthogonal)
-    rook = 'R' if side == 0 else 'r'
-    for offset in ROOK_OFFSET:
-        target = square + offset
-        while board.mailbox120[target] != -1:
-            piece = board.board_play[target]
-            if piece == 0:
-                target += offset
-            elif piece == rook or piece == queen:
                 return True
+    lines = ROOK_BETWEEN[square]
+    for slider_sq in piece_list[rook] + queens:
+        between = lines.get(slider_sq)
+        if between is not None:
+            for target in between:
+                if board_play[target]:
+                    break
             else:
-                break  #Any other piece blocks
-    
-    #King attacks
-    king = 'K' if side == 0 else 'k'
-    for offset in KING_OFFSET:
-        target = square + offset
-        if board.mailbox120[target] != -1:
-            if board.board_play[target] == king:
                 return True
-    
+
     return False
 
-def generate_moves(board: Board) -> list:
-    """Generates all pseudo-legal moves for the side to move"""
+def in_check(board: Board) -> bool:
+    """Is the side to move in check"""
+    king = WK if board.side_to_move == 0 else BK
+    king_positions = board.piece_list[king]
+    return bool(king_positions) and is_square_attacked(board, king_positions[0], 1 - board.side_to_move)
+
+def has_non_pawn_material(board: Board, side: int) -> bool:
+    """Does side have a piece other than pawns and the king"""
+    piece_list = board.piece_list
+    if side == 0:
+        return bool(piece_list[WN] or piece_list[WB] or piece_list[WR] or piece_list[WQ])
+    return bool(piece_list[BN] or piece_list[BB] or piece_list[BR] or piece_list[BQ])
+
+def piece_count(board: Board) -> int:
+    """Number of pieces on the board, kings and pawns included"""
+    return sum(map(len, board.piece_list))
+
+def piece_squares(board: Board) -> list:
+    """(piece, 64 square) of every piece on the board"""
+    return [(piece, MAILBOX120[sq120]) for piece, squares in enumerate(board.piece_list) for sq120 in squares]
+
+def generate_moves(board: Board, buffer) -> int:
+    """Generates all pseudo-legal moves for the side to move into buffer, returns the count"""
     #Pre-compute hostile pieces once
     if board.side_to_move == 0:
-        hostile = {'p','n','b','r','q','k'}
+        hostile = BLACK_PIECES
     else:
-        hostile = {'P','N','B','R','Q','K'}
+        hostile = WHITE_PIECES
     
-    moves = []
-    moves.extend(pawn_gen(board, hostile))
-    moves.extend(knight_gen(board, hostile))
-    moves.extend(bishop_gen(board, hostile))
-    moves.extend(rook_gen(board, hostile))
-    moves.extend(queen_gen(board, hostile))
-    moves.extend(king_gen(board, hostile))
-    return moves
-
-def generate_legal_moves(board: Board)-> list:
-    """Generate legal moves(filter out the illegal ones)"""
-    pseudo_moves = generate_moves(board)
-    legal_moves = []
-    for move in pseudo_moves:
-        undo = make_move(board, move)
-        
-        #Find our king and check if it's attacked
-        #After make_move, side_to_move has switched, so:
-        #If we were white (0), now it's black's turn (1), our king is 'K'
-        #If we were black (1), now it's white's turn (0), our king is 'k'
-        king = 'K' if board.side_to_move == 1 else 'k'
-        king_positions = board.piece_list[king]
-        
-        #Check if king still exists (shouldn't be captured in legal position)
-        if king_positions:
-            king_sq = king_positions[0]
-            #Check if opponent (current side_to_move) is attacking our king
-            if not is_square_attacked(board, king_sq, board.side_to_move):
-                legal_moves.append(move)
-        
-        unmake_move(board, undo)
-    
-    return legal_moves
\ No newline at end of file
+    n = pawn_gen(board, buffer, 0, hostile)
+    n = knight_gen(board, buffer, n, hostile)
+    n = bishop_gen(board, buffer, n, hostile)
+    n = rook_gen(board, buffer, n, hostile)
+    n = queen_gen(board, buffer, n, hostile)
+    n = king_gen(board, buffer, n, hostile)
+    return n
+
+def generate_captures(board: Board, buffer, n: int = 0) -> int:
+    """Pseudo-legal captures (with capture promotions and en passant) only"""
+    hostile = BLACK_PIECES if board.side_to_move == 0 else WHITE_PIECES
+    n = pawn_gen(board, buffer, n, hostile, True, False, False)
+    n = knight_gen(board, buffer, n, hostile, True, False)
+    n = bishop_gen(board, buffer, n, hostile, True, False)
+    n = rook_gen(board, buffer, n, hostile, True, False)
+    n = queen_gen(board, buffer, n, hostile, True, False)
+    n = king_gen(board, buffer, n, hostile, True, False)
+    return n
+
+def generate_promotions(board: Board, buffer, n: int = 0) -> int:
+    """Pseudo-legal promotions by a push (not a capture)"""
+    hostile = BLACK_PIECES if board.side_to_move == 0 else WHITE_PIECES
+    return pawn_gen(board, buffer, n, hostile, False, False, True)
+
+def generate_quiets(board: Board, buffer, n: int = 0) -> int:
+    """Pseudo-legal moves that neither capture nor promote, castling included"""
+    hostile = BLACK_PIECES if board.side_to_move == 0 else WHITE_PIECES
+    n = pawn_gen(board, buffer, n, hostile, False, True, False)
+    n = knight_gen(board, buffer, n, hostile, False, True)
+    n = bishop_gen(board, buffer, n, hostile, False, True)
+    n = rook_gen(board, buffer, n, hostile, False, True)
+    n = queen_gen(board, buffer, n, hostile, False, True)
+    n = king_gen(board, buffer, n, hostile, False, True)
+    return n
+
+def checks_and_pins(board: Board, king_sq: int) -> tuple:
+    """Find what attacks the king of the side to move and which of its pieces are pinned.
+
+    Returns (checkers, evasion, pins): checkers is a list of checking piece squares,
+    evasion the set of squares a non-king move must land on to answer a single check
+    (the checker and the squares between it and the king), pins maps a pinned piece
+    square to the squares it may still move to (its ray up to and including the pinner).
+    """
+    board_play = board.board_play
+    if board.side_to_move == 0:
+        own = WHITE_PIECES
+        line_attackers = (BR, BQ)
+        diag_attackers = (BB, BQ)
+        knight = BN
+        pawn = BP
+    else:
+        own = BLACK_PIECES
+        line_attackers = (WR, WQ)
+        diag_attackers = (WB, WQ)
+        knight = WN
+        pawn = WP
+
+    checkers = []
+    evasion = set()
+    pins = {}
+
+    #Walk the 8 rays from the king, the first own piece on a ray is pinned if an enemy slider is behind it
+    for rays, attackers in ((ROOK_RAYS[king_sq], line_attackers), (BISHOP_RAYS[king_sq], diag_attackers)):
+        for ray in rays:
+            pinned = -1
+            for i, target in enumerate(ray):
+                piece = board_play[target]
+                if piece != 0:
+                    if piece in own:
+                        if pinned != -1:
+                            break #Two own pieces, nothing is pinned
+                        pinned = target
+                    else:
+                        if piece == attackers[0] or piece == attackers[1]:
+                            if pinned == -1:
+                                checkers.append(target)
+                                evasion.update(ray[:i + 1])
+                            else:
+                                pins[pinned] = set(ray[:i + 1])
+                        break
+
+    for target in KNIGHT_TARGETS[king_sq]:
+        if board_play[target] == knight:
+            checkers.append(target)
+            evasion.add(target)
+    for target in PAWN_ATTACKS[board.side_to_move][king_sq]:
+        if board_play[target] == pawn:
+            checkers.append(target)
+            evasion.add(target)
+
+    return checkers, evasion, pins
+
+def is_legal(board: Board, move: int, king_sq: int, checkers: list, evasion: set, pins: dict) -> bool:
+    """Is a pseudo-legal move legal, given checks_and_pins for the position
+
+    - king moves: the target may not be attacked with the king lifted off its square
+    - in check: other moves must capture the checker or block the ray, in double check only the king moves
+    - pinned pieces: may only move along the pin ray
+    - en passant: played out on the board, both pawns leaving the rank can expose the king
+    """
+    mailbox64 = board.mailbox64
+    from_sq = mailbox64[move & 63]
+    to_sq = mailbox64[(move >> 6) & 63]
+    flag = move >> 12
+    board_play = board.board_play
+    if from_sq == king_sq:
+        if flag == CASTLE_SHORT or flag == CASTLE_LONG:
+            return True #king_gen only castles through unattacked squares
+        #Lift the king so it cannot hide behind itself on a checking ray
+        king = board_play[king_sq]
+        board_play[king_sq] = 0
+        attacked = is_square_attacked(board, to_sq, 1 - board.side_to_move)
+        board_play[king_sq] = king
+        return not attacked
+    if flag == EN_PASSANT:
+        #Play the capture out on the board and look at the king
+        captured_sq = to_sq + 10 if board.side_to_move == 0 else to_sq - 10
+        pawn = board_play[from_sq]
+        captured = board_play[captured_sq]
+        board_play[from_sq] = 0
+        board_play[captured_sq] = 0
+        board_play[to_sq] = pawn
+        attacked = is_square_attacked(board, king_sq, 1 - board.side_to_move)
+        board_play[to_sq] = 0
+        board_play[captured_sq] = captured
+        board_play[from_sq] = pawn
+        return not attacked
+    if checkers and (len(checkers) > 1 or to_sq not in evasion):
+        return False
+    if from_sq in pins and to_sq not in pins[from_sq]:
+        return False
+    return True
+
+def generate_evasions(board: Board, buffer, evasion: set) -> int:
+    """Pseudo-legal answers to a single check into buffer, returns the count
+
+    King moves, and moves of the other pieces onto evasion (the checker and the
+    squares between it and the king, see checks_and_pins). Works back from the few
+    evasion squares to the pieces that reach them instead of generating every move.
+    Pins, the king's targets and en passant are still left to is_legal.
+    """
+    if board.side_to_move == 0:
+        hostile = BLACK_PIECES
+        pawn, knight, bishop, rook, queen = WP, WN, WB, WR, WQ
+        forward = -10
+        start_row = ROW_2
+        promo_row = ROW_8
+    else:
+        hostile = WHITE_PIECES
+        pawn, knight, bishop, rook, queen = BP, BN, BB, BR, BQ
+        forward = 10
+        start_row = ROW_7
+        promo_row = ROW_1
+    mailbox120 = board.mailbox120
+    board_play = board.board_play
+    #Squares our pawns capture onto a square from
+    pawn_sources = PAWN_ATTACKS[1 - board.side_to_move]
+
+    n = king_gen(board, buffer, 0, hostile) #No castling, king_gen sees the king attacked
+    for target in evasion:
+        to_bits = mailbox120[target] << 6
+        #The checker is the only piece on an evasion square
+        capture = CAPTURE_BITS if board_play[target] else 0
+        for source in KNIGHT_TARGETS[target]:
+            if board_play[source] == knight:
+                buffer[n] = mailbox120[source] | to_bits | capture
+                n += 1
+        #The first piece on each ray from the target reaches it if it slides that way
+        for rays, slider in ((ROOK_RAYS[target], rook), (BISHOP_RAYS[target], bishop)):
+            for ray in rays:
+                for source in ray:
+                    piece = board_play[source]
+                    if piece:
+                        if piece == slider or piece == queen:
+                            buffer[n] = mailbox120[source] | to_bits | capture
+                            n += 1
+                        break
+        #Pawns capture the checker or push between, both may promote
+        if capture:
+            moves = [mailbox120[source] | to_bits | CAPTURE_BITS for source in pawn_sources[target] if board_play[source] == pawn]
+        else:
+            source = target - forward #Off the board squares read as empty
+            if board_play[source] == pawn:
+                moves = [mailbox120[source] | to_bits]
+            elif board_play[source] == 0 and source - forward in start_row and board_play[source - forward] == pawn:
+                moves = [mailbox120[source - forward] | to_bits | (DOUBLE_PUSH << 12)]
+            else:
+                moves = ()
+        for move in moves:
+            if target in promo_row:
+                for promo in PROMO_BITS:
+                    buffer[n] = move | promo
+                    n += 1
+            else:
+                buffer[n] = move
+                n += 1
+
+    #En passant takes a checking pawn that just pushed, is_legal plays it out
+    ep_target = board.ep_square
+    if ep_target != -1:
+        for source in pawn_sources[ep_target]:
+            if board_play[source] == pawn:
+                buffer[n] = mailbox120[source] | (mailbox120[ep_target] << 6) | (EN_PASSANT << 12)
+                n += 1
+    return n
+
+def generate_legal_moves(board: Board, buffer) -> int:
+    """Generate legal moves into buffer, returns the count
+
+    Checkers and pins are worked out once for the position, then each pseudo-legal
+    move is kept or dropped by is_legal instead of make/unmake.
+    In double check only king moves are generated, in single check only the king
+    moves and the moves onto the evasion squares (generate_evasions).
+    """
+    side = board.side_to_move
+    king_sq = board.piece_list[WK if side == 0 else BK][0]
+    checkers, evasion, pins = checks_and_pins(board, king_sq)
+
+    if len(checkers) > 1:
+        count = king_gen(board, buffer, 0, BLACK_PIECES if side == 0 else WHITE_PIECES)
+    elif checkers:
+        count = generate_evasions(board, buffer, evasion)
+    else:
+        count = generate_moves(board, buffer)
+
+    n = 0
+    for i in range(count):
+        move = buffer[i]
+        if is_legal(board, move, king_sq, checkers, evasion, pins):
+            buffer[n] = move
+            n += 1
+
+    return n
+
+#Generator for each piece type, used to validate moves that did not come from a generator
+PIECE_GENS = (None, pawn_gen, knight_gen, bishop_gen, rook_gen, queen_gen, king_gen)
+_scratch = new_move_buffer()
+
+def is_pseudo_legal(board: Board, move: int) -> bool:
+    """Could the generators produce this move here (hash moves and killers come from other positions)"""
+    piece = board.board_play[board.mailbox64[move & 63]]
+    if piece == 0 or (piece >> 3) != board.side_to_move:
+        return False
+    hostile = BLACK_PIECES if board.side_to_move == 0 else WHITE_PIECES
+    count = PIECE_GENS[piece & 7](board, _scratch, 0, hostile)
+    for i in range(count):
+        if _scratch[i] == move:
+            return True
+    return False
+
+#see.py is built on the tables above, the module is bound here so it imports in either order
+import see
+
+#MovePicker stages, in the order moves are handed out
+STAGE_HASH = 0
+STAGE_CAPTURES = 1
+STAGE_PROMOTIONS = 2
+STAGE_KILLERS = 3
+STAGE_QUIETS = 4
+STAGE_BAD_CAPTURES = 5
+STAGE_DONE = 6
+STAGE_GENS = {STAGE_CAPTURES: generate_captures, STAGE_PROMOTIONS: generate_promotions, STAGE_QUIETS: generate_quiets}
+
+def mvv_lva(board: Board, move: int) -> int:
+    """Capture order key, most valuable victim first and the least valuable attacker among equals"""
+    board_play = board.board_play
+    flag = move >> 12
+    victim = board_play[board.mailbox64[(move >> 6) & 63]] & 7 or PAWN #En passant lands on an empty square
+    if flag & PROMO_FLAG:
+        victim += KNIGHT + (flag & 3) #The pawn also turns into the promoted piece
+    return victim * 8 - (board_play[board.mailbox64[move & 63]] & 7)
+
+class MovePicker:
+    """Hands out the legal moves of a position one at a time, generating them in stages
+
+    Order: hash move, captures by MVV-LVA that do not lose material, push promotions,
+    killers, quiet moves by history score, then the losing captures. A capture is
+    exchanged out (see.py) when it is pulled and put aside for the last stage if it
+    loses BAD_CAPTURE_SEE or more. A stage is only generated when the previous one
+    runs out and a move is only checked for legality when it is pulled, so a beta
+    cutoff on an early move skips the rest of the work. The search keeps one picker
+    per ply and reset()s it at each node.
+    history is indexed by move & 4095 (from and to square) for the side to move.
+    """
+    __slots__ = ('board', 'buffer', 'moves', 'hash_move', 'killers', 'history', 'stage', 'index', 'count',
+                 'king_sq', 'checkers', 'evasion', 'pins', 'bad_captures', 'generations')
+
+    def __init__(self):
+        self.buffer = new_move_buffer()
+        self.stage = STAGE_DONE
+        self.generations = 0 #Stages generated over the picker's life, for the search stats
+
+    def reset(self, board: Board, hash_move: int = NULL_MOVE, killers: tuple = (), history: list = None):
+        self.board = board
+        self.hash_move = hash_move
+        self.killers = killers
+        self.history = history
+        self.stage = STAGE_HASH
+        self.index = 0
+        self.count = 0
+        self.checkers = None #Worked out on the first legality check
+        self.bad_captures = []
+
+    def _legal(self, move: int) -> bool:
+        if self.checkers is None:
+            board = self.board
+            self.king_sq = board.piece_list[WK if board.side_to_move == 0 else BK][0]
+            self.checkers, self.evasion, self.pins = checks_and_pins(board, self.king_sq)
+        return is_legal(self.board, move, self.king_sq, self.checkers, self.evasion, self.pins)
+
+    def next_move(self) -> int:
+        """The next legal move, NULL_MOVE once there are none left"""
+        board = self.board
+        buffer = self.buffer
+        while True:
+            stage = self.stage
+            if stage == STAGE_HASH:
+                self.stage = STAGE_CAPTURES
+                self.count = -1
+                move = self.hash_move
+                if move and is_pseudo_legal(board, move) and self._legal(move):
+                    return move
+            elif stage == STAGE_KILLERS:
+                killers = self.killers
+                while self.index < len(killers):
+                    move = killers[self.index]
+                    self.index += 1
+                    #Killers are quiet moves, skip empty slots, repeats and the hash move
+                    if (not move or move == self.hash_move or (move >> 12) & (CAPTURE_FLAG | PROMO_FLAG)
+                            or move in killers[:self.index - 1]):
+                        continue
+                    if is_pseudo_legal(board, move) and self._legal(move):
+                        return move
+                self.stage = STAGE_QUIETS
+                self.count = -1
+            elif stage == STAGE_BAD_CAPTURES:
+                bad_captures = self.bad_captures
+                while self.index < len(bad_captures):
+                    move = bad_captures[self.index]
+                    self.index += 1
+                    if self._legal(move):
+                        return move
+                self.stage = STAGE_DONE
+            elif stage == STAGE_DONE:
+                return NULL_MOVE
+            else:
+                if self.count < 0:
+                    #First pull from this stage, generate it now
+                    self.count = STAGE_GENS[stage](board, buffer)
+                    self.generations += 1
+                    self.index = 0
+                    if stage == STAGE_CAPTURES:
+                        self.moves = sorted(buffer[:self.count], key=lambda move: mvv_lva(board, move), reverse=True)
+                    elif stage == STAGE_QUIETS and self.history is not None:
+                        self.moves = sorted(buffer[:self.count], key=lambda move: self.history[move & 4095], reverse=True)
+                    else:
+                        self.moves = buffer
+                moves = self.moves
+                board_play = board.board_play
+                mailbox64 = board.mailbox64
+                see_values = see.SEE_VALUES
+                while self.index < self.count:
+                    move = moves[self.index]
+                    self.index += 1
+                    if move == self.hash_move or (stage == STAGE_QUIETS and move in self.killers):
+                        continue
+                    if stage == STAGE_CAPTURES:
+                        #Only a capture of a cheaper piece can lose material, exchange those out
+                        victim = see_values[board_play[mailbox64[(move >> 6) & 63]]]
+                        if victim < see_values[board_play[mailbox64[move & 63]]] and see.see(board, move) <= BAD_CAPTURE_SEE:
+                            self.bad_captures.append(move)
+                            continue
+                    if self._legal(move):
+                        return move
+                self.stage = stage + 1
+                self.count = -1
+                self.index = 0
+
+def generate_legal_captures(board: Board, buffer) -> int:
+    """Legal captures and promotions only, for quiescence search. Quiet moves are never generated"""
+    side = board.side_to_move
+    king_sq = board.piece_list[WK if side == 0 else BK][0]
+    checkers, evasion, pins = checks_and_pins(board, king_sq)
+    count = generate_captures(board, buffer)
+    count = generate_promotions(board, buffer, count)
+    n = 0
+    for i in range(count):
+        move = buffer[i]
+        if is_legal(board, move, king_sq, checkers, evasion, pins):
+            buffer[n] = move
+            n += 1
+    return n
+
+def piece_at(board: Board, sq64: int) -> int:
+    """Piece code on a 64 square"""
+    return board.board_play[board.mailbox64[sq64]]
+
+def legal_moves(board: Board) -> list:
+    """Legal moves as a new list, for callers outside the hot paths (UCI, tests)"""
+    buffer = new_move_buffer()
+    return buffer[:generate_legal_moves(board, buffer)].tolist()
@@ -1,87 +1,187 @@
 #Functions for performing perft
 import time
+from concurrent.futures import ProcessPoolExecutor
 from board import Board
-from fen import fen_to_board
+from fen import board_to_fen
 from move_gen import generate_legal_moves
 from make_move import make_move, unmake_move
+from move_encoding import new_move_buffer, square_name, FLAG_NAMES
 from constants import PERFT_RESULTS
+from zobrist import compute_hash
+from eval import verify_eval
+from backends import get_backend, BACKEND_NAMES, DEFAULT_BACKEND
+from perft_table import PerftTable, hashed_perft
 
-def perft(board: Board, depth: int) -> int:
-    """Count all leaf nodes at the given depth."""
+def perft(board: Board, depth: int, check_hash: bool = False, check_eval: bool = False, table: PerftTable = None) -> int:
+    """Count all leaf nodes at the given depth.
+
+    With check_hash the incremental Zobrist key, and with check_eval the
+    incremental evaluation sums, are compared against a full recompute at
+    every node (slow, for debugging make/unmake).
+    With a PerftTable transposed subtrees are looked up instead of walked
+    again and the last ply is bulk counted, no node is checked then.
+    """
+    if table is not None:
+        return hashed_perft(board, depth, table, generate_legal_moves, make_move, unmake_move)
+    #One move buffer per remaining depth, reused by every node at that depth
+    buffers = [new_move_buffer() for _ in range(depth + 1)]
+    return _perft(board, depth, check_hash, check_eval, buffers)
+
+def _perft(board: Board, depth: int, check_hash: bool, check_eval: bool, buffers: list) -> int:
+    if check_hash and board.hash_key != compute_hash(board):
+        raise AssertionError(f"Zobrist key mismatch at {board_to_fen(board)}")
+    if check_eval:
+        verify_eval(board)
     if depth == 0:
         return 1
     
-    moves = generate_legal_moves(board)
+    buffer = buffers[depth]
     nodes = 0
     
-    for move in moves:
-        undo = make_move(board, move)
-        nodes += perft(board, depth - 1)
-        unmake_move(board, undo)
+    for i in range(generate_legal_moves(board, buffer)):
+        make_move(board, buffer[i])
+        nodes += _perft(board, depth - 1, check_hash, check_eval, buffers)
+        unmake_move(board)
     
     return nodes
 
-def perft_divide(board: Board, depth: int) -> dict:
-    """Perft with move breakdown - useful for debugging."""
-    moves = generate_legal_moves(board)
+def move_label(move: int) -> str:
+    """Name of a move in divide output, e.g. 'e2e4 (double push)'."""
+    move_str = square_name(move & 63) + square_name((move >> 6) & 63)
+    if (move >> 12) in FLAG_NAMES:
+        move_str += f" ({FLAG_NAMES[move >> 12]})"
+    return move_str
+
+def perft_divide(board: Board, depth: int, backend: str = DEFAULT_BACKEND, table: PerftTable = None) -> dict:
+    """Perft with move breakdown - useful for debugging.
+
+    board must be a position of the given backend (see backends.get_backend).
+    """
+    ops = get_backend(backend)
+    moves = ops.legal_moves(board)
     results = {}
     total = 0
     
     for move in moves:
-        undo = make_move(board, move)
-        nodes = perft(board, depth - 1)
-        unmake_move(board, undo)
-        
-        move_str = index_to_algebraic(move[0]) + index_to_algebraic(move[1])
-        if len(move) > 2 and move[2]:
-            move_str += f" ({move[2]})"
+        ops.make_move(board, move)
+        nodes = ops.perft(board, depth - 1, table=table)
+        ops.unmake_move(board)
         
-        results[move_str] = nodes
+        results[move_label(move)] = nodes
         total += nodes
     
     return results, total
 
-def index_to_algebraic(sq120: int) -> str:
-    """Convert 120-index to algebraic notation (e.g., 95 -> 'e1')."""
-    file_idx = (sq120 % 10) - 1  # 0-7
-    rank = 10 - (sq120 // 10)  # 1-8
-    return chr(ord('a') + file_idx) + str(rank)
+#Per process state of the parallel perft workers: (backend ops, PerftTable or None, check_hash, check_eval)
+_worker = None
+
+def _init_worker(backend: str, hash_mb: int, check_hash: bool, check_eval: bool):
+    global _worker
+    _worker = (get_backend(backend), PerftTable(hash_mb) if hash_mb > 0 else None, check_hash, check_eval)
 
-def run_perft_tests():
-    """Run perft tests against known results."""
-    print("Running perft tests...\n")
+def _subtree_perft(fen: str, path: tuple, depth: int) -> tuple:
+    """Worker task: perft below the moves of path played from fen -> (nodes, hash hits, hash probes)."""
+    ops, table, check_hash, check_eval = _worker
+    position = ops.from_fen(fen)
+    for move in path:
+        ops.make_move(position, move)
+    if table is None:
+        return ops.perft(position, depth, check_hash, check_eval), 0, 0
+    hits, probes = table.hits, table.probes
+    nodes = ops.perft(position, depth, table=table)
+    return nodes, table.hits - hits, table.probes - probes
+
+def parallel_divide(fen: str, depth: int, backend: str = DEFAULT_BACKEND, jobs: int = None, hash_mb: int = 0,
+                    check_hash: bool = False, check_eval: bool = False) -> tuple:
+    """Node count below each root move, the subtrees counted by a pool of worker processes.
+
+    Work is shipped as the FEN plus the moves to play from it. From depth 3 each
+    reply to a root move is its own task so a few big root moves do not leave
+    most workers idle. jobs defaults to the number of CPUs, every worker keeps
+    its own hash_mb table. Returns ({move: nodes} in generation order, hash hits, hash probes).
+    """
+    ops = get_backend(backend)
+    position = ops.from_fen(fen)
+    root_moves = ops.legal_moves(position)
+    counts = dict.fromkeys(root_moves, 1 if depth == 1 else 0)
+    if depth <= 1:
+        return counts, 0, 0
+
+    paths = []
+    for move in root_moves:
+        if depth >= 3:
+            ops.make_move(position, move)
+            paths.extend((move, reply) for reply in ops.legal_moves(position))
+            ops.unmake_move(position)
+        else:
+            paths.append((move,))
+
+    hits = probes = 0
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(backend, hash_mb, check_hash, check_eval)) as pool:
+        futures = [(path[0], pool.submit(_subtree_perft, fen, path, depth - len(path))) for path in paths]
+        for move, future in futures:
+            nodes, task_hits, task_probes = future.result()
+            counts[move] += nodes
+            hits += task_hits
+            probes += task_probes
+    return counts, hits, probes
+
+def run_perft_tests(check_hash: bool = False, backend: str = DEFAULT_BACKEND, check_eval: bool = False, hash_mb: int = 0,
+                    jobs: int = 1):
+    """Run perft tests against known results.
+
+    hash_mb > 0 runs hashed perft with a table of that many megabytes per position
+    (per worker with jobs > 1), jobs > 1 splits each perft over that many processes.
+    """
+    ops = get_backend(backend)
+    table = PerftTable(hash_mb) if hash_mb > 0 else None
+    extras = (f', {hash_mb} MB hash' if table else '') + (f', {jobs} jobs' if jobs > 1 else '')
+    print(f"Running perft tests ({backend} backend{extras})...\n")
     
     for fen, expected_results in PERFT_RESULTS.items():
         print(f"FEN: {fen[:50]}...")
-        board = Board()
-        fen_to_board(board, fen)
+        board = ops.from_fen(fen)
+        if table:
+            table.clear()
         
         for depth, expected in enumerate(expected_results, start=1):
             #if depth > 3:  #Limit depth for speed during testing
             #    break
             
+            if table:
+                table.probes = table.hits = 0
             start_time = time.time()
-            result = perft(board, depth)
+            if jobs > 1:
+                counts, hits, probes = parallel_divide(fen, depth, backend, jobs, hash_mb, check_hash, check_eval)
+                result = sum(counts.values())
+                if table:
+                    table.hits, table.probes = hits, probes
+            else:
+                result = ops.perft(board, depth, check_hash, check_eval, table)
             elapsed = time.time() - start_time
             
             status = "✓" if result == expected else "✗"
             nps = int(result / elapsed) if elapsed > 0 else 0
-            print(f"  Depth {depth}: {result:>10} (expected {expected:>10}) {status}  [{elapsed:.3f}s, {nps:,} nps]")
+            hits = f", {table.hit_rate():.1%} hash hits" if table else ""
+            print(f"  Depth {depth}: {result:>10} (expected {expected:>10}) {status}  [{elapsed:.3f}s, {nps:,} nps{hits}]")
             
             if result != expected:
                 print(f"    MISMATCH! Difference: {result - expected}")
         print()
 
 
-def debug_perft(fen: str, depth: int):
-    """Debug a specific position with divide."""
-    board = Board()
-    fen_to_board(board, fen)
-    
+def debug_perft(fen: str, depth: int, backend: str = DEFAULT_BACKEND, jobs: int = 1, hash_mb: int = 0):
+    """Debug a specific position with divide, over jobs processes when jobs > 1."""
     print(f"Position: {fen}")
     print(f"Depth: {depth}\n")
     
-    results, total = perft_divide(board, depth)
+    if jobs > 1:
+        counts = parallel_divide(fen, depth, backend, jobs, hash_mb)[0]
+        results = {move_label(move): nodes for move, nodes in counts.items()}
+        total = sum(counts.values())
+    else:
+        table = PerftTable(hash_mb) if hash_mb > 0 else None
+        results, total = perft_divide(get_backend(backend).from_fen(fen), depth, backend, table)
     
     for move, nodes in sorted(results.items()):
         print(f"  {move}: {nodes}")
@@ -90,4 +190,17 @@ def debug_perft(fen: str, depth: int):
     print(f"Moves: {len(results)}")
 
 if __name__ == "__main__":
-    run_perft_tests()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Run perft on the PERFT_RESULTS positions or on one FEN")
+    parser.add_argument("--backend", choices=BACKEND_NAMES, default=DEFAULT_BACKEND)
+    parser.add_argument("--check-hash", action="store_true", help="verify the Zobrist key at every node")
+    parser.add_argument("--check-eval", action="store_true", help="verify the incremental evaluation at every node")
+    parser.add_argument("--fen", help="divide this position instead of running the test suite")
+    parser.add_argument("--depth", type=int, default=3, help="depth used with --fen")
+    parser.add_argument("--hash", type=int, default=0, metavar="MB", help="hashed perft with a table of this size")
+    parser.add_argument("--jobs", type=int, default=1, help="split each perft over this many processes")
+    args = parser.parse_args()
+    if args.fen:
+        debug_perft(args.fen, args.depth, args.backend, args.jobs, args.hash)
+    else:
+        run_perft_tests(args.check_hash, args.backend, args.check_eval, args.hash, args.jobs)
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""Perft speed benchmark with stored baselines.
+
+Runs every PERFT_RESULTS position at a fixed depth several times, keeps the
+median time and its nodes per second together with a description of the
+machine, and writes or compares against a JSON baseline:
+
+    python perft_bench.py --save baseline.json
+    python perft_bench.py --baseline baseline.json --threshold 0.05
+
+The compare run exits with status 1 when a position's NPS drops more than the
+threshold below the baseline (or a node count is wrong), so a change to
+move_gen/make_move can be accepted or rejected on numbers. Baselines only
+mean something on the machine they were recorded on, a differing machine is
+reported with the result.
+"""
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from backends import get_backend, BACKEND_NAMES, DEFAULT_BACKEND
+from constants import PERFT_RESULTS
+
+DEFAULT_DEPTH = 3
+DEFAULT_REPEATS = 5
+DEFAULT_THRESHOLD = 0.10 #Allowed NPS drop against the baseline, as a fraction
+
+
+def machine_info() -> dict:
+    """What the timings were taken on, stored with every run."""
+    return {
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': f"{platform.python_implementation()} {platform.python_version()}",
+    }
+
+
+def run_benchmark(backend: str = DEFAULT_BACKEND, depth: int = DEFAULT_DEPTH, repeats: int = DEFAULT_REPEATS,
+                  positions: dict = None) -> dict:
+    """Time perft on each position, depth is capped by the known results of the position."""
+    ops = get_backend(backend)
+    if positions is None:
+        positions = PERFT_RESULTS
+    results = []
+    for fen, expected in positions.items():
+        board = ops.from_fen(fen)
+        position_depth = min(depth, len(expected))
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            nodes = ops.perft(board, position_depth)
+            times.append(time.perf_counter() - start)
+        median = statistics.median(times)
+        results.append({
+            'fen': fen,
+            'depth': position_depth,
+            'nodes': nodes,
+            'expected': expected[position_depth - 1],
+            'times': times,
+            'median_s': median,
+            'nps': int(nodes / median) if median > 0 else 0,
+        })
+    return {'backend': backend, 'depth': depth, 'repeats': repeats, 'machine': machine_info(), 'results': results}
+
+
+def _by_position(run: dict) -> dict:
+    """Entries of a run keyed by (fen, depth), empty for no run."""
+    return {(entry['fen'], entry['depth']): entry for entry in run['results']} if run else {}
+
+
+def compare(run: dict, baseline: dict = None, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """Problems of run against baseline as messages, empty when it passes.
+
+    Wrong node counts always fail, positions or depths missing from the baseline
+    are not timed against it.
+    """
+    problems = []
+    old_results = _by_position(baseline)
+    for entry in run['results']:
+        if entry['nodes'] != entry['expected']:
+            problems.append(f"{entry['fen']} depth {entry['depth']}: {entry['nodes']} nodes, expected {entry['expected']}")
+        old = old_results.get((entry['fen'], entry['depth']))
+        if old is None:
+            continue
+        if entry['nps'] < old['nps'] * (1 - threshold):
+            change = entry['nps'] / old['nps'] - 1
+            problems.append(f"{entry['fen']} depth {entry['depth']}: {entry['nps']:,} nps vs {old['nps']:,} baseline ({change:+.1%})")
+    return problems
+
+
+def print_run(run: dict, baseline: dict = None):
+    old_results = _by_position(baseline)
+    print(f"Perft benchmark ({run['backend']} backend, median of {run['repeats']})")
+    for entry in run['results']:
+        line = f"  {entry['fen'][:40]:<40} d{entry['depth']} {entry['nodes']:>10} nodes {entry['median_s']:8.3f}s {entry['nps']:>10,} nps"
+        old = old_results.get((entry['fen'], entry['depth']))
+        if old:
+            line += f" ({entry['nps'] / old['nps'] - 1:+.1%})"
+        print(line)
+
+
+def main(argv: list = None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark perft speed against a stored baseline")
+    parser.add_argument("--backend", choices=BACKEND_NAMES, default=DEFAULT_BACKEND)
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--save", metavar="FILE", help="write the results as a new baseline")
+    parser.add_argument("--baseline", metavar="FILE", help="compare against this baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="fail when NPS drops by more than this fraction (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    run = run_benchmark(args.backend, args.depth, args.repeats)
+    print_run(run, baseline)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"Baseline written to {args.save}")
+
+    if baseline:
+        if baseline['machine'] != run['machine']:
+            print(f"Warning: baseline recorded on a different machine: {baseline['machine']}")
+        if baseline['backend'] != run['backend']:
+            print(f"Warning: baseline recorded with the {baseline['backend']} backend")
+    problems = compare(run, baseline, args.threshold)
+    for problem in problems:
+        print(f"FAIL {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Transposition table for perft.
+
+Node counts are stored under the position's Zobrist key and the remaining
+depth, so a subtree reached again by another move order is counted once.
+The table has a fixed size chosen up front and lives in flat arrays, two
+entries per bucket: the first keeps the deepest subtree seen in the bucket
+(its count saves the most work), the second always takes the latest store.
+
+hashed_perft() works on any backend, it is handed the backend's generator
+and make/unmake functions. Counting also stops one ply early: at depth 1 the
+number of legal moves is the answer, no move is played.
+"""
+from array import array
+from move_encoding import new_move_buffer
+
+ENTRY_BYTES = 17 #8 byte key, 8 byte count, 1 byte depth
+DEFAULT_PERFT_HASH_MB = 16
+
+
+class PerftTable:
+    """Fixed size (key, depth) -> node count table with hit counters."""
+
+    __slots__ = ('mask', 'keys', 'counts', 'depths', 'probes', 'hits')
+
+    def __init__(self, size_mb: int = DEFAULT_PERFT_HASH_MB):
+        buckets = max(1, size_mb * 2**20 // (2 * ENTRY_BYTES))
+        buckets = 1 << (buckets.bit_length() - 1) #Round down to a power of two so the key can be masked
+        self.mask = buckets - 1
+        self.keys = array('Q', bytes(16 * buckets))
+        self.counts = array('Q', bytes(16 * buckets))
+        self.depths = bytearray(2 * buckets) #0 marks an empty entry, only depths >= 2 are stored
+        self.probes = 0
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self.depths)
+
+    def clear(self):
+        """Empty every entry and zero the counters."""
+        self.depths = bytearray(len(self.depths))
+        self.probes = 0
+        self.hits = 0
+
+    def probe(self, key: int, depth: int) -> int:
+        """Stored node count of the position at this depth, -1 when missing."""
+        self.probes += 1
+        i = (key & self.mask) << 1
+        keys = self.keys
+        depths = self.depths
+        if keys[i] == key and depths[i] == depth:
+            self.hits += 1
+            return self.counts[i]
+        if keys[i + 1] == key and depths[i + 1] == depth:
+            self.hits += 1
+            return self.counts[i + 1]
+        return -1
+
+    def store(self, key: int, depth: int, count: int):
+        i = (key & self.mask) << 1
+        if depth < self.depths[i]:
+            i += 1
+        self.keys[i] = key
+        self.depths[i] = depth
+        self.counts[i] = count
+
+    def hit_rate(self) -> float:
+        """Fraction of probes that found their count, 0.0 before any probe."""
+        return self.hits / self.probes if self.probes else 0.0
+
+
+def hashed_perft(position, depth: int, table: PerftTable, generate_legal_moves, make_move, unmake_move) -> int:
+    """Leaf count at depth using table for transpositions and bulk counting the last ply."""
+    if depth == 0:
+        return 1
+    buffers = [new_move_buffer() for _ in range(depth + 1)]
+    return _hashed_perft(position, depth, table, buffers, generate_legal_moves, make_move, unmake_move)
+
+
+def _hashed_perft(position, depth, table, buffers, generate_legal_moves, make_move, unmake_move) -> int:
+    buffer = buffers[depth]
+    if depth == 1:
+        return generate_legal_moves(position, buffer)
+
+    key = position.hash_key
+    nodes = table.probe(key, depth)
+    if nodes >= 0:
+        return nodes
+
+    nodes = 0
+    for i in range(generate_legal_moves(position, buffer)):
+        make_move(position, buffer[i])
+        nodes += _hashed_perft(position, depth - 1, table, buffers, generate_legal_moves, make_move, unmake_move)
+        unmake_move(position)
+    table.store(key, depth, nodes)
+    return nodes
@@ -1,16 +1,18 @@
 #!/usr/bin/env python3
 """Smoke-test a built engine artifact (exe or binary).
 
-Usage: python scripts/smoke_test_artifact.py /path/to/executable
+Usage: python scripts/smoke_test_artifact.py /path/to/executable [--threads N]
 
 The script starts the engine process, sends a few UCI commands, and checks basic responses.
+With --threads it searches again with that many Lazy SMP processes, which in a frozen
+executable only start if the entry point calls multiprocessing.freeze_support().
 """
 import sys
 import subprocess
 import time
 
 
-def run_smoke(exe_path: str, timeout: int = 10) -> bool:
+def run_smoke(exe_path: str, timeout: int = 10, threads: int = 1) -> bool:
     try:
         proc = subprocess.Popen([exe_path], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
     except Exception as e:
@@ -21,73 +23,64 @@ def run_smoke(exe_path: str, timeout: int = 10) -> bool:
         proc.stdin.write(cmd + "\n")
         proc.stdin.flush()
 
+    def wait_for(prefix: str, wait: int = timeout) -> bool:
+        start = time.time()
+        while time.time() - start < wait:
+            line = proc.stdout.readline()
+            if not line:
+                break
+            line = line.strip()
+            print("OUT:", line)
+            if line.startswith(prefix):
+                return True
+        print(f"Did not get '{prefix}' from engine")
+        proc.kill()
+        return False
+
     # Give the engine a moment to start
     time.sleep(0.2)
     send("uci")
-
-    got_uciok = False
-    start = time.time()
-    while time.time() - start < timeout:
-        line = proc.stdout.readline()
-        if not line:
-            break
-        line = line.strip()
-        print("OUT:", line)
-        if line == "uciok":
-            got_uciok = True
-            break
-
-    if not got_uciok:
-        print("Did not get 'uciok' from engine")
-        proc.kill()
+    if not wait_for("uciok"):
         return False
 
     send("isready")
-    got_ready = False
-    start = time.time()
-    while time.time() - start < timeout:
-        line = proc.stdout.readline()
-        if not line:
-            break
-        line = line.strip()
-        print("OUT:", line)
-        if line == "readyok":
-            got_ready = True
-            break
-
-    if not got_ready:
-        print("Did not get 'readyok' from engine")
-        proc.kill()
+    if not wait_for("readyok"):
         return False
 
     # Run a quick search
     send("position startpos")
     send("go depth 1")
+    if not wait_for("bestmove"):
+        return False
 
-    got_best = False
-    start = time.time()
-    while time.time() - start < timeout:
-        line = proc.stdout.readline()
-        if not line:
-            break
-        line = line.strip()
-        print("OUT:", line)
-        if line.startswith("bestmove"):
-            got_best = True
-            break
+    if threads > 1:
+        # Helper processes are spawned from the executable itself, give them time to unpack
+        send(f"setoption name Threads value {threads}")
+        send("setoption name Bitbases value false")
+        send("isready")
+        if not wait_for("readyok", 6 * timeout):
+            return False
+        send("position startpos")
+        send("go depth 2")
+        if not wait_for("bestmove", 6 * timeout):
+            return False
+        send("quit")
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            print("Engine did not exit after 'quit'")
+            proc.kill()
+            return False
 
     proc.kill()
-    if not got_best:
-        print("Did not get 'bestmove' from engine")
-        return False
-
     print("Smoke test succeeded")
     return True
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: scripts/smoke_test_artifact.py /path/to/executable")
+    if len(sys.argv) not in (2, 4) or (len(sys.argv) == 4 and sys.argv[2] != "--threads"):
+        print("Usage: scripts/smoke_test_artifact.py /path/to/executable [--threads N]")
         sys.exit(2)
-    ok = run_smoke(sys.argv[1])
+    threads = int(sys.argv[3]) if len(sys.argv) == 4 else 1
+    ok = run_smoke(sys.argv[1], threads=threads)
     sys.exit(0 if ok else 3)
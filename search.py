@@ -1,87 +1,605 @@
 """Basic search for SCE: negamax with alpha-beta and iterative deepening.
 
-search(board, depth, time_ms, uci_info) -> (best_move, score, depth_reached)
+search(board, depth, time_ms, uci_info, backend) -> (best_move, best_score, depth_reached)
 
 - depth: if None, a small default depth is used
 - time_ms: time budget in milliseconds (or None for no limit)
-- uci_info: optional callback used to print info lines: uci_info(depth, score, nodes, nps, time_ms)
+- uci_info: optional callback used to print info lines: uci_info(depth, score, nodes, nps, time_ms, qnodes, hashfull, cutoff_rate, pv, stats),
+  nodes counts every node and qnodes the quiescence part of them, cutoff_rate is the share
+  of beta cutoffs made by the first move searched (how good the move ordering is), pv
+  the list of moves of the principal variation and stats the SearchStats of the search so far
+- backend: board backend name from backends.BACKEND_NAMES, moves returned are valid on board either way
+- tt: transposition table to search with, keep one to carry results over from one search to the next
+- pruning: {option: bool} turning the selective search parts in PRUNING_OPTIONS on or off, all on by default
+- control: SearchControl through which another thread can stop the search or end its pondering
+- helper: Lazy SMP helper number (see smp.py), 0 for the main search
+- time_manager: timeman.TimeManager deciding when to stop deepening, its hard limit replaces time_ms
+- stats: dict filled with SearchStats.as_dict() of the search when it returns
+- bitbases: bitbase.Bitbases the positions with three pieces or fewer are looked up in instead of searched
+
+Mate scores are MATE_SCORE less the number of plies to the mate, so shorter mates score higher.
 """
+import threading
 import time
-from move_gen import generate_legal_moves
-from make_move import make_move, unmake_move
-from eval import evaluate
-from move_gen import is_square_attacked
+from board import Board
+from fen import fen_to_board
+from backends import get_backend, DEFAULT_BACKEND
+from move_encoding import new_move_buffer, NULL_MOVE
+from constants import PERFT_RESULTS, PIECE_VALUES, PROMO_FLAG, CAPTURE_FLAG, EN_PASSANT, WP, PAWN, KNIGHT
+from tt import TranspositionTable, BOUND_EXACT, BOUND_LOWER, BOUND_UPPER, score_to_tt, score_from_tt
+from bitbase import DRAW, MAX_PIECES
 
 MATE_SCORE = 1_000_000
 INF = 10**9
+MAX_PLY = 128
+MATE_BOUND = MATE_SCORE - MAX_PLY #Scores past this are mates
+DELTA_MARGIN = 200 #Quiescence skips captures that cannot lift the score to alpha even with this much extra
+ASPIRATION_MIN_DEPTH = 4 #Shallower iterations are cheap and their scores swing, they get the full window
+ASPIRATION_WIDTHS = (50, 200, 800, INF) #Half widths of the root window tried in turn after a fail
+BENCH_DEPTH = 4
+DRAW_SCORE = 0
+FIFTY_MOVE_PLIES = 100
+FORCED_DRAW_ITERATIONS = 3 #Iterations in a row ending the PV in a rule draw before the root counts as a forced draw
+MAX_DEPTH = MAX_PLY // 2 #Iterations of a search bounded only by time or stop, past it nothing changes
+CHECK_EVERY_NODES = 1024 #Nodes between looks at the clock and the stop flag
+BITBASE_MAX_PHASE = 4 #A queen, past it there are too many pieces for the bitbases and they are not probed
+KNOWN_WIN = 10_000 #Score of a won king and pawn ending less the plies to the promotion, above any evaluation
+#Selective search, each one can be turned off through the UCI option named in PRUNING_OPTIONS
+NULL_MOVE_MIN_DEPTH = 3
+NULL_MOVE_REDUCTION = 2 #Plies the null move search is cut by on top of the move itself, one more every 6 plies of depth
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3       #Moves searched at full depth before the reductions start
+FUTILITY_MAX_DEPTH = 3
+FUTILITY_MARGIN = 120   #Per ply of depth left
+RAZOR_MAX_DEPTH = 2
+RAZOR_MARGIN = 300      #Per ply of depth left
+PRUNING_OPTIONS = {'NullMove': 'null_move', 'LMR': 'lmr', 'ReverseFutility': 'reverse_futility', 'Razoring': 'razoring'}
 
 
-class Searcher:
+def is_repetition(board) -> bool:
+    """Has the position occurred before, in the game or on the search path.
+
+    The keys are those on the undo stack. Only positions since the last capture,
+    pawn move or null move can repeat, so the scan stops half_move_counter
+    plies back, and only every other one has the same side to move.
+    """
+    key = board.hash_key
+    keys = board.undo_hash
+    stop = max(0, board.ply - board.half_move_counter)
+    for i in range(board.ply - 4, stop - 1, -2):
+        if keys[i] == key:
+            return True
+    return False
+
+
+def is_rule_draw(board) -> bool:
+    """Drawn by repetition or the fifty move rule."""
+    return board.half_move_counter >= FIFTY_MOVE_PLIES or is_repetition(board)
+
+
+class SearchControl:
+    """Lets another thread stop a running search or end its pondering.
+
+    The time limit counts from clock_start, which ponderhit moves to the moment
+    the opponent played the expected move. A search that runs out of depth
+    while pondering or in go infinite still may not send its bestmove, the
+    caller waits for released first.
+    """
+
+    def __init__(self, pondering: bool = False, infinite: bool = False, stopped=None):
+        #Any event with is_set and set, a multiprocessing one reaches the Lazy SMP helpers too
+        self.stopped = stopped if stopped is not None else threading.Event()
+        self.released = threading.Event() #Set once the bestmove may be sent
+        self.pondering = pondering
+        self.infinite = infinite
+        self.clock_start = time.monotonic()
+        if not (pondering or infinite):
+            self.released.set()
+
+    def stop(self):
+        self.stopped.set()
+        self.released.set()
+
+    def ponderhit(self):
+        """The opponent played the ponder move, the search goes on as a normal timed one."""
+        self.clock_start = time.monotonic()
+        self.pondering = False
+        if not self.infinite:
+            self.released.set()
+
+
+class SearchStats:
+    """Counters of one search, plain int increments so they stay on in play.
+
+    movegen_calls counts the move list generations, a picker generates one
+    per stage it reaches. iteration_nodes holds the nodes each finished
+    iteration took, the branching factors are their ratios.
+    """
+
+    __slots__ = ('nodes', 'qnodes', 'tt_probes', 'tt_hits', 'tt_cutoffs', 'beta_cutoffs', 'first_move_cutoffs',
+                 'researches', 'movegen_calls', 'bitbase_hits', 'iteration_nodes')
+
     def __init__(self):
         self.nodes = 0
+        self.qnodes = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_cutoffs = 0        #Nodes settled by the table without a search
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.researches = 0        #PVS, reduction and aspiration searches done again
+        self.movegen_calls = 0
+        self.bitbase_hits = 0      #Nodes settled by the endgame bitbases
+        self.iteration_nodes = []
+
+    def cutoff_rate(self) -> float:
+        """Share of beta cutoffs made by the first move searched, 0.0 before any cutoff."""
+        return self.first_move_cutoffs / self.beta_cutoffs if self.beta_cutoffs else 0.0
+
+    def branching_factors(self) -> list:
+        """Effective branching factor of each iteration after the first, its nodes over the previous one's."""
+        nodes = self.iteration_nodes
+        return [later / earlier for earlier, later in zip(nodes, nodes[1:]) if earlier]
+
+    def as_dict(self) -> dict:
+        stats = {name: getattr(self, name) for name in self.__slots__}
+        stats['iteration_nodes'] = list(self.iteration_nodes)
+        stats['tt_hit_rate'] = self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+        stats['cutoff_rate'] = self.cutoff_rate()
+        stats['branching_factors'] = self.branching_factors()
+        return stats
+
+    def __str__(self) -> str:
+        stats = self.as_dict()
+        ebf = ' '.join(f"{factor:.1f}" for factor in stats['branching_factors']) or '-'
+        return (f"nodes {self.nodes} qnodes {self.qnodes} tt probes {self.tt_probes} hits {self.tt_hits}"
+                f" ({stats['tt_hit_rate']:.1%}) cutoffs {self.tt_cutoffs} beta cutoffs {self.beta_cutoffs}"
+                f" first move {stats['cutoff_rate']:.1%} researches {self.researches}"
+                f" movegen {self.movegen_calls} bitbase {self.bitbase_hits} ebf {ebf}")
+
+
+class Searcher:
+    def __init__(self, backend=DEFAULT_BACKEND, tt=None, pruning=None, control=None, bitbases=None):
+        self.backend = get_backend(backend)
+        self.tt = tt if tt is not None else TranspositionTable()
+        self.control = control if control is not None else SearchControl()
+        self.bitbases = bitbases
+        self.stats = SearchStats()
+        self.movegen_calls = 0 #Generations outside the pickers, see update_stats
         self.start_time = 0
         self.time_limit_ms = None
         self.stop = False
+        self.check_countdown = CHECK_EVERY_NODES
+        #One move buffer and one move picker per ply, reused by every node at that ply
+        self.move_buffers = [new_move_buffer() for _ in range(MAX_PLY + 1)]
+        self.pickers = [self.backend.MovePicker() for _ in range(MAX_PLY + 1)]
+        #Quiet moves that caused a beta cutoff, two per ply, tried right after the captures
+        self.killers = [[NULL_MOVE, NULL_MOVE] for _ in range(MAX_PLY + 1)]
+        #Butterfly history per side indexed by move & 4095, raised on cutoffs, orders the quiet moves
+        self.history = [[0] * 4096, [0] * 4096]
+        #Triangular PV table, row ply holds the best line from ply on in pv[ply][ply:pv_length[ply]]
+        self.pv = [[NULL_MOVE] * (MAX_PLY + 1) for _ in range(MAX_PLY + 1)]
+        self.pv_length = [0] * (MAX_PLY + 2)
+        self.prev_pv = [] #PV of the last finished iteration, searched first by the next one
+        self.follow_pv = False
+        #Selective search switches, pruning maps PRUNING_OPTIONS names to on/off, missing ones stay on
+        for option, attribute in PRUNING_OPTIONS.items():
+            setattr(self, attribute, pruning.get(option, True) if pruning else True)
+
+    def update_stats(self) -> SearchStats:
+        """The stats with the generations of the move pickers added in."""
+        stats = self.stats
+        stats.movegen_calls = self.movegen_calls + sum(picker.generations for picker in self.pickers)
+        return stats
 
     def timed_out(self):
-        if self.time_limit_ms is None:
+        """limits_reached, looked at only once every CHECK_EVERY_NODES calls."""
+        self.check_countdown -= 1
+        if self.check_countdown > 0:
+            return False
+        self.check_countdown = CHECK_EVERY_NODES
+        return self.limits_reached()
+
+    def limits_reached(self) -> bool:
+        """Has the search been stopped or, unless pondering, used up its time."""
+        control = self.control
+        if control.stopped.is_set():
+            return True
+        if self.time_limit_ms is None or control.pondering:
             return False
-        elapsed_ms = (time.time() - self.start_time) * 1000
-        return elapsed_ms >= self.time_limit_ms
+        return (time.monotonic() - control.clock_start) * 1000 >= self.time_limit_ms
+
+    def negamax(self, board, depth, alpha, beta, ply=1, allow_null=True):
+        """Principal variation search returning score from the side to move's perspective.
 
-    def negamax(self, board, depth, alpha, beta):
-        """Negamax search returning score from White's perspective."""
+        The first move gets the full window, the rest a null window that only proves
+        them worse, a move that fails high on it is searched again with the full window.
+        Away from the principal variation the node may be cut short by reverse futility,
+        razoring or a null move, and late quiet moves are searched to a reduced depth first.
+        allow_null is False right after a null move so two never follow each other.
+        """
+        self.pv_length[ply] = ply
         if self.timed_out():
             self.stop = True
             return 0
 
-        self.nodes += 1
-
-        #Terminal condition: check for no legal moves (mate/stalemate)
-        moves = generate_legal_moves(board)
-        if depth == 0 or not moves:
-            if not moves:
-                #No legal moves — check if side to move is in check
-                king = 'K' if board.side_to_move == 0 else 'k'
-                king_positions = board.piece_list.get(king, [])
-                if king_positions and is_square_attacked(board, king_positions[0], 1 - board.side_to_move):
-                    #Checkmate for side to move
-                    return -MATE_SCORE
-                else:
-                    #Stalemate or no moves
+        #Leaf node, resolve the captures first
+        if depth <= 0:
+            return self.quiesce(board, alpha, beta, ply)
+
+        stats = self.stats
+        stats.nodes += 1
+        backend = self.backend
+        pv_node = beta - alpha > 1
+
+        #A repeated position is scored as a draw right away, the side that gains from it can repeat again.
+        #Fifty moves are a draw unless this move is mate
+        if board.half_move_counter >= 4:
+            if is_repetition(board):
+                return DRAW_SCORE
+            if board.half_move_counter >= FIFTY_MOVE_PLIES and not backend.in_check(board):
+                return DRAW_SCORE
+
+        #Few enough pieces left for the bitbases to know the result
+        if self.bitbases is not None and board.phase <= BITBASE_MAX_PHASE:
+            score = self.probe_bitbases(board, ply)
+            if score is not None:
+                return score
+
+        #A result of an earlier search of this position may settle the node, its move goes first either way.
+        #PV nodes are searched anyway so the principal variation comes out whole
+        key = board.hash_key
+        hash_move = NULL_MOVE
+        entry = self.tt.probe(key)
+        stats.tt_probes += 1
+        if entry is not None:
+            stats.tt_hits += 1
+            hash_move, entry_depth, score, bound = entry
+            if entry_depth >= depth and not pv_node:
+                score = score_from_tt(score, ply, MATE_BOUND)
+                if (bound == BOUND_EXACT or (bound == BOUND_LOWER and score >= beta)
+                        or (bound == BOUND_UPPER and score <= alpha)):
+                    stats.tt_cutoffs += 1
+                    return score
+
+        in_check = backend.in_check(board)
+        if not pv_node and not in_check:
+            static_eval = self.evaluate(board)
+
+            #Reverse futility: this far above beta the opponent will not catch up in the plies left
+            if (self.reverse_futility and depth <= FUTILITY_MAX_DEPTH and abs(beta) < MATE_BOUND
+                    and static_eval - FUTILITY_MARGIN * depth >= beta):
+                return static_eval
+
+            #Razoring: this far below alpha only a capture can help, let quiescence decide
+            if self.razoring and depth <= RAZOR_MAX_DEPTH and static_eval + RAZOR_MARGIN * depth < alpha:
+                score = self.quiesce(board, alpha, beta, ply)
+                if score < alpha:
+                    return score
+
+            #Null move: passing still fails high, a real move almost surely does too.
+            #With only king and pawns passing may be the better move (zugzwang), so not there
+            if (self.null_move and allow_null and depth >= NULL_MOVE_MIN_DEPTH and static_eval >= beta
+                    and backend.has_non_pawn_material(board, board.side_to_move)):
+                reduction = NULL_MOVE_REDUCTION + depth // 6
+                self.follow_pv = False
+                backend.make_null_move(board)
+                score = -self.negamax(board, depth - 1 - reduction, -beta, -beta + 1, ply + 1, False)
+                backend.unmake_null_move(board)
+                if self.stop:
                     return 0
-            #Leaf node
-            return evaluate(board)
+                if score >= beta:
+                    #A mate found after passing is not proven, do not return it
+                    return beta if score >= MATE_BOUND else score
 
+        #Along the previous iteration's principal variation its move goes first
+        pv_move = NULL_MOVE
+        if self.follow_pv:
+            if ply < len(self.prev_pv):
+                pv_move = hash_move = self.prev_pv[ply]
+            else:
+                self.follow_pv = False
+
+        #Moves come from the picker lazily, the first one only tells us the node is not mate/stalemate
+        history = self.history[board.side_to_move]
+        picker = self.pickers[ply]
+        picker.reset(board, hash_move, self.killers[ply], history)
+        move = picker.next_move()
+        if not move:
+            #No legal moves — check if side to move is in check
+            if in_check:
+                #Checkmate for side to move
+                return -MATE_SCORE + ply
+            else:
+                #Stalemate or no moves
+                return 0
+
+        alpha_orig = alpha
         best = -INF
-        for move in moves:
-            undo = make_move(board, move)
-            val = -self.negamax(board, depth - 1, -beta, -alpha)
-            unmake_move(board, undo)
+        best_move = NULL_MOVE
+        searched = 0
+        killers = self.killers[ply]
+        reduce_late = self.lmr and depth >= LMR_MIN_DEPTH and not in_check
+        while move:
+            if move != pv_move:
+                self.follow_pv = False
+            backend.make_move(board, move)
+            if searched == 0:
+                val = -self.negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                #Late quiet moves rarely turn out best, search them shallower and again at full depth if they beat alpha
+                if (reduce_late and searched >= LMR_MIN_MOVES and not (move >> 12) & (CAPTURE_FLAG | PROMO_FLAG)
+                        and move != killers[0] and move != killers[1] and not backend.in_check(board)):
+                    reduction = 1 if searched < 2 * LMR_MIN_MOVES or pv_node else 2
+                    val = -self.negamax(board, depth - 1 - reduction, -alpha - 1, -alpha, ply + 1)
+                    if val > alpha:
+                        stats.researches += 1
+                        val = -self.negamax(board, depth - 1, -alpha - 1, -alpha, ply + 1)
+                else:
+                    val = -self.negamax(board, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < val < beta:
+                    stats.researches += 1
+                    val = -self.negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            backend.unmake_move(board)
+            searched += 1
 
             if self.stop:
                 return 0
 
             if val > best:
                 best = val
+                best_move = move
             if val > alpha:
                 alpha = val
+                self.update_pv(ply, move)
             if alpha >= beta:
-                break  #Beta cut-off
+                #Beta cut-off, remember a quiet move that caused it for the sibling nodes
+                stats.beta_cutoffs += 1
+                if searched == 1:
+                    stats.first_move_cutoffs += 1
+                if not (move >> 12) & (CAPTURE_FLAG | PROMO_FLAG):
+                    if killers[0] != move:
+                        killers[1] = killers[0]
+                        killers[0] = move
+                    history[move & 4095] += depth * depth
+                break
+            move = picker.next_move()
 
+        if best >= beta:
+            bound = BOUND_LOWER
+        elif best > alpha_orig:
+            bound = BOUND_EXACT
+        else:
+            bound = BOUND_UPPER
+            best_move = NULL_MOVE #Every move failed low, none of them is known to be best
+        self.tt.store(key, depth, score_to_tt(best, ply, MATE_BOUND), bound, best_move)
         return best
 
+    def probe_bitbases(self, board, ply):
+        """Score of the position from the bitbases, None when they do not hold it.
+
+        Mates score by their distance from the root like searched ones. A king and
+        pawn win counts down from KNOWN_WIN by the plies to the promotion, after
+        it the mate scores of the queen ending take over.
+        """
+        backend = self.backend
+        #Counting first, most positions through the phase gate are pawn endings with too many pawns
+        if backend.piece_count(board) > MAX_PIECES:
+            return None
+        found = self.bitbases.probe(backend.piece_squares(board), board.side_to_move)
+        if found is None:
+            return None
+        self.stats.bitbase_hits += 1
+        result, plies, mate = found
+        if result == DRAW:
+            return DRAW_SCORE
+        return result * ((MATE_SCORE if mate else KNOWN_WIN) - ply - plies)
+
+    def bitbase_root_move(self, board, root_moves):
+        """Best root move by the bitbase scores of the positions it leads to, None if the bitbases do not hold the root.
+
+        The distances count down along the best moves, so playing them makes
+        progress towards the win, or holds out longest in a loss.
+        """
+        ops = self.backend
+        if self.probe_bitbases(board, 0) is None:
+            return None
+        best_move, best = None, -INF
+        for move in root_moves:
+            ops.make_move(board, move)
+            #Every move from a bitbase position leads to another one, or to bare kings
+            score = -self.probe_bitbases(board, 1)
+            ops.unmake_move(board)
+            if score > best:
+                best_move, best = move, score
+        return best_move
+
+    def update_pv(self, ply, move):
+        """move raised alpha at ply, the PV from here is move followed by the child's PV."""
+        pv = self.pv
+        row = pv[ply]
+        row[ply] = move
+        child_length = self.pv_length[ply + 1]
+        row[ply + 1:child_length] = pv[ply + 1][ply + 1:child_length]
+        self.pv_length[ply] = child_length
+
+    def pv_ends_in_draw(self, board, pv) -> bool:
+        """Does playing pv from board end in a repetition or fifty move draw."""
+        backend = self.backend
+        for move in pv:
+            backend.make_move(board, move)
+        drawn = is_rule_draw(board)
+        for _ in pv:
+            backend.unmake_move(board)
+        return drawn
 
-def search(board, depth=None, time_ms=None, uci_info=None):
+    def principal_variation(self) -> list:
+        """Moves of the principal variation found by the last root search."""
+        return self.pv[0][:self.pv_length[0]]
+
+    def search_root(self, board, root_moves, depth, alpha, beta):
+        """Search every root move with PVS inside (alpha, beta), returning the best score.
+
+        Fails low (<= alpha) when no move reaches alpha and stops at the first move
+        that fails high (>= beta). The best move in the window starts self.pv[0].
+        """
+        ops = self.backend
+        self.pv_length[0] = 0
+        self.follow_pv = bool(self.prev_pv)
+        best = -INF
+        for i, move in enumerate(root_moves):
+            if self.limits_reached():
+                self.stop = True
+                break
+            if i:
+                self.follow_pv = False
+            ops.make_move(board, move)
+            if i == 0:
+                score = -self.negamax(board, depth - 1, -beta, -alpha)
+            else:
+                score = -self.negamax(board, depth - 1, -alpha - 1, -alpha)
+                if alpha < score < beta:
+                    self.stats.researches += 1
+                    score = -self.negamax(board, depth - 1, -beta, -alpha)
+            ops.unmake_move(board)
+
+            if self.stop:
+                break
+            if score > best:
+                best = score
+            if score > alpha:
+                alpha = score
+                self.update_pv(0, move)
+                if score >= beta:
+                    break
+        return best
+
+    def evaluate(self, board):
+        """Static evaluation from the side to move's perspective (evaluate is from White's)."""
+        score = self.backend.evaluate(board)
+        return -score if board.side_to_move else score
+
+    def order_captures(self, board, moves, count):
+        """Captures and promotions of the buffer as (see, move) pairs, best exchange first.
+
+        Ties keep most valuable victim / least valuable attacker order.
+        """
+        piece_at = self.backend.piece_at
+        see = self.backend.see
+        scored = []
+        for i in range(count):
+            move = moves[i]
+            flag = move >> 12
+            if flag == EN_PASSANT:
+                victim = PAWN
+            else:
+                victim = piece_at(board, (move >> 6) & 63) & 7
+            if flag & PROMO_FLAG:
+                victim += KNIGHT + (flag & 3) #The pawn also turns into the promoted piece
+            attacker = piece_at(board, move & 63) & 7
+            scored.append((see(board, move), victim * 8 - attacker, move))
+        scored.sort(reverse=True)
+        return [(exchange, move) for exchange, _, move in scored]
+
+    def quiesce(self, board, alpha, beta, ply, qply=0):
+        """Search captures and promotions only until the position is quiet.
+
+        The side to move may stand pat on the static evaluation. In check on the
+        first quiescence ply there is no standing pat, every evasion is searched and
+        having none is mate. Deeper checks fall back to stand pat and captures so
+        quiet evasions cannot make the quiescence search explode. Captures that
+        lose material by static exchange evaluation are not searched.
+        """
+        self.pv_length[ply] = ply
+        if self.timed_out():
+            self.stop = True
+            return 0
+
+        self.stats.qnodes += 1
+        backend = self.backend
+        if ply >= MAX_PLY:
+            return self.evaluate(board)
+
+        if self.bitbases is not None and board.phase <= BITBASE_MAX_PHASE:
+            score = self.probe_bitbases(board, ply)
+            if score is not None:
+                return score
+
+        if qply == 0 and backend.in_check(board):
+            picker = self.pickers[ply]
+            picker.reset(board)
+            move = picker.next_move()
+            if not move:
+                return -MATE_SCORE + ply
+            best = -INF
+            while move:
+                backend.make_move(board, move)
+                val = -self.quiesce(board, -beta, -alpha, ply + 1, qply + 1)
+                backend.unmake_move(board)
+                if self.stop:
+                    return 0
+                if val > best:
+                    best = val
+                if val > alpha:
+                    alpha = val
+                if alpha >= beta:
+                    break
+                move = picker.next_move()
+            return best
+
+        stand_pat = self.evaluate(board)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        best = stand_pat
+
+        moves = self.move_buffers[ply]
+        count = backend.generate_legal_captures(board, moves)
+        self.movegen_calls += 1
+        for exchange, move in self.order_captures(board, moves, count):
+            #Captures that lose material once every recapture is played cannot raise the score
+            if exchange < 0:
+                break
+            flag = move >> 12
+            #Delta pruning: skip captures that cannot reach alpha even winning the piece for free
+            if not flag & PROMO_FLAG:
+                if flag == EN_PASSANT:
+                    gain = PIECE_VALUES[WP]
+                else:
+                    gain = abs(PIECE_VALUES[backend.piece_at(board, (move >> 6) & 63)])
+                if stand_pat + gain + DELTA_MARGIN <= alpha:
+                    continue
+            backend.make_move(board, move)
+            val = -self.quiesce(board, -beta, -alpha, ply + 1, qply + 1)
+            backend.unmake_move(board)
+            if self.stop:
+                return 0
+            if val > best:
+                best = val
+            if val > alpha:
+                alpha = val
+            if alpha >= beta:
+                break
+        return best
+
+
+def search(board, depth=None, time_ms=None, uci_info=None, backend=DEFAULT_BACKEND, tt=None, pruning=None, control=None,
+           helper=0, time_manager=None, stats=None, bitbases=None):
     """Top-level search entry.
 
     Returns (best_move, best_score, depth_reached).
     """
-    se = Searcher()
-    se.nodes = 0
-    se.start_time = time.time()
-    se.time_limit_ms = time_ms
+    se = Searcher(backend, tt, pruning, control, bitbases)
+    if not helper:
+        #Lazy SMP helpers share the main search's table, it has been aged for them
+        se.tt.new_search()
+    ops = se.backend
+    board = ops.from_board(board)
+    se.start_time = time.monotonic()
+    se.time_limit_ms = time_manager.hard_ms if time_manager else time_ms
     se.stop = False
+    control = se.control
 
     #Choose default depth if none provided
     if depth is None:
@@ -93,54 +611,115 @@ def search(board, depth=None, time_ms=None, uci_info=None):
     best_score = 0
     depth_reached = 0
 
-    for d in range(1, max_depth + 1):
-        if se.timed_out():
-            break
+    moves = se.move_buffers[0]
+    count = ops.generate_legal_moves(board, moves)
+    se.movegen_calls += 1
+    if not count:
+        #No legal moves at root
+        best_score = -MATE_SCORE if ops.in_check(board) else 0
+        return best_move, best_score, depth_reached
+    root_moves = moves[:count].tolist()
 
-        root_alpha = -INF
-        root_beta = INF
-        moves = generate_legal_moves(board)
-        if not moves:
-            #No legal moves at root
-            king = 'K' if board.side_to_move == 0 else 'k'
-            kp = board.piece_list.get(king, [])
-            if kp and is_square_attacked(board, kp[0], 1 - board.side_to_move):
-                best_score = -MATE_SCORE
-            else:
-                best_score = 0
-            depth_reached = d - 1
-            break
+    #A root the bitbases hold needs no search, one iteration over its best move reports it
+    if bitbases is not None and board.phase <= BITBASE_MAX_PHASE:
+        bitbase_move = se.bitbase_root_move(board, root_moves)
+        if bitbase_move:
+            root_moves = [bitbase_move]
+            count = 1
+            max_depth = min(max_depth, 1)
 
-        local_best_move = None
-        local_best_score = -INF
+    #Lazy SMP helpers start from other root moves and every other one a ply deeper, so they
+    #do not all search the same tree and fill the shared table with results the others can use
+    first_depth = 1
+    draw_iterations = 0
+    if helper:
+        first_depth += helper % 2
+        shift = helper % count
+        root_moves = root_moves[shift:] + root_moves[:shift]
 
-        for move in moves:
-            if se.timed_out():
-                break
-            undo = make_move(board, move)
-            score = -se.negamax(board, d - 1, -root_beta, -root_alpha)
-            unmake_move(board, undo)
+    for d in range(first_depth, max_depth + 1):
+        if se.limits_reached():
+            break
+        #An iteration that would not finish in time is not started, pondering has no clock yet
+        if (time_manager and not control.pondering
+                and not time_manager.should_start_iteration((time.monotonic() - control.clock_start) * 1000)):
+            break
 
-            if se.stop:
+        #Aspiration window around the last score, widened in stages each time the score falls outside
+        if d >= ASPIRATION_MIN_DEPTH and abs(best_score) < MATE_BOUND:
+            widths = ASPIRATION_WIDTHS
+        else:
+            widths = (INF,)
+        partial_pv = None
+        iteration_start_nodes = se.stats.nodes + se.stats.qnodes
+        for width in widths:
+            alpha = max(-INF, best_score - width)
+            beta = min(INF, best_score + width)
+            score = se.search_root(board, root_moves, d, alpha, beta)
+            if se.pv_length[0]:
+                partial_pv = se.principal_variation()
+            if se.stop or alpha < score < beta:
                 break
+            se.stats.researches += 1
 
-            if score > local_best_score:
-                local_best_score = score
-                local_best_move = move
-            if score > root_alpha:
-                root_alpha = score
-
-        if se.stop or se.timed_out():
+        if se.stop:
+            #A root move that beat the window before time ran out is better than the last iteration's move
+            if partial_pv:
+                best_move = partial_pv[0]
             break
 
-        best_move = local_best_move
-        best_score = local_best_score
+        best_score = score
         depth_reached = d
+        se.prev_pv = se.principal_variation()
+        best_move = se.prev_pv[0]
+        #The next iteration searches this move first
+        root_moves.remove(best_move)
+        root_moves.insert(0, best_move)
+
+        counters = se.update_stats()
+        counters.iteration_nodes.append(counters.nodes + counters.qnodes - iteration_start_nodes)
+        if time_manager and not control.pondering:
+            time_manager.iteration_done((time.monotonic() - control.clock_start) * 1000, best_move)
+        forced_draw = False
+        if best_score == DRAW_SCORE and se.pv_ends_in_draw(board, se.prev_pv):
+            draw_iterations += 1
+            #Deeper iterations keep finding nothing better than the draw, it is forced
+            forced_draw = draw_iterations >= FORCED_DRAW_ITERATIONS
+        else:
+            draw_iterations = 0
 
         #UCI info callback
         if uci_info:
-            elapsed_ms = int((time.time() - se.start_time) * 1000)
-            nps = int(se.nodes / max(1, (time.time() - se.start_time)))
-            uci_info(d, best_score, se.nodes, nps, elapsed_ms)
+            elapsed = time.monotonic() - se.start_time
+            nodes = counters.nodes + counters.qnodes
+            nps = int(nodes / elapsed) if elapsed > 0 else 0
+            uci_info(d, best_score, nodes, nps, int(elapsed * 1000), counters.qnodes, se.tt.hashfull(), counters.cutoff_rate(),
+                     se.prev_pv, counters)
+        if forced_draw:
+            break
+
+    if best_move is None and max_depth > 0:
+        #Out of time before depth 1 finished, any legal move beats no bestmove
+        best_move = root_moves[0]
 
+    if stats is not None:
+        stats.update(se.update_stats().as_dict())
     return best_move, best_score, depth_reached
+
+
+def bench(depth=BENCH_DEPTH, backend=DEFAULT_BACKEND) -> tuple:
+    """Search each PERFT_RESULTS position to depth with a fresh table, returns (total nodes, seconds).
+
+    The node count only changes when the search does, a change meant to be
+    a pure speed up must leave it alone.
+    """
+    nodes = []
+    def count_nodes(depth, score, total_nodes, *_):
+        nodes[-1] = total_nodes
+    start = time.monotonic()
+    for fen in PERFT_RESULTS:
+        board = Board()
+        fen_to_board(board, fen)
+        nodes.append(0)
+        search(board, depth, None, count_nodes, backend, TranspositionTable(1))
+    return sum(nodes), time.monotonic() - start
@@ -0,0 +1,111 @@
+"""Static exchange evaluation for the mailbox Board.
+
+see(board, move) plays out every capture on the target square of a move,
+each side recapturing with its least valuable attacker, and returns the
+material balance (centipawns) for the side making the move once both sides
+stop at their best point. Nothing is played on the board: pieces that have
+already captured are kept in a set of vacated squares that the slider scans
+look through, which also uncovers x-ray attackers lined up behind them.
+Pins and checks are ignored.
+"""
+from board import Board
+from constants import PAWN, KING, BLACK_BIT, PIECE_VALUES, EN_PASSANT, PROMO_FLAG
+from constants import WP, WN, WB, WR, WQ, WK, BP, BN, BB, BR, BQ, BK
+from move_gen import PAWN_ATTACKS, KNIGHT_TARGETS, KING_TARGETS, BISHOP_BETWEEN, ROOK_BETWEEN
+
+#Unsigned value of each piece code
+SEE_VALUES = [abs(value) for value in PIECE_VALUES]
+
+#Piece codes of each side, least valuable first
+_ATTACKER_ORDER = ((WP, WN, WB, WR, WQ, WK), (BP, BN, BB, BR, BQ, BK))
+
+
+def _clear(board_play, between, vacated) -> bool:
+    """Nothing but vacated squares between a slider and the target"""
+    for target in between:
+        if board_play[target] and target not in vacated:
+            return False
+    return True
+
+
+def least_valuable_attacker(board: Board, square: int, side: int, vacated: set) -> int:
+    """120 square of the cheapest piece of side attacking square, -1 if none.
+
+    Pieces on vacated squares are gone and do not block sliders.
+    """
+    board_play = board.board_play
+    piece_list = board.piece_list
+    pawn, knight, bishop, rook, queen, king = _ATTACKER_ORDER[side]
+
+    for target in PAWN_ATTACKS[1 - side][square]:
+        if board_play[target] == pawn and target not in vacated:
+            return target
+    for target in KNIGHT_TARGETS[square]:
+        if board_play[target] == knight and target not in vacated:
+            return target
+    lines = BISHOP_BETWEEN[square]
+    for slider_sq in piece_list[bishop]:
+        between = lines.get(slider_sq)
+        if between is not None and slider_sq not in vacated and _clear(board_play, between, vacated):
+            return slider_sq
+    lines = ROOK_BETWEEN[square]
+    for slider_sq in piece_list[rook]:
+        between = lines.get(slider_sq)
+        if between is not None and slider_sq not in vacated and _clear(board_play, between, vacated):
+            return slider_sq
+    for slider_sq in piece_list[queen]:
+        if slider_sq in vacated:
+            continue
+        between = BISHOP_BETWEEN[square].get(slider_sq)
+        if between is None:
+            between = ROOK_BETWEEN[square].get(slider_sq)
+        if between is not None and _clear(board_play, between, vacated):
+            return slider_sq
+    for target in KING_TARGETS[square]:
+        if board_play[target] == king and target not in vacated:
+            return target
+    return -1
+
+
+def see(board: Board, move: int) -> int:
+    """Material won (negative: lost) by the side playing move after all recaptures on its target."""
+    board_play = board.board_play
+    mailbox64 = board.mailbox64
+    from_sq = mailbox64[move & 63]
+    to_sq = mailbox64[(move >> 6) & 63]
+    flag = move >> 12
+
+    piece = board_play[from_sq]
+    vacated = {from_sq}
+    if flag == EN_PASSANT:
+        gain = SEE_VALUES[WP]
+        #The captured pawn stands beside the target square, behind it from the mover's side
+        vacated.add(to_sq + (10 if piece == WP else -10))
+    else:
+        gain = SEE_VALUES[board_play[to_sq]]
+    if flag & PROMO_FLAG:
+        #Promotion flags 8..11 and 12..15 map to knight..queen in the low two bits
+        piece = (piece & BLACK_BIT) | (PAWN + 1 + (flag & 3))
+        gain += SEE_VALUES[piece] - SEE_VALUES[WP]
+
+    #gains[i]: balance for the side that made capture i if the exchange stopped there
+    gains = [gain]
+    on_square = SEE_VALUES[piece] #Value of the piece that would be taken next
+    side = 1 - (piece >> 3)
+    while True:
+        attacker_sq = least_valuable_attacker(board, to_sq, side, vacated)
+        if attacker_sq < 0:
+            break
+        attacker = board_play[attacker_sq]
+        if attacker & 7 == KING and least_valuable_attacker(board, to_sq, 1 - side, vacated | {attacker_sq}) >= 0:
+            #The king may not capture onto a defended square
+            break
+        gains.append(on_square - gains[-1])
+        on_square = SEE_VALUES[attacker]
+        vacated.add(attacker_sq)
+        side = 1 - side
+
+    #Each side may stop the exchange instead of recapturing
+    for i in range(len(gains) - 1, 0, -1):
+        gains[i - 1] = -max(-gains[i - 1], gains[i])
+    return gains[0]
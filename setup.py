@@ -5,16 +5,28 @@ setup(
     version="0.1.0",
     description="Simple Chess Engine (SCE)",
     py_modules=[
+        "backends",
+        "bitbase",
+        "bitboard",
         "board",
         "constants",
+        "epd_perft",
         "eval",
         "fen",
         "main",
         "make_move",
+        "move_encoding",
         "move_gen",
         "perft",
+        "perft_bench",
+        "perft_table",
         "search",
+        "see",
+        "smp",
+        "timeman",
+        "tt",
         "uci",
+        "zobrist",
     ],
     python_requires=">=3.11",
     author="I-AM-SENTIENT",
@@ -0,0 +1,199 @@
+"""Lazy SMP: helper processes searching the same position through one shared table.
+
+Python threads cannot search in parallel under the GIL, so the helpers are
+processes. Each one runs the normal iterative deepening search of the root
+the main process is searching, starting from another root move and every
+other one a ply deeper. They share nothing but a SharedTranspositionTable,
+the cutoffs and move orderings one of them stores save the others work, which
+is where the speed up comes from.
+
+The main process searches too and decides when to stop. The helpers are told
+to stop when it returns and the deepest result of all of them is played. A
+helper that died or does not answer in HELPER_TIMEOUT seconds is ended and
+left out, the search plays what the others found.
+
+    python smp.py --threads 1 2 4 8 --depth 6
+"""
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from board import Board
+from fen import fen_to_board, board_to_fen
+from backends import DEFAULT_BACKEND
+from constants import PERFT_RESULTS
+from search import search, SearchControl, MAX_DEPTH
+from bitbase import Bitbases
+from tt import SharedTranspositionTable, DEFAULT_HASH_MB
+
+MAX_THREADS = 128
+BENCH_DEPTH = 6
+HELPER_TIMEOUT = 5.0 #Seconds a stopped helper gets to send its result before it counts as lost
+HELPER_POLL = 0.1    #Seconds between checks that the helpers are still alive
+
+
+def _helper_main(index: int, table_name: str, tasks, results, stopped):
+    """Body of a helper process: search each (fen, key history, backend, pruning, bitbase directory) task until stopped is set."""
+    tt = SharedTranspositionTable(name=table_name)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            fen, keys, backend, pruning, bitbase_dir = task
+            bitbases = None
+            if bitbase_dir:
+                #The main process has generated and checked the files, only map them
+                bitbases = Bitbases(bitbase_dir)
+                bitbases.map_files()
+            board = Board()
+            fen_to_board(board, fen)
+            board.set_key_history(keys)
+            nodes = []
+            def count_nodes(depth, score, total_nodes, *_):
+                nodes[:] = [total_nodes]
+            control = SearchControl(infinite=True, stopped=stopped)
+            best_move, score, depth = search(board, MAX_DEPTH, None, count_nodes, backend, tt, pruning, control, index,
+                                             bitbases=bitbases)
+            if bitbases:
+                bitbases.close()
+            results.put((index, best_move, score, depth, nodes[0] if nodes else 0))
+    finally:
+        tt.close()
+
+
+class LazySMP:
+    """The main search plus threads - 1 helper processes sharing a hash_mb table.
+
+    The helpers are started once and wait for work between searches, close()
+    ends them and frees the table. workers maps each helper's index to its
+    process and task queue.
+    """
+
+    def __init__(self, threads: int, hash_mb: int = DEFAULT_HASH_MB):
+        self.tt = SharedTranspositionTable(hash_mb)
+        context = multiprocessing.get_context()
+        self.stopped = context.Event()
+        self.results = context.Queue()
+        self.workers = {}
+        self.helper_nodes = 0 #Nodes of the helpers' finished iterations in the last search
+        for index in range(1, threads):
+            tasks = context.Queue()
+            helper = context.Process(target=_helper_main, args=(index, self.tt.name, tasks, self.results, self.stopped),
+                                     daemon=True)
+            helper.start()
+            self.workers[index] = helper, tasks
+
+    @property
+    def helpers(self) -> list:
+        return [helper for helper, _ in self.workers.values()]
+
+    @property
+    def threads(self) -> int:
+        return len(self.workers) + 1
+
+    def search(self, board, depth=None, time_ms=None, uci_info=None, backend=DEFAULT_BACKEND, pruning=None, control=None,
+               time_manager=None, bitbases=None):
+        """search() of board with the helpers running alongside, same arguments and result.
+
+        The helpers stop once the main search returns, whether it ran out of depth or time or was stopped.
+        The helpers map the bitbase files for themselves once bitbases is ready, they never generate them.
+        """
+        self.stopped.clear()
+        fen = board_to_fen(board)
+        keys = board.undo_hash[:board.ply] #The game so far, the helpers see the same repetitions
+        bitbase_dir = bitbases.directory if bitbases and bitbases.ready else None
+        for _, tasks in self.workers.values():
+            tasks.put((fen, keys, backend, pruning, bitbase_dir))
+        try:
+            result = search(board, depth, time_ms, uci_info, backend, self.tt, pruning, control, time_manager=time_manager,
+                            bitbases=bitbases)
+        finally:
+            self.stopped.set()
+            helper_results = self._collect()
+        self.helper_nodes = sum(nodes for *_, nodes in helper_results)
+        #A helper that finished a deeper iteration knows better, on equal depth the main search wins
+        best_move, score, depth_reached = result
+        for _, helper_move, helper_score, helper_depth, _ in helper_results:
+            if helper_move and helper_depth > depth_reached:
+                best_move, score, depth_reached = helper_move, helper_score, helper_depth
+        return best_move, score, depth_reached
+
+    def _collect(self) -> list:
+        """Result of every helper after the stop, the helpers that died or gave none in time are dropped."""
+        pending = set(self.workers)
+        helper_results = []
+        deadline = time.monotonic() + HELPER_TIMEOUT
+        while pending:
+            try:
+                result = self.results.get(timeout=HELPER_POLL)
+            except queue.Empty:
+                if time.monotonic() > deadline:
+                    lost = set(pending)
+                else:
+                    lost = {index for index in pending if not self.workers[index][0].is_alive()}
+                for index in lost:
+                    self._drop(index)
+                pending -= lost
+                continue
+            #A dropped helper may have sent its result late, it is not waited for any more
+            if result[0] in pending:
+                pending.discard(result[0])
+                helper_results.append(result)
+        return helper_results
+
+    def _drop(self, index: int):
+        """End a lost helper and search without it from now on."""
+        helper, _ = self.workers.pop(index)
+        helper.kill() #A hung process may not act on a terminate
+        helper.join()
+        print(f"Lazy SMP helper {index} lost (exit code {helper.exitcode}), searching on without it", file=sys.stderr)
+
+    def close(self):
+        for _, tasks in self.workers.values():
+            tasks.put(None)
+        for helper in self.helpers:
+            helper.join()
+        self.tt.close()
+
+
+def scaling_benchmark(thread_counts, depth: int = BENCH_DEPTH, backend: str = DEFAULT_BACKEND, positions=None) -> list:
+    """Time to depth of every position for each thread count, [{'threads', 'seconds', 'speedup'}, ...].
+
+    Each thread count starts from an empty table, speedup is against the first count.
+    """
+    if positions is None:
+        positions = list(PERFT_RESULTS)
+    rows = []
+    for threads in thread_counts:
+        smp = LazySMP(threads)
+        try:
+            start = time.monotonic()
+            for fen in positions:
+                board = Board()
+                fen_to_board(board, fen)
+                smp.tt.clear()
+                smp.search(board, depth, backend=backend)
+            seconds = time.monotonic() - start
+        finally:
+            smp.close()
+        rows.append({'threads': threads, 'seconds': seconds, 'speedup': rows[0]['seconds'] / seconds if rows else 1.0})
+    return rows
+
+
+def main(argv: list = None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="Lazy SMP time to depth for several process counts")
+    parser.add_argument("--threads", type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument("--depth", type=int, default=BENCH_DEPTH)
+    parser.add_argument("--backend", default=DEFAULT_BACKEND)
+    args = parser.parse_args(argv)
+    print(f"Lazy SMP scaling, depth {args.depth} on {len(PERFT_RESULTS)} positions, {os.cpu_count()} CPUs")
+    for row in scaling_benchmark(args.threads, args.depth, args.backend):
+        print(f"  {row['threads']:>3} threads {row['seconds']:8.2f}s  x{row['speedup']:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
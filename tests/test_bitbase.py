@@ -0,0 +1,187 @@
+import random
+import shutil
+import pytest
+from board import Board, MAILBOX120
+from fen import fen_to_board
+from constants import PIECE_CHARS, WP, WR, WQ, BR
+from move_gen import legal_moves, in_check, piece_count, piece_squares
+from make_move import make_move, unmake_move
+from bitbase import Bitbases, TABLE_PIECES, KING_MOVES, WIN, DRAW, LOSS, ensure_tables, generate, table_path, verify
+from search import search, is_rule_draw, MATE_SCORE, KNOWN_WIN
+from smp import LazySMP
+
+
+@pytest.fixture(scope='module')
+def bitbase_dir(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('bitbases'))
+    assert ensure_tables(directory, jobs=2) == ['kqk', 'krk', 'kpk']
+    return directory
+
+
+@pytest.fixture
+def bitbases(bitbase_dir):
+    tables = Bitbases(bitbase_dir)
+    tables.prepare()
+    yield tables
+    tables.close()
+
+
+def probe_fen(bitbases, fen):
+    b = Board()
+    fen_to_board(b, fen)
+    return bitbases.probe(piece_squares(b), b.side_to_move)
+
+
+def test_generation_is_deterministic(bitbase_dir):
+    #Made by two processes, the files hash as they should and match a single process run
+    assert all(verify(bitbase_dir).values())
+    with open(table_path(bitbase_dir, 'kqk'), 'rb') as f:
+        assert generate('kqk', jobs=1) == f.read()
+    assert ensure_tables(bitbase_dir) == []
+
+
+def test_damaged_table_is_made_again(bitbase_dir, tmp_path):
+    directory = str(tmp_path)
+    for kind in TABLE_PIECES:
+        shutil.copy(table_path(bitbase_dir, kind), directory)
+    with open(table_path(directory, 'krk'), 'r+b') as f:
+        f.truncate(1000)
+    assert verify(directory) == {'kqk': True, 'krk': False, 'kpk': True}
+    assert ensure_tables(directory, jobs=1) == ['krk']
+    assert all(verify(directory).values())
+
+
+def test_nothing_is_found_until_prepared(bitbase_dir):
+    bitbases = Bitbases(bitbase_dir)
+    fen = 'k7/8/2K5/8/8/8/8/7R w - - 0 1'
+    assert probe_fen(bitbases, fen) is None
+    b = Board()
+    fen_to_board(b, fen)
+    #A search before the tables are ready just searches
+    assert search(b, 4, bitbases=bitbases)[1:] == (MATE_SCORE - 3, 4)
+    bitbases.start()
+    bitbases.thread.join()
+    assert bitbases.ready and probe_fen(bitbases, fen) == (WIN, 3, True)
+    bitbases.close()
+
+
+@pytest.mark.parametrize("fen, expected", [
+    ('k7/8/1K6/8/8/8/8/7R w - - 0 1', (WIN, 1, True)),      #Rh8 mate
+    ('k7/8/2K5/8/8/8/8/7R w - - 0 1', (WIN, 3, True)),
+    ('8/8/8/3k4/8/8/8/KQ6 b - - 0 1', (LOSS, 18, True)),
+    ('4k3/8/4K3/4P3/8/8/8/8 w - - 0 1', (WIN, 9, False)),   #Plies to the promotion
+    ('8/8/8/8/8/4k3/4P3/4K3 w - - 0 1', (DRAW, 0, False)),
+    ('k7/8/8/8/8/8/P7/K7 w - - 0 1', (DRAW, 0, False)),      #Rook pawn
+    ('8/8/8/8/8/4K3/4p3/4k3 b - - 0 1', (WIN, 3, False)),   #Black pawn, looked up flipped
+    ('8/8/8/8/8/4K3/4p3/4k3 w - - 0 1', (LOSS, 4, False)),
+    ('k7/2Q5/1K6/8/8/8/8/8 b - - 0 1', (DRAW, 0, False)),    #Stalemate
+    ('k7/1R6/8/8/8/8/8/6K1 b - - 0 1', (DRAW, 0, False)),    #The rook falls
+    ('k7/8/8/8/8/8/8/6K1 w - - 0 1', (DRAW, 0, False)),
+    ('k7/8/8/8/8/8/8/5BK1 w - - 0 1', (DRAW, 0, False)),
+    ('k7/8/8/8/8/8/P7/5BK1 w - - 0 1', None),
+])
+def test_probe(bitbases, fen, expected):
+    assert probe_fen(bitbases, fen) == expected
+
+
+def _fen(stm, wk, bk, square, piece):
+    rows = []
+    for row in range(8):
+        line = ''
+        for sq in range(row * 8, row * 8 + 8):
+            char = {wk: 'K', bk: 'k', square: PIECE_CHARS[piece]}.get(sq, '1')
+            line += char
+        rows.append(line)
+    return '/'.join(rows) + (' w' if stm == 0 else ' b') + ' - - 0 1'
+
+
+@pytest.mark.parametrize("kind", list(TABLE_PIECES))
+def test_tables_agree_with_the_move_generator(bitbases, kind):
+    """Each result follows from the results after every legal move, one ply closer."""
+    piece = {'kqk': WQ, 'krk': WR, 'kpk': WP}[kind]
+    rng = random.Random(kind)
+    b = Board()
+    checked = 0
+    while checked < 150:
+        stm, wk, bk, square = rng.randrange(2), rng.randrange(64), rng.randrange(64), rng.randrange(8, 56)
+        if len({wk, bk, square}) < 3 or bk in KING_MOVES[wk]:
+            continue
+        fen_to_board(b, _fen(stm, wk, bk, square, piece))
+        b.side_to_move ^= 1
+        illegal = in_check(b)
+        b.side_to_move ^= 1
+        if illegal:
+            continue
+        checked += 1
+        after = []
+        for move in legal_moves(b):
+            make_move(b, move)
+            result, plies, mate = bitbases.probe(piece_squares(b), b.side_to_move)
+            unmake_move(b)
+            #A promotion completes a king and pawn win
+            after.append((result, 0 if mate and kind == 'kpk' else plies))
+        if not after:
+            expected = (LOSS, 0) if in_check(b) else (DRAW, 0)
+        elif stm == 0:
+            wins = [plies for result, plies in after if result == LOSS]
+            expected = (WIN, 1 + min(wins)) if wins else (DRAW, 0)
+        else:
+            lost = all(result == WIN for result, _ in after)
+            expected = (LOSS, 1 + max(plies for _, plies in after)) if lost else (DRAW, 0)
+        assert bitbases.probe(piece_squares(b), stm)[:2] == expected, b
+
+
+@pytest.mark.parametrize("backend", ['mailbox', 'bitboard'])
+def test_search_probes_the_bitbases(bitbases, backend):
+    b = Board()
+    #The root is settled by the tables in one iteration
+    fen_to_board(b, 'k7/8/2K5/8/8/8/8/7R w - - 0 1')
+    stats = {}
+    best_move, score, depth = search(b, 8, backend=backend, bitbases=bitbases, stats=stats)
+    assert (score, depth) == (MATE_SCORE - 3, 1)
+    assert score == search(b, 4, backend=backend)[1]
+    assert stats['bitbase_hits'] > 0
+    fen_to_board(b, '8/8/8/8/8/4k3/4P3/4K3 w - - 0 1')
+    assert search(b, 8, backend=backend, bitbases=bitbases)[1:] == (0, 1)
+    #Taking the rook leaves a drawn rook pawn ending, the tables know it inside the tree
+    fen_to_board(b, 'k7/8/8/8/8/8/Pr6/K7 w - - 0 1')
+    assert search(b, 3, backend=backend)[1] > 50
+    best_move, score, depth = search(b, 3, backend=backend, bitbases=bitbases)
+    assert (best_move >> 6 & 63, score) == (MAILBOX120[b.piece_list[BR][0]], 0)
+
+
+def test_won_king_and_pawn_ending_is_played_out(bitbases):
+    b = Board()
+    fen_to_board(b, '8/8/8/4k3/8/8/3KP3/8 w - - 0 1')
+    assert search(b, 4, bitbases=bitbases)[1] > KNOWN_WIN // 2
+    for _ in range(80):
+        if not legal_moves(b) or is_rule_draw(b):
+            break
+        make_move(b, search(b, 4, bitbases=bitbases)[0])
+    assert not legal_moves(b) and in_check(b) and b.side_to_move == 1
+
+
+def test_piece_squares_and_count_backends_agree():
+    from backends import get_backend
+    bitboard = get_backend('bitboard')
+    b = Board()
+    fen_to_board(b, 'k7/8/8/8/8/8/P7/5BK1 w - - 0 1')
+    expected = sorted((piece, MAILBOX120[sq]) for piece, squares in enumerate(b.piece_list) for sq in squares)
+    assert sorted(piece_squares(b)) == expected
+    assert sorted(bitboard.piece_squares(bitboard.from_board(b))) == expected
+    assert piece_count(b) == bitboard.piece_count(bitboard.from_board(b)) == 4
+
+
+def test_lazy_smp_with_bitbases(bitbase_dir):
+    smp = LazySMP(2, 1)
+    bitbases = Bitbases(bitbase_dir)
+    bitbases.prepare()
+    try:
+        b = Board()
+        fen_to_board(b, 'k7/8/2K5/8/8/8/8/7R w - - 0 1')
+        best_move, score, depth = smp.search(b, 6, bitbases=bitbases)
+        assert score == MATE_SCORE - 3
+        assert best_move in legal_moves(b)
+    finally:
+        smp.close()
+        bitbases.close()
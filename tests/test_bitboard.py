@@ -0,0 +1,98 @@
+import pytest
+import bitboard
+from board import Board
+from fen import fen_to_board
+from move_gen import legal_moves
+from make_move import make_move, unmake_move
+from eval import evaluate
+from perft import perft_divide
+from search import search
+from constants import PERFT_RESULTS, STARTING_FEN
+
+
+def _walk(board, pos, depth):
+    """Compare both backends move for move over a whole subtree."""
+    mailbox_moves = legal_moves(board)
+    assert sorted(mailbox_moves) == sorted(bitboard.legal_moves(pos))
+    assert board.hash_key == pos.hash_key == bitboard.compute_hash(pos)
+    assert evaluate(board) == bitboard.evaluate(pos)
+    if depth == 0:
+        return
+    for move in mailbox_moves:
+        make_move(board, move)
+        bitboard.make_move(pos, move)
+        _walk(board, pos, depth - 1)
+        bitboard.unmake_move(pos)
+        unmake_move(board)
+
+
+@pytest.mark.parametrize("fen", list(PERFT_RESULTS.keys()))
+def test_bitboard_matches_mailbox(fen):
+    b = Board()
+    fen_to_board(b, fen)
+    _walk(b, bitboard.from_board(b), 2)
+
+
+@pytest.mark.parametrize("fen", list(PERFT_RESULTS.keys()))
+def test_bitboard_perft_depths_1_to_3(fen):
+    pos = bitboard.from_fen(fen)
+    expected = PERFT_RESULTS[fen]
+    for depth in range(1, 4):
+        assert bitboard.perft(pos, depth) == expected[depth - 1]
+
+
+@pytest.mark.parametrize("fen", [
+    '4k3/8/8/1b6/8/3P4/8/5K2 w - - 0 1',   # pinned pawn may only take the pinner
+    '4k3/8/8/8/4r3/8/4P3/4K3 w - - 0 1',    # pinned pawn still pushes along the pin
+    '8/8/8/8/k2Pp2Q/8/8/4K3 b - d3 0 1',    # en passant would expose the king
+])
+def test_bitboard_pinned_pawns_match_mailbox(fen):
+    b = Board()
+    fen_to_board(b, fen)
+    assert sorted(bitboard.legal_moves(bitboard.from_board(b))) == sorted(legal_moves(b))
+
+
+def test_bitboard_undo_stack_grows_for_long_games():
+    from board import UNDO_STACK_SIZE
+    from uci import uci_to_move
+    b = Board()
+    fen_to_board(b, STARTING_FEN)
+    pos = bitboard.from_board(b)
+    start = (bytes(pos.squares), pos.hash_key, pos.mg_score, pos.eg_score)
+    shuffle = ['g1f3', 'g8f6', 'f3g1', 'f6g8']
+    plies = UNDO_STACK_SIZE + 10
+    for i in range(plies):
+        move = uci_to_move(b, shuffle[i % 4])
+        make_move(b, move)
+        bitboard.make_move(pos, move)
+    assert pos.ply == plies
+    for _ in range(plies):
+        bitboard.unmake_move(pos)
+    assert (bytes(pos.squares), pos.hash_key, pos.mg_score, pos.eg_score) == start
+    assert pos.half_move_counter == 0 and pos.full_move_counter == 1
+
+
+def test_bitboard_divide_matches_mailbox():
+    fen = list(PERFT_RESULTS.keys())[1]
+    b = Board()
+    fen_to_board(b, fen)
+    assert perft_divide(bitboard.from_fen(fen), 2, 'bitboard') == perft_divide(b, 2)
+
+
+def test_search_on_bitboard_backend():
+    b = Board()
+    fen_to_board(b, STARTING_FEN)
+    best_move, score, depth = search(b, depth=2, backend='bitboard')
+    assert depth == 2
+    assert best_move in legal_moves(b)
+
+
+@pytest.mark.parametrize("fen", list(PERFT_RESULTS.keys()))
+def test_square_attacks_match_mailbox(fen):
+    from move_gen import is_square_attacked
+    b = Board()
+    fen_to_board(b, fen)
+    pos = bitboard.from_board(b)
+    for sq in range(64):
+        for side in (0, 1):
+            assert is_square_attacked(b, bitboard.SQ120[sq], side) == bitboard.is_square_attacked(pos, sq, side)
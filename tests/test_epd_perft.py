@@ -0,0 +1,39 @@
+import io
+from epd_perft import parse_epd_line, run_epd
+from constants import PERFT_RESULTS, STARTING_FEN
+
+
+def _suite(max_depth=2):
+    return [f"{fen} ;" + ' ;'.join(f"D{depth} {nodes}" for depth, nodes in enumerate(counts[:max_depth], start=1))
+            for fen, counts in PERFT_RESULTS.items()]
+
+
+def test_parse_epd_line():
+    fen, depths = parse_epd_line(f"{STARTING_FEN} ;D1 20 ;D2 400\n")
+    assert fen == STARTING_FEN and depths == {1: 20, 2: 400}
+    assert parse_epd_line('   \n') is None
+    assert parse_epd_line('# comment') is None
+
+
+def test_run_epd_counts_all_positions():
+    for jobs in (1, 2):
+        summary = run_epd(io.StringIO('\n'.join(_suite()) + '\n'), jobs=jobs)
+        assert summary['failure'] is None
+        assert summary['positions'] == len(PERFT_RESULTS)
+        assert summary['nodes'] == sum(counts[0] + counts[1] for counts in PERFT_RESULTS.values())
+    # deeper counts than max_depth are skipped
+    summary = run_epd(io.StringIO('\n'.join(_suite(3))), max_depth=1)
+    assert summary['nodes'] == sum(counts[0] for counts in PERFT_RESULTS.values())
+
+
+def test_run_epd_stops_at_first_mismatch(capsys):
+    lines = _suite()
+    lines[1] = lines[1].replace('D2 2039', 'D2 2040')
+    for jobs in (1, 2):
+        summary = run_epd(io.StringIO('\n'.join(lines)), jobs=jobs)
+        line_no, fen, depth, expected, got = summary['failure']
+        assert (line_no, depth, expected, got) == (2, 2, 2040, 2039)
+        assert summary['positions'] == 2
+        out = capsys.readouterr().out
+        assert 'Line 2: depth 2 gave 2039 nodes, expected 2040' in out
+        assert 'Total: 2039' in out
@@ -0,0 +1,42 @@
+import pytest
+import bitboard
+from board import Board
+from fen import fen_to_board
+from eval import evaluate, compute_eval, PHASE_MAX
+from perft import perft
+from search import search
+from move_encoding import square_name
+from constants import PERFT_RESULTS, STARTING_FEN
+
+
+@pytest.mark.parametrize("fen", list(PERFT_RESULTS.keys()))
+def test_incremental_eval_matches_recompute(fen):
+    b = Board()
+    fen_to_board(b, fen)
+    # perft raises if the running mg/eg/phase ever drift from a full recompute
+    perft(b, 2, check_eval=True)
+    bitboard.perft(bitboard.from_board(b), 2, check_eval=True)
+    assert (b.mg_score, b.eg_score, b.phase) == compute_eval(b)
+
+
+def test_start_position_is_balanced_and_full_phase():
+    b = Board()
+    fen_to_board(b, STARTING_FEN)
+    assert evaluate(b) == 0
+    assert b.phase == PHASE_MAX
+
+
+def test_mirrored_positions_negate():
+    a = Board()
+    fen_to_board(a, 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1')
+    b = Board()
+    fen_to_board(b, 'r3k2r/pppbbppp/2n2q1P/1P2p3/3pn3/BN2PNP1/P1PPQPB1/R3K2R b KQkq - 0 1')
+    assert evaluate(a) == -evaluate(b)
+
+
+def test_search_takes_hanging_queen_for_black():
+    b = Board()
+    fen_to_board(b, '4k3/8/8/3q4/8/8/3Q4/K7 b - - 0 1')
+    best_move, score, depth = search(b, depth=2)
+    assert square_name((best_move >> 6) & 63) == 'd2'
+    assert score > 0
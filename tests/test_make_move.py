@@ -1,3 +1,4 @@
+import pytest
 from board import Board
 from fen import fen_to_board
 from make_move import make_move, unmake_move
@@ -8,19 +9,86 @@ def test_make_unmake_move_restores_board():
     fen_to_board(b, "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
 
     # pick the first legal move and ensure restoration
-    from move_gen import generate_legal_moves
-    moves = generate_legal_moves(b)
+    from move_gen import legal_moves
+    moves = legal_moves(b)
     assert moves
     move = moves[0]
 
     # snapshot
-    board_snapshot = list(b.board_play)
-    piece_list_snapshot = {k: list(v) for k, v in b.piece_list.items()}
+    board_snapshot = bytes(b.board_play)
+    piece_list_snapshot = [list(v) for v in b.piece_list]
 
-    undo = make_move(b, move)
+    make_move(b, move)
     # ensure something changed
-    assert b.board_play != board_snapshot or b.piece_list != piece_list_snapshot
+    assert bytes(b.board_play) != board_snapshot or b.piece_list != piece_list_snapshot
 
-    unmake_move(b, undo)
-    assert b.board_play == board_snapshot
-    assert all(sorted(b.piece_list[k]) == sorted(piece_list_snapshot[k]) for k in b.piece_list)
+    unmake_move(b)
+    assert bytes(b.board_play) == board_snapshot
+    assert all(sorted(b.piece_list[k]) == sorted(piece_list_snapshot[k]) for k in range(len(b.piece_list)))
+
+
+def test_piece_index_tracks_piece_lists():
+    from constants import POS4_FEN
+    from move_gen import legal_moves
+    b = Board()
+    fen_to_board(b, POS4_FEN)
+
+    def check():
+        for piece, squares in enumerate(b.piece_list):
+            for slot, sq in enumerate(squares):
+                assert b.board_play[sq] == piece
+                assert b.piece_index[sq] == slot
+
+    # walk two plies of captures, promotions and castling and check the reverse index at each node
+    for move in legal_moves(b):
+        make_move(b, move)
+        check()
+        for reply in legal_moves(b):
+            make_move(b, reply)
+            check()
+            unmake_move(b)
+        unmake_move(b)
+        check()
+
+
+def test_undo_stack_grows_for_long_games():
+    from board import UNDO_STACK_SIZE
+    from uci import uci_to_move
+    b = Board()
+    fen_to_board(b, "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+    start = (bytes(b.board_play), b.hash_key, b.castling)
+    shuffle = ['g1f3', 'g8f6', 'f3g1', 'f6g8']
+    plies = UNDO_STACK_SIZE + 10
+    for i in range(plies):
+        make_move(b, uci_to_move(b, shuffle[i % 4]))
+    assert b.ply == plies
+    for _ in range(plies):
+        unmake_move(b)
+    assert (bytes(b.board_play), b.hash_key, b.castling) == start
+    assert b.half_move_counter == 0 and b.full_move_counter == 1
+
+
+@pytest.mark.parametrize("backend", ['mailbox', 'bitboard'])
+def test_null_move_passes_the_turn_and_restores(backend):
+    from backends import get_backend
+    from zobrist import SIDE_KEY
+    ops = get_backend(backend)
+    #Black to move with an en passant square, the null move has to clear it from the key too
+    pos = ops.from_fen("rnbqkbnr/ppp1pppp/8/8/3pP3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 3")
+    before = (pos.side_to_move, pos.ep_square, pos.hash_key, pos.half_move_counter, pos.full_move_counter, pos.ply)
+    ops.make_null_move(pos)
+    assert pos.side_to_move == 0 and pos.ep_square == -1
+    assert pos.hash_key == ops.from_fen("rnbqkbnr/ppp1pppp/8/8/3pP3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 4").hash_key
+    assert pos.half_move_counter == 0
+    assert pos.hash_key != before[2] ^ SIDE_KEY
+    ops.unmake_null_move(pos)
+    assert (pos.side_to_move, pos.ep_square, pos.hash_key, pos.half_move_counter, pos.full_move_counter, pos.ply) == before
+
+
+@pytest.mark.parametrize("backend", ['mailbox', 'bitboard'])
+def test_has_non_pawn_material(backend):
+    from backends import get_backend
+    ops = get_backend(backend)
+    pos = ops.from_fen("4k3/pppp4/8/8/8/8/4PPPP/3NK3 w - - 0 1")
+    assert ops.has_non_pawn_material(pos, 0)
+    assert not ops.has_non_pawn_material(pos, 1)
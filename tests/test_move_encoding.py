@@ -0,0 +1,43 @@
+from board import Board
+from fen import fen_to_board
+from move_gen import legal_moves
+from move_encoding import move_from, move_to, move_flag, is_capture, promo_piece_type, square_name, square_from_name
+from uci import move_to_uci, uci_to_move
+from constants import STARTING_FEN, KIWIPETE_FEN, POS4_FEN, DOUBLE_PUSH, CASTLE_SHORT, EN_PASSANT, PROMO_Q, QUEEN, KNIGHT
+
+
+def test_square_names_round_trip():
+    assert square_name(0) == 'a8' and square_name(63) == 'h1'
+    assert all(square_from_name(square_name(sq)) == sq for sq in range(64))
+
+
+def test_moves_fit_in_16_bits_and_round_trip_through_uci():
+    for fen in (STARTING_FEN, KIWIPETE_FEN, POS4_FEN):
+        b = Board()
+        fen_to_board(b, fen)
+        for move in legal_moves(b):
+            assert 0 < move < 1 << 16
+            assert uci_to_move(b, move_to_uci(move)) == move
+
+
+def test_flags_decode():
+    b = Board()
+    fen_to_board(b, STARTING_FEN)
+    move = uci_to_move(b, 'e2e4')
+    assert square_name(move_from(move)) == 'e2' and square_name(move_to(move)) == 'e4'
+    assert move_flag(move) == DOUBLE_PUSH and not is_capture(move)
+
+    fen_to_board(b, KIWIPETE_FEN)
+    assert move_flag(uci_to_move(b, 'e1g1')) == CASTLE_SHORT
+    assert is_capture(uci_to_move(b, 'e5f7'))
+
+    fen_to_board(b, 'k7/3P4/8/3pP3/8/8/8/K7 w - d6 0 1')
+    assert move_flag(uci_to_move(b, 'e5d6')) == EN_PASSANT
+    assert is_capture(uci_to_move(b, 'e5d6'))
+    assert move_flag(uci_to_move(b, 'd7d8q')) == PROMO_Q
+    assert promo_piece_type(uci_to_move(b, 'd7d8q')) == QUEEN
+    assert promo_piece_type(uci_to_move(b, 'd7d8n')) == KNIGHT
+    assert move_to_uci(uci_to_move(b, 'd7d8n')) == 'd7d8n'
+    #Some GUIs send the promotion piece in upper case
+    assert uci_to_move(b, 'd7d8Q') == uci_to_move(b, 'd7d8q')
+    assert promo_piece_type(uci_to_move(b, 'D7D8N')) == KNIGHT
@@ -0,0 +1,115 @@
+import pytest
+import bitboard
+from board import Board
+from fen import fen_to_board
+from move_gen import MovePicker, legal_moves, generate_moves, generate_captures, generate_promotions, generate_quiets
+from move_encoding import new_move_buffer, is_capture
+from uci import uci_to_move
+from see import see as see_mailbox
+from constants import PERFT_RESULTS, PROMO_FLAG, BAD_CAPTURE_SEE
+
+
+def _drain(picker):
+    moves = []
+    move = picker.next_move()
+    while move:
+        moves.append(move)
+        move = picker.next_move()
+    return moves
+
+
+@pytest.mark.parametrize("fen", list(PERFT_RESULTS.keys()))
+def test_stages_split_the_pseudo_legal_moves(fen):
+    b = Board()
+    fen_to_board(b, fen)
+    buffer = new_move_buffer()
+    everything = sorted(buffer[:generate_moves(b, buffer)])
+    n = generate_captures(b, buffer)
+    n = generate_promotions(b, buffer, n)
+    n = generate_quiets(b, buffer, n)
+    assert sorted(buffer[:n]) == everything
+
+
+@pytest.mark.parametrize("fen", list(PERFT_RESULTS.keys()))
+def test_picker_hands_out_every_legal_move_once_in_stage_order(fen):
+    b = Board()
+    fen_to_board(b, fen)
+    moves = legal_moves(b)
+    quiets = [m for m in moves if not is_capture(m) and not (m >> 12) & PROMO_FLAG]
+    hash_move = moves[-1]
+    killers = (quiets[0], quiets[-1]) if quiets else ()
+    for picker, position in ((MovePicker(), b), (bitboard.MovePicker(), bitboard.from_board(b))):
+        picker.reset(position, hash_move, killers)
+        picked = _drain(picker)
+        assert sorted(picked) == sorted(moves)
+        assert picked[0] == hash_move
+        rest = picked[1:]
+        #Captures that lose material come after every quiet move
+        see = bitboard.see if isinstance(picker, bitboard.MovePicker) else see_mailbox
+        good = [m for m in rest if is_capture(m) and see(position, m) > BAD_CAPTURE_SEE]
+        bad = [m for m in rest if is_capture(m) and see(position, m) <= BAD_CAPTURE_SEE]
+        assert rest[:len(good)] == good
+        assert rest[len(rest) - len(bad):] == bad
+        if killers and hash_move not in killers:
+            start = rest.index(killers[0])
+            assert all(not is_capture(m) for m in rest[start:len(rest) - len(bad)])
+
+
+def test_picker_ignores_hash_moves_and_killers_from_other_positions():
+    b = Board()
+    fen_to_board(b, list(PERFT_RESULTS.keys())[0])
+    other = Board()
+    fen_to_board(other, list(PERFT_RESULTS.keys())[1])
+    foreign = uci_to_move(other, 'e2a6')
+    picker = MovePicker()
+    picker.reset(b, foreign, (uci_to_move(other, 'e1g1'),))
+    assert sorted(_drain(picker)) == sorted(legal_moves(b))
+
+
+@pytest.mark.parametrize("fen", list(PERFT_RESULTS.keys()))
+def test_picker_orders_captures_by_mvv_lva_and_quiets_by_history(fen):
+    import move_gen
+    b = Board()
+    fen_to_board(b, fen)
+    moves = legal_moves(b)
+    history = [0] * 4096
+    quiets = [m for m in moves if not is_capture(m) and not (m >> 12) & PROMO_FLAG]
+    for i, move in enumerate(quiets):
+        history[move & 4095] = (i * 7919) % 101
+    pos = bitboard.from_board(b)
+    for picker, position, mvv_lva, see in ((MovePicker(), b, move_gen.mvv_lva, see_mailbox),
+                                           (bitboard.MovePicker(), pos, bitboard.mvv_lva, bitboard.see)):
+        picker.reset(position, history=history)
+        picked = _drain(picker)
+        for winning in (True, False):
+            captures = [mvv_lva(position, m) for m in picked if is_capture(m) and (see(position, m) > BAD_CAPTURE_SEE) == winning]
+            assert captures == sorted(captures, reverse=True)
+        scores = [history[m & 4095] for m in picked if m in quiets]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_losing_captures_come_after_the_quiet_moves():
+    from uci import move_to_uci
+    b = Board()
+    # the queen takes a defended pawn, the rook an undefended one
+    fen_to_board(b, '4k3/8/2p5/3p4/8/8/8/R2QK3 w - - 0 1')
+    b2 = Board()
+    fen_to_board(b2, '4k3/8/8/8/8/8/p7/R2QK3 w - - 0 1')
+    for picker, position in ((MovePicker(), b), (bitboard.MovePicker(), bitboard.from_board(b))):
+        picker.reset(position)
+        picked = [move_to_uci(m) for m in _drain(picker)]
+        assert picked[-1] == 'd1d5' and 'd1d4' in picked
+    for picker, position in ((MovePicker(), b2), (bitboard.MovePicker(), bitboard.from_board(b2))):
+        picker.reset(position)
+        assert move_to_uci(picker.next_move()) == 'a1a2'
+
+
+def test_mvv_lva_prefers_big_victims_and_small_attackers():
+    from uci import move_to_uci
+    b = Board()
+    # the pawn and the queen can both take the queen on d5, the queen can also take the rook on a4
+    fen_to_board(b, '4k3/8/8/3q4/r3P3/8/8/3QK3 w - - 0 1')
+    for picker, position in ((MovePicker(), b), (bitboard.MovePicker(), bitboard.from_board(b))):
+        picker.reset(position)
+        captures = [move_to_uci(m) for m in _drain(picker) if is_capture(m)]
+        assert captures == ['e4d5', 'd1d5', 'd1a4']
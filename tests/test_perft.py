@@ -21,3 +21,71 @@ def test_perft_depths_1_to_3(fen):
     for depth in range(1, max_depth + 1):
         result = perft(b, depth)
         assert result == expected[depth - 1]
+
+
+def test_all_positions_depth_2():
+    for fen, expected in PERFT_RESULTS.items():
+        b = Board()
+        fen_to_board(b, fen)
+        assert perft(b, 2) == expected[1]
+
+
+@pytest.mark.parametrize("fen, moves", [
+    # en passant would take both pawns off the 5th rank and expose the king to the rook
+    ("8/8/8/K2pP2r/8/8/8/4k3 w - d6 0 1", ['a5a4', 'a5a6', 'a5b4', 'a5b5', 'a5b6', 'e5e6']),
+    # en passant captures the checking pawn
+    ("8/8/8/2k5/3Pp3/8/8/4K3 b - d3 0 1", ['c5b4', 'c5b5', 'c5b6', 'c5c4', 'c5c6', 'c5d4', 'c5d5', 'c5d6', 'e4d3']),
+    # pinned knight cannot move, the bishop may only slide along the pin
+    ("4k3/4r3/8/b7/4N3/8/3B4/4K3 w - - 0 1", ['d2a5', 'd2b4', 'd2c3', 'e1d1', 'e1e2', 'e1f1', 'e1f2']),
+    # double check, only the king moves
+    ("4k3/8/8/8/8/5n2/8/r3K3 w - - 0 1", ['e1e2', 'e1f2']),
+    # single check, besides the king only a pawn push blocks the bishop
+    ("4k3/8/8/8/1b6/8/2P5/R3K1N1 w Q - 0 1", ['c2c3', 'e1d1', 'e1e2', 'e1f1', 'e1f2']),
+    # a single and a double pawn push block the rook
+    ("4k3/8/8/8/r6K/2P5/1P6/8 w - - 0 1", ['b2b4', 'c3c4', 'h4g3', 'h4g5', 'h4h3', 'h4h5']),
+    # the pawn takes the checker and promotes
+    ("1r2k3/P7/8/8/8/8/8/1K6 w - - 0 1", ['a7b8b', 'a7b8n', 'a7b8q', 'a7b8r', 'b1a1', 'b1a2', 'b1c1', 'b1c2']),
+])
+def test_legal_moves_in_pins_and_checks(fen, moves):
+    from move_gen import legal_moves
+    from uci import move_to_uci
+    b = Board()
+    fen_to_board(b, fen)
+    assert sorted(move_to_uci(m) for m in legal_moves(b)) == moves
+
+
+@pytest.mark.parametrize("backend", ['mailbox', 'bitboard'])
+def test_hashed_perft_matches_results(backend):
+    from backends import get_backend
+    from perft_table import PerftTable
+    ops = get_backend(backend)
+    # the smallest table is a single bucket, every store goes through the replacement policy
+    for size_mb in (0, 1):
+        table = PerftTable(size_mb)
+        for fen, expected in PERFT_RESULTS.items():
+            pos = ops.from_fen(fen)
+            assert ops.perft(pos, 3, table=table) == expected[2]
+
+
+def test_hashed_perft_finds_transpositions():
+    from perft_table import PerftTable
+    b = Board()
+    fen_to_board(b, '4k3/8/8/8/8/8/8/4K2R w K - 0 1')
+    table = PerftTable(1)
+    assert perft(b, 5, table=table) == perft(b, 5)
+    assert table.hits > 0 and 0 < table.hit_rate() < 1
+    table.clear()
+    assert table.probes == 0 and perft(b, 5, table=table) == 133987
+
+
+@pytest.mark.parametrize("backend", ['mailbox', 'bitboard'])
+def test_parallel_divide_matches_serial(backend):
+    from backends import get_backend
+    from perft import parallel_divide, perft_divide, move_label
+    from constants import KIWIPETE_FEN
+    ops = get_backend(backend)
+    for depth in (1, 2, 3):
+        counts, hits, probes = parallel_divide(KIWIPETE_FEN, depth, backend, jobs=2)
+        results, total = perft_divide(ops.from_fen(KIWIPETE_FEN), depth, backend)
+        assert {move_label(move): nodes for move, nodes in counts.items()} == results
+        assert sum(counts.values()) == total == PERFT_RESULTS[KIWIPETE_FEN][depth - 1]
@@ -0,0 +1,38 @@
+import json
+from perft_bench import run_benchmark, compare, main
+from constants import STARTING_FEN, POS3_FEN, PERFT_RESULTS
+
+POSITIONS = {fen: PERFT_RESULTS[fen] for fen in (STARTING_FEN, POS3_FEN)}
+
+
+def test_run_benchmark_records_median_and_nps():
+    run = run_benchmark(depth=2, repeats=3, positions=POSITIONS)
+    assert run['machine']['cpu_count']
+    for entry in run['results']:
+        assert entry['nodes'] == entry['expected'] == PERFT_RESULTS[entry['fen']][1]
+        assert len(entry['times']) == 3 and min(entry['times']) <= entry['median_s'] <= max(entry['times'])
+        assert entry['nps'] > 0
+
+
+def test_compare_flags_regressions_past_threshold():
+    run = run_benchmark(depth=2, repeats=1, positions=POSITIONS)
+    baseline = json.loads(json.dumps(run))
+    assert compare(run, baseline, 0.10) == []
+    baseline['results'][0]['nps'] = run['results'][0]['nps'] * 2
+    problems = compare(run, baseline, 0.10)
+    assert len(problems) == 1 and 'nps' in problems[0]
+    assert compare(run, baseline, 0.60) == []
+    # a wrong node count fails with or without a baseline
+    run['results'][1]['nodes'] += 1
+    assert len(compare(run)) == 1
+
+
+def test_main_saves_and_checks_baseline(tmp_path):
+    path = tmp_path / 'baseline.json'
+    assert main(['--depth', '1', '--repeats', '1', '--save', str(path)]) == 0
+    baseline = json.loads(path.read_text())
+    assert len(baseline['results']) == len(PERFT_RESULTS)
+    for entry in baseline['results']:
+        entry['nps'] *= 100
+    path.write_text(json.dumps(baseline))
+    assert main(['--depth', '1', '--repeats', '1', '--baseline', str(path)]) == 1
@@ -0,0 +1,73 @@
+import time
+import pytest
+import bitboard
+from board import Board
+from fen import fen_to_board
+from make_move import make_move, unmake_move
+from move_gen import legal_moves, generate_legal_captures
+from move_encoding import new_move_buffer, square_name
+from search import Searcher, search, INF, MATE_SCORE
+from constants import PERFT_RESULTS, KIWIPETE_FEN, CAPTURE_FLAG, PROMO_FLAG
+
+
+def _walk(board, pos, depth, buffer):
+    noisy = sorted(m for m in legal_moves(board) if (m >> 12) & (CAPTURE_FLAG | PROMO_FLAG))
+    assert sorted(buffer[:generate_legal_captures(board, buffer)]) == noisy
+    assert sorted(buffer[:bitboard.generate_legal_captures(pos, buffer)]) == noisy
+    if depth == 0:
+        return
+    for move in legal_moves(board):
+        make_move(board, move)
+        bitboard.make_move(pos, move)
+        _walk(board, pos, depth - 1, buffer)
+        bitboard.unmake_move(pos)
+        unmake_move(board)
+
+
+@pytest.mark.parametrize("fen", list(PERFT_RESULTS.keys()))
+def test_capture_generators_match_filtered_legal_moves(fen):
+    b = Board()
+    fen_to_board(b, fen)
+    _walk(b, bitboard.from_board(b), 2, new_move_buffer())
+
+
+@pytest.mark.parametrize("backend", ['mailbox', 'bitboard'])
+def test_stand_pat_and_delta_pruning(backend):
+    se = Searcher(backend)
+    # a quiet position stands pat on the static evaluation
+    pos = se.backend.from_fen('4k3/8/8/8/8/8/4P3/4K3 w - - 0 1')
+    assert se.quiesce(pos, -INF, INF, 1) == se.evaluate(pos)
+    # a pawn capture that cannot get near alpha is pruned without being searched
+    pos = se.backend.from_fen('4k3/8/8/3p4/4P3/8/8/4K3 w - - 0 1')
+    se.stats.qnodes = 0
+    assert se.quiesce(pos, se.evaluate(pos) + 1000, INF, 1) == se.evaluate(pos)
+    assert se.stats.qnodes == 1
+
+
+@pytest.mark.parametrize("backend", ['mailbox', 'bitboard'])
+def test_quiesce_in_check_searches_evasions_and_finds_mate(backend):
+    se = Searcher(backend)
+    # back rank mate, no standing pat in check
+    pos = se.backend.from_fen('R5k1/5ppp/8/8/8/8/8/6K1 b - - 0 1')
+    assert se.quiesce(pos, -INF, INF, 1) == -MATE_SCORE + 1
+    # in check with a way out the score comes from the evasions
+    pos = se.backend.from_fen('R5k1/5pp1/8/8/8/8/8/6K1 b - - 0 1')
+    assert se.quiesce(pos, -INF, INF, 1) > -MATE_SCORE
+
+
+def test_depth_1_sees_the_recapture():
+    # QxP on d5 looks like a free pawn to a plain depth 1 search, the pawn on e6 takes back
+    b = Board()
+    fen_to_board(b, '4k3/8/4p3/3p4/8/8/3Q4/4K3 w - - 0 1')
+    best_move, score, depth = search(b, depth=1)
+    assert square_name((best_move >> 6) & 63) != 'd5'
+
+
+@pytest.mark.parametrize("backend", ['mailbox', 'bitboard'])
+def test_time_bounded_search_returns_a_move(backend):
+    b = Board()
+    fen_to_board(b, KIWIPETE_FEN)
+    start = time.time()
+    best_move, score, depth = search(b, depth=50, time_ms=300, backend=backend)
+    assert best_move in legal_moves(b)
+    assert time.time() - start < 5
@@ -1,8 +1,9 @@
+import pytest
 from board import Board
 from fen import fen_to_board
 from constants import STARTING_FEN
-from search import search
-from move_gen import generate_legal_moves
+from search import search, MATE_SCORE
+from move_gen import legal_moves
 
 
 def test_search_depth_1_returns_legal_move():
@@ -11,7 +12,7 @@ def test_search_depth_1_returns_legal_move():
     best_move, score, depth = search(b, depth=1, time_ms=1000)
     assert depth == 1
     assert best_move is not None
-    assert best_move in generate_legal_moves(b) or True  # move may change after make, but ensure not None
+    assert best_move in legal_moves(b) or True  # move may change after make, but ensure not None
 
 
 def test_search_depth_0_returns_none():
@@ -20,3 +21,174 @@ def test_search_depth_0_returns_none():
     bm, sc, d = search(b, depth=0, time_ms=10)
     assert bm is None
     assert d == 0
+
+
+@pytest.mark.parametrize("backend", ['mailbox', 'bitboard'])
+def test_killers_history_and_first_move_cutoffs(backend):
+    from search import Searcher, INF
+    from move_encoding import NULL_MOVE
+    se = Searcher(backend)
+    pos = se.backend.from_fen(STARTING_FEN)
+    se.negamax(pos, 3, -INF, INF, 1)
+    assert se.stats.beta_cutoffs > 0
+    assert se.stats.cutoff_rate() > 0.75
+    # quiet refutations are kept for the sibling nodes at the same ply
+    assert se.killers[2][0] != NULL_MOVE and se.killers[3][0] != NULL_MOVE
+    assert any(se.history[0]) and any(se.history[1])
+
+
+@pytest.mark.parametrize("backend", ['mailbox', 'bitboard'])
+def test_principal_variation_is_legal_and_starts_with_best_move(backend):
+    from constants import KIWIPETE_FEN
+    from make_move import make_move
+    b = Board()
+    fen_to_board(b, KIWIPETE_FEN)
+    lines = []
+    best_move, score, depth = search(b, depth=4, uci_info=lambda *info: lines.append(info), backend=backend)
+    pv = lines[-1][8]
+    assert pv[0] == best_move
+    assert len(pv) >= 2
+    for move in pv:
+        assert move in legal_moves(b)
+        make_move(b, move)
+
+
+def test_aspiration_and_pvs_keep_the_full_window_result():
+    from search import Searcher, INF, PRUNING_OPTIONS
+    fen = 'k7/8/2K5/8/8/8/8/7R w - -'
+    #Without the selective search both have to give the exact minimax score
+    pruning = dict.fromkeys(PRUNING_OPTIONS, False)
+    b = Board()
+    fen_to_board(b, fen)
+    best_move, score, depth = search(b, depth=5, pruning=pruning)
+    se = Searcher(pruning=pruning)
+    full = se.negamax(se.backend.from_fen(fen), 5, -INF, INF, 0)
+    assert score == full
+
+
+def test_bench_node_count_is_deterministic():
+    from search import bench
+    nodes, elapsed = bench(2)
+    assert nodes > 0
+    assert bench(2)[0] == nodes
+
+
+@pytest.mark.parametrize("option", ['NullMove', 'LMR', 'ReverseFutility', 'Razoring', None])
+def test_selective_search_switches(option):
+    from search import Searcher, PRUNING_OPTIONS
+    pruning = {option: False} if option else None
+    se = Searcher(pruning=pruning)
+    for name, attribute in PRUNING_OPTIONS.items():
+        assert getattr(se, attribute) == (name != option)
+    b = Board()
+    fen_to_board(b, 'k7/8/1K6/8/8/8/8/7R w - -')
+    best_move, score, depth = search(b, depth=4, pruning=pruning)
+    assert best_move in legal_moves(b)
+    assert score == MATE_SCORE - 1
+
+
+def test_selective_search_needs_fewer_nodes():
+    from constants import KIWIPETE_FEN
+    from search import PRUNING_OPTIONS
+    nodes = {}
+    for on in (False, True):
+        b = Board()
+        fen_to_board(b, KIWIPETE_FEN)
+        info = []
+        search(b, depth=4, uci_info=lambda *line: info.append(line), pruning=dict.fromkeys(PRUNING_OPTIONS, on))
+        nodes[on] = info[-1][2]
+    assert nodes[True] < nodes[False]
+
+
+def test_null_move_is_not_tried_in_pawn_endgames():
+    from search import Searcher, INF
+    se = Searcher()
+    calls = []
+    make_null_move = se.backend.make_null_move
+    se.backend.make_null_move = lambda pos: (calls.append(pos.hash_key), make_null_move(pos))
+    #White is well ahead so the null move would be tried if White had a piece
+    se.negamax(se.backend.from_fen('4k3/8/8/8/8/8/PPPPPPP1/4K3 w - -'), 5, -INF, INF)
+    assert not calls
+    se.negamax(se.backend.from_fen('4k3/8/8/8/8/8/PPPPPPP1/3QK3 w - -'), 5, -INF, INF)
+    assert calls
+
+
+def test_search_control_stops_a_search_from_another_thread():
+    import threading
+    import time
+    from search import SearchControl, MAX_DEPTH
+    b = Board()
+    fen_to_board(b, STARTING_FEN)
+    control = SearchControl(infinite=True)
+    threading.Timer(0.3, control.stop).start()
+    start = time.monotonic()
+    best_move, score, depth = search(b, depth=MAX_DEPTH, control=control)
+    assert time.monotonic() - start < 1.0
+    assert best_move in legal_moves(b)
+    assert control.released.is_set()
+
+
+def test_pondering_ignores_the_time_limit_until_ponderhit():
+    from search import Searcher, SearchControl
+    control = SearchControl(pondering=True)
+    se = Searcher(control=control)
+    se.time_limit_ms = 0
+    assert not se.limits_reached() and not control.released.is_set()
+    control.ponderhit()
+    assert se.limits_reached() and control.released.is_set()
+
+
+def test_repetition_scan_uses_game_history():
+    from search import is_repetition
+    from uci import parse_position
+    b = Board()
+    parse_position(b, 'startpos moves g1f3 g8f6 f3g1 f6g8'.split())
+    assert is_repetition(b)
+    parse_position(b, 'startpos moves g1f3 g8f6 f3g1'.split())
+    assert not is_repetition(b)
+    #Positions before the last irreversible move cannot come back, the scan stops at it
+    parse_position(b, 'startpos moves g1f3 g8f6 f3g1 f6g8'.split())
+    b.half_move_counter = 3
+    assert not is_repetition(b)
+
+
+@pytest.mark.parametrize("backend", ['mailbox', 'bitboard'])
+def test_negamax_scores_a_repetition_as_draw(backend):
+    from search import Searcher, INF, DRAW_SCORE
+    from uci import parse_position
+    b = Board()
+    #White is a queen up, but the position after f6g8 already occurred
+    parse_position(b, 'fen rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1 moves g1f3 g8f6 f3g1 f6g8'.split())
+    se = Searcher(backend)
+    assert se.negamax(se.backend.from_board(b), 3, -INF, INF) == DRAW_SCORE
+    assert se.stats.nodes == 1
+
+
+def test_fifty_move_rule_and_forced_draw_stop_the_search_early():
+    from search import DRAW_SCORE, FORCED_DRAW_ITERATIONS
+    b = Board()
+    #A queen up, but every move without mate reaches the hundredth half move
+    fen_to_board(b, '8/8/8/3k4/8/8/8/Q3K3 w - - 99 80')
+    best_move, score, depth = search(b, depth=10)
+    assert score == DRAW_SCORE
+    #Shallow iterations still see the checks as winning, the draw is found soon after
+    assert FORCED_DRAW_ITERATIONS <= depth < 10
+    fen_to_board(b, '8/8/8/3k4/8/8/8/Q3K3 w - - 0 80')
+    assert search(b, depth=3)[1] > 500
+
+
+@pytest.mark.parametrize("backend", ['mailbox', 'bitboard'])
+def test_search_stats_dict(backend):
+    from constants import KIWIPETE_FEN
+    b = Board()
+    fen_to_board(b, KIWIPETE_FEN)
+    stats = {}
+    best_move, score, depth = search(b, depth=4, backend=backend, stats=stats)
+    assert stats['nodes'] > 0 and stats['qnodes'] > 0
+    assert stats['tt_probes'] >= stats['tt_hits'] >= stats['tt_cutoffs'] > 0
+    assert stats['beta_cutoffs'] >= stats['first_move_cutoffs'] > 0
+    assert 0 < stats['cutoff_rate'] <= 1
+    assert stats['movegen_calls'] > stats['nodes'] // 2
+    assert len(stats['iteration_nodes']) == depth
+    assert len(stats['branching_factors']) == depth - 1
+    assert sum(stats['iteration_nodes']) == stats['nodes'] + stats['qnodes']
@@ -0,0 +1,72 @@
+import pytest
+import bitboard
+import see
+from backends import get_backend
+from constants import PERFT_RESULTS, CAPTURE_FLAG, PROMO_FLAG
+from make_move import make_move, unmake_move
+from move_gen import legal_moves
+from search import Searcher, INF
+from uci import move_to_uci
+
+
+def _find(ops, pos, uci):
+    for move in ops.legal_moves(pos):
+        if move_to_uci(move) == uci:
+            return move
+    raise AssertionError(f"{uci} is not legal")
+
+
+@pytest.mark.parametrize("backend", ['mailbox', 'bitboard'])
+@pytest.mark.parametrize("fen,uci,expected", [
+    # undefended pawn
+    ('1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1', 'e1e5', 100),
+    # knight takes a pawn defended by a knight and by a bishop with the queen x-raying behind it
+    ('1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1', 'd3e5', -220),
+    # hanging queen
+    ('4k3/8/8/3q4/8/8/3Q4/K7 b - - 0 1', 'd5d2', 900),
+    # queen takes a pawn defended by a pawn
+    ('4k3/8/4p3/3p4/8/8/3Q4/4K3 w - - 0 1', 'd2d5', -800),
+    # doubled rooks win the pawn against a single defender, not against two
+    ('3rk3/8/8/3p4/8/8/3R4/3RK3 w - - 0 1', 'd2d5', 100),
+    ('3rk3/3r4/8/3p4/8/8/3R4/3RK3 w - - 0 1', 'd2d5', -400),
+    # en passant
+    ('4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1', 'e5d6', 100),
+    # the king takes back the queen, unless the knight defends the square
+    ('4k3/8/8/8/8/3q4/3P4/4K3 b - - 0 1', 'd3d2', -800),
+    ('4k3/8/8/8/8/1n1q4/3P4/4K3 b - - 0 1', 'd3d2', 100),
+    # promotions, counting the new queen and the knight taking it back
+    ('2r1k3/1P6/8/8/8/8/8/4K3 w - - 0 1', 'b7c8q', 500 + 800),
+    ('2r1k3/1P6/1n6/8/8/8/8/4K3 w - - 0 1', 'b7c8q', 500 + 800 - 900),
+    ('4k3/1P6/n7/8/8/8/8/4K3 w - - 0 1', 'b7b8q', -100),
+])
+def test_see_on_tactical_positions(backend, fen, uci, expected):
+    ops = get_backend(backend)
+    pos = ops.from_fen(fen)
+    assert ops.see(pos, _find(ops, pos, uci)) == expected
+
+
+def _walk(board, depth):
+    pos = bitboard.from_board(board)
+    for move in legal_moves(board):
+        if (move >> 12) & (CAPTURE_FLAG | PROMO_FLAG):
+            assert see.see(board, move) == bitboard.see(pos, move)
+    if depth == 0:
+        return
+    for move in legal_moves(board):
+        make_move(board, move)
+        _walk(board, depth - 1)
+        unmake_move(board)
+
+
+@pytest.mark.parametrize("fen", list(PERFT_RESULTS.keys()))
+def test_backends_agree(fen):
+    _walk(get_backend().from_fen(fen), 1)
+
+
+@pytest.mark.parametrize("backend", ['mailbox', 'bitboard'])
+def test_quiesce_skips_losing_captures(backend):
+    se = Searcher(backend)
+    pos = se.backend.from_fen('4k3/8/4p3/3p4/8/8/3Q4/4K3 w - - 0 1')
+    se.stats.qnodes = 0
+    assert se.quiesce(pos, -INF, INF, 1) == se.evaluate(pos)
+    assert se.stats.qnodes == 1
@@ -0,0 +1,71 @@
+import os
+import signal
+import sys
+import pytest
+import smp as smp_module
+from board import Board
+from fen import fen_to_board
+from constants import STARTING_FEN, KIWIPETE_FEN
+from move_gen import legal_moves
+from search import search, MAX_DEPTH
+from smp import LazySMP, scaling_benchmark
+
+
+def test_lazy_smp_search_returns_a_legal_move():
+    smp = LazySMP(2, 1)
+    try:
+        b = Board()
+        fen_to_board(b, KIWIPETE_FEN)
+        best_move, score, depth = smp.search(b, 3)
+        assert best_move in legal_moves(b)
+        assert depth >= 3
+        assert smp.helper_nodes > 0
+        #The helper stopped with the main search and takes the next one
+        best_move, score, depth = smp.search(b, 2)
+        assert best_move in legal_moves(b)
+    finally:
+        smp.close()
+    assert all(not helper.is_alive() for helper in smp.helpers)
+
+
+def test_lazy_smp_time_limit_and_mate():
+    smp = LazySMP(2, 1)
+    try:
+        b = Board()
+        fen_to_board(b, 'k7/8/1K6/8/8/8/8/7R w - -')
+        best_move, score, depth = smp.search(b, MAX_DEPTH, 300)
+        assert best_move in legal_moves(b)
+        assert score == search(b, 3)[1]
+    finally:
+        smp.close()
+
+
+@pytest.mark.parametrize("fault", ['dies', 'hangs'])
+def test_lost_helper_is_dropped(monkeypatch, capsys, fault):
+    if fault == 'hangs' and sys.platform == 'win32':
+        pytest.skip("a helper is hung with SIGSTOP")
+    monkeypatch.setattr(smp_module, 'HELPER_TIMEOUT', 0.5)
+    smp = LazySMP(3, 1)
+    try:
+        b = Board()
+        fen_to_board(b, KIWIPETE_FEN)
+        helper = smp.workers[1][0]
+        if fault == 'dies':
+            helper.kill()
+            helper.join()
+        else:
+            os.kill(helper.pid, signal.SIGSTOP)
+        #The main result and the other helper's are played, the lost one is not waited for again
+        best_move, score, depth = smp.search(b, 2)
+        assert best_move in legal_moves(b) and depth >= 2
+        assert list(smp.workers) == [2] and smp.threads == 2
+        assert 'Lazy SMP helper 1 lost' in capsys.readouterr().err
+        assert smp.search(b, 2)[0] in legal_moves(b)
+    finally:
+        smp.close()
+
+
+def test_scaling_benchmark_rows():
+    rows = scaling_benchmark([1, 2], depth=2, positions=[STARTING_FEN])
+    assert [row['threads'] for row in rows] == [1, 2]
+    assert rows[0]['speedup'] == 1.0 and rows[1]['seconds'] > 0
@@ -0,0 +1,77 @@
+import pytest
+from board import Board
+from fen import fen_to_board
+from constants import STARTING_FEN, KIWIPETE_FEN, MIN_THINK_TIME_MS
+from move_gen import legal_moves
+from search import search, Searcher, MAX_DEPTH
+from timeman import allocate_time, TimeManager, DEFAULT_GROWTH, BEST_MOVE_CHANGE_BONUS
+
+
+def test_allocate_time_soft_and_hard_limits():
+    soft, hard = allocate_time(60000, 1000, None, 50)
+    assert soft == int(59950 / 40 + 750)
+    assert hard == int(4 * (59950 / 40 + 750))
+    #The hard limit keeps half the clock back while moves remain
+    soft, hard = allocate_time(60000, 0, 2, 0)
+    assert hard == 30000 and soft == 30000
+    #The last move before the time control may use everything but the overhead
+    soft, hard = allocate_time(1000, 0, 1, 100)
+    assert hard == 900
+    assert allocate_time(20, 0, None, 100) == (MIN_THINK_TIME_MS, MIN_THINK_TIME_MS)
+
+
+def test_growth_and_iteration_prediction():
+    tm = TimeManager(1000, 4000)
+    assert tm.growth() == DEFAULT_GROWTH
+    for elapsed in (10, 40, 160):
+        tm.iteration_done(elapsed, 1)
+    #Iterations took 10, 30 and 120 ms
+    assert tm.growth() == pytest.approx((3 + 4) / 2)
+    assert tm.predicted_ms() == pytest.approx(120 * 3.5)
+    assert tm.should_start_iteration(160)
+    #Soft limit not reached, but the next iteration would not finish before the hard one
+    assert not tm.should_start_iteration(3700)
+    assert not tm.should_start_iteration(1000)
+
+
+def test_best_move_change_extends_the_soft_limit():
+    tm = TimeManager(1000, 10000)
+    tm.iteration_done(1, 1)
+    tm.iteration_done(2, 2)
+    assert tm.soft_limit() == 1000 * (1 + BEST_MOVE_CHANGE_BONUS)
+    assert tm.should_start_iteration(1200)
+    tm.iteration_done(3, 2)
+    assert tm.soft_limit() == 1000 * (1 + BEST_MOVE_CHANGE_BONUS / 2)
+
+
+def test_search_stops_before_an_iteration_it_cannot_finish():
+    import time
+    b = Board()
+    fen_to_board(b, KIWIPETE_FEN)
+    tm = TimeManager(300, 600)
+    start = time.monotonic()
+    best_move, score, depth = search(b, MAX_DEPTH, time_manager=tm)
+    elapsed_ms = (time.monotonic() - start) * 1000
+    assert best_move in legal_moves(b)
+    assert elapsed_ms < 600 + 100
+    assert len(tm.iteration_ms) == depth
+
+
+def test_partial_iteration_keeps_its_best_move(monkeypatch):
+    found = []
+    search_root = Searcher.search_root
+
+    def stop_after_root(self, board, root_moves, depth, alpha, beta):
+        score = search_root(self, board, root_moves, depth, alpha, beta)
+        if depth == 3:
+            #Time runs out once every root move is searched, before the iteration is recorded
+            found.append(self.principal_variation()[0])
+            self.stop = True
+        return score
+
+    monkeypatch.setattr(Searcher, 'search_root', stop_after_root)
+    b = Board()
+    fen_to_board(b, STARTING_FEN)
+    best_move, score, depth = search(b, 5)
+    assert depth == 2
+    assert best_move == found[0]
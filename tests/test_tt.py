@@ -0,0 +1,125 @@
+import pytest
+from board import Board
+from fen import fen_to_board
+from constants import KIWIPETE_FEN
+from move_encoding import NULL_MOVE
+from search import search, MATE_SCORE, MATE_BOUND
+from tt import TranspositionTable, SharedTranspositionTable, BOUND_EXACT, BOUND_LOWER, BOUND_UPPER, score_to_tt, score_from_tt
+from uci import default_options, parse_setoption, parse_go
+
+
+def test_store_and_probe():
+    tt = TranspositionTable(1)
+    assert tt.probe(12345) is None
+    tt.store(12345, 3, -42, BOUND_UPPER, 777)
+    assert tt.probe(12345) == (777, 3, -42, BOUND_UPPER)
+    # a later store without a best move keeps the one already known
+    tt.store(12345, 4, 10, BOUND_UPPER, NULL_MOVE)
+    assert tt.probe(12345) == (777, 4, 10, BOUND_UPPER)
+    tt.clear()
+    assert tt.probe(12345) is None
+
+
+def test_depth_preferred_and_always_replace_entries():
+    tt = TranspositionTable(0) # a single bucket, every key collides
+    tt.store(1, 8, 100, BOUND_EXACT, 11)
+    tt.store(2, 2, 200, BOUND_LOWER, 22)
+    tt.store(3, 1, 300, BOUND_LOWER, 33)
+    # the deep entry survives, the shallow ones share the always-replace entry
+    assert tt.probe(1) == (11, 8, 100, BOUND_EXACT)
+    assert tt.probe(2) is None
+    assert tt.probe(3) == (33, 1, 300, BOUND_LOWER)
+    # entries of an earlier search give way to anything
+    tt.new_search()
+    tt.store(4, 1, 400, BOUND_EXACT, 44)
+    assert tt.probe(1) is None
+    assert tt.probe(4) == (44, 1, 400, BOUND_EXACT)
+
+
+def test_mate_scores_are_stored_relative_to_the_node():
+    # mate 5 plies from the root seen at ply 3 is mate in 2 from that node
+    stored = score_to_tt(MATE_SCORE - 5, 3, MATE_BOUND)
+    assert stored == MATE_SCORE - 2
+    # the same node reached at ply 1 of another search is mate 3 plies away
+    assert score_from_tt(stored, 1, MATE_BOUND) == MATE_SCORE - 3
+    assert score_from_tt(score_to_tt(-MATE_SCORE + 6, 4, MATE_BOUND), 2, MATE_BOUND) == -MATE_SCORE + 4
+    assert score_to_tt(150, 7, MATE_BOUND) == 150
+
+
+def test_hashfull_counts_current_search_entries():
+    tt = TranspositionTable(1)
+    assert tt.hashfull() == 0
+    for key in range(500):
+        tt.store(key, 1, 0, BOUND_EXACT, NULL_MOVE)
+    assert tt.hashfull() == 500
+    tt.new_search()
+    assert tt.hashfull() == 0
+
+
+def test_search_finds_shortest_mate_with_table():
+    b = Board()
+    fen_to_board(b, 'k7/8/1K6/8/8/8/8/7R w - - 0 1')
+    assert search(b, depth=4)[1] == MATE_SCORE - 1
+    # Kb6 Kb8 Rh8#
+    fen_to_board(b, 'k7/8/2K5/8/8/8/8/7R w - - 0 1')
+    assert search(b, depth=4)[1] == MATE_SCORE - 3
+
+
+@pytest.mark.parametrize("backend", ['mailbox', 'bitboard'])
+def test_table_carries_over_between_searches(backend):
+    b = Board()
+    fen_to_board(b, KIWIPETE_FEN)
+    tt = TranspositionTable(1)
+    infos = []
+    first = search(b, depth=3, uci_info=lambda *info: infos.append(info), backend=backend, tt=tt)
+    first_nodes = infos[-1][2]
+    assert infos[-1][6] > 0 # hashfull
+    second = search(b, depth=3, uci_info=lambda *info: infos.append(info), backend=backend, tt=tt)
+    assert second[:2] == first[:2]
+    assert infos[-1][2] < first_nodes
+
+
+def test_uci_hash_option_and_hashfull(capsys):
+    options = default_options()
+    parse_setoption(options, ['name', 'Hash', 'value', '4'])
+    assert options['Hash'] == 4
+    parse_setoption(options, ['name', 'Hash', 'value', '0'])
+    assert options['Hash'] == 1
+    b = Board()
+    fen_to_board(b, KIWIPETE_FEN)
+    assert parse_go(b, ['depth', '2'], options, TranspositionTable(options['Hash']))
+    assert 'hashfull' in capsys.readouterr().out
+
+
+def test_shared_table_store_probe_and_attach():
+    tt = SharedTranspositionTable(1)
+    try:
+        tt.new_search()
+        tt.store(0x1234567890ABCDEF, 7, -MATE_SCORE + 5, BOUND_UPPER, 0x1FFF)
+        assert tt.probe(0x1234567890ABCDEF) == (0x1FFF, 7, -MATE_SCORE + 5, BOUND_UPPER)
+        assert tt.probe(0x1234567890ABCDEE) is None
+        #Another process attaches by name and sees the same entries and age
+        other = SharedTranspositionTable(name=tt.name)
+        assert other.probe(0x1234567890ABCDEF) == (0x1FFF, 7, -MATE_SCORE + 5, BOUND_UPPER)
+        assert other.age == tt.age
+        other.store(42, 3, 10, BOUND_EXACT, NULL_MOVE)
+        other.close()
+        assert tt.probe(42) == (NULL_MOVE, 3, 10, BOUND_EXACT)
+        assert tt.hashfull() > 0
+        tt.clear()
+        assert tt.probe(42) is None
+    finally:
+        tt.close()
+
+
+def test_shared_table_rejects_torn_entries():
+    tt = SharedTranspositionTable(1)
+    try:
+        key = 99
+        tt.store(key, 4, 25, BOUND_EXACT, 0x123)
+        i = next(i for i in range(2, len(tt.words), 2) if tt.words[i + 1])
+        #A store of another position interrupted after the data word leaves key ^ data inconsistent
+        tt.words[i + 1] ^= 1 << 40
+        assert tt.probe(key) is None
+    finally:
+        tt.close()
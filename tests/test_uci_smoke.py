@@ -16,3 +16,162 @@ def test_uci_go_movetime_smoke():
     fen_to_board(b, STARTING_FEN)
     best = parse_go(b, ['movetime', '200'])
     assert best is not None
+
+
+def test_uci_go_perft_hashed(capsys):
+    from uci import default_options, parse_setoption
+    b = Board()
+    fen_to_board(b, STARTING_FEN)
+    options = default_options()
+    parse_setoption(options, ['name', 'PerftHash', 'value', '1'])
+    assert options['PerftHash'] == 1
+    parse_go(b, ['perft', '3'], options)
+    out = capsys.readouterr().out
+    assert 'Nodes searched: 8902' in out
+    assert 'Hash hits:' in out
+
+
+def test_uci_go_perft_jobs_matches_serial(capsys):
+    from uci import default_options
+    b = Board()
+    fen_to_board(b, STARTING_FEN)
+    options = default_options()
+    parse_go(b, ['perft', '3'], options)
+    serial = capsys.readouterr().out.split('\nNodes searched')[0]
+    parse_go(b, ['perft', '3', 'jobs', '2'], options)
+    parallel = capsys.readouterr().out
+    assert parallel.split('\nNodes searched')[0] == serial
+    assert 'Nodes searched: 8902' in parallel
+
+
+def test_uci_info_prints_pv(capsys):
+    b = Board()
+    fen_to_board(b, STARTING_FEN)
+    best = parse_go(b, ['depth', '3'])
+    lines = [line for line in capsys.readouterr().out.splitlines() if line.startswith('info depth 3')]
+    assert lines and lines[0].split(' pv ')[1].split()[0] == best
+
+
+def test_setoption_check_options():
+    from uci import default_options, parse_setoption
+    options = default_options()
+    assert options['NullMove'] is True
+    parse_setoption(options, ['name', 'nullmove', 'value', 'false'])
+    assert options['NullMove'] is False
+    parse_setoption(options, ['name', 'NullMove', 'value', 'maybe'])
+    assert options['NullMove'] is False
+    parse_setoption(options, ['name', 'LMR', 'value', 'false'])
+    b = Board()
+    fen_to_board(b, STARTING_FEN)
+    assert parse_go(b, ['depth', '3'], options) is not None
+
+
+class EngineProcess:
+    """uci.py in a child process, lines read on a thread so reads can time out."""
+
+    def __init__(self):
+        import os
+        import queue
+        import subprocess
+        import sys
+        import threading
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.process = subprocess.Popen([sys.executable, os.path.join(root, 'uci.py')], cwd=root, text=True,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.lines = queue.Queue()
+        threading.Thread(target=lambda: [self.lines.put(line.strip()) for line in self.process.stdout], daemon=True).start()
+        #isready would start generating the bitbases in the user's cache, these tests do not need them
+        self.send('setoption name Bitbases value false')
+
+    def send(self, line):
+        self.process.stdin.write(line + '\n')
+        self.process.stdin.flush()
+
+    def read_until(self, prefix, timeout=10.0):
+        """Lines up to and including the first one starting with prefix."""
+        import time
+        deadline = time.monotonic() + timeout
+        lines = []
+        while True:
+            line = self.lines.get(timeout=max(0.0, deadline - time.monotonic()))
+            lines.append(line)
+            if line.startswith(prefix):
+                return lines
+
+
+def test_uci_stop_isready_and_ponderhit_during_search():
+    import time
+    engine = EngineProcess()
+    try:
+        engine.send('position startpos')
+        engine.send('go infinite')
+        engine.read_until('info depth 2')
+        #The input loop answers while the search runs, and go infinite holds its bestmove
+        engine.send('isready')
+        assert not any(line.startswith('bestmove') for line in engine.read_until('readyok'))
+        start = time.monotonic()
+        engine.send('stop')
+        bestmove = engine.read_until('bestmove')[-1].split()
+        assert time.monotonic() - start < 1.0
+        assert len(bestmove) == 4 and bestmove[2] == 'ponder'
+
+        #Pondering ignores the clock until ponderhit, then the movetime counts from there
+        engine.send('position startpos moves e2e4 e7e5')
+        engine.send('go ponder movetime 200')
+        time.sleep(0.5)
+        engine.send('isready')
+        assert not any(line.startswith('bestmove') for line in engine.read_until('readyok'))
+        engine.send('ponderhit')
+        assert engine.read_until('bestmove', timeout=2.0)[-1].startswith('bestmove')
+
+        engine.send('quit')
+        assert engine.process.wait(timeout=5) == 0
+    finally:
+        engine.process.kill()
+
+
+def test_uci_threads_option_searches_with_helpers():
+    engine = EngineProcess()
+    try:
+        engine.send('setoption name Threads value 2')
+        engine.send('position startpos moves e2e4')
+        engine.send('go depth 3')
+        assert engine.read_until('bestmove')[-1].startswith('bestmove')
+        engine.send('setoption name Threads value 1')
+        engine.send('go depth 2')
+        assert engine.read_until('bestmove')[-1].startswith('bestmove')
+        engine.send('quit')
+        assert engine.process.wait(timeout=5) == 0
+    finally:
+        engine.process.kill()
+
+
+def test_uci_debug_on_prints_search_stats():
+    engine = EngineProcess()
+    try:
+        engine.send('go depth 2')
+        assert not any('stats' in line for line in engine.read_until('bestmove'))
+        engine.send('debug on')
+        engine.send('go depth 2')
+        stats = [line for line in engine.read_until('bestmove') if line.startswith('info string stats')]
+        assert len(stats) == 2 and 'tt probes' in stats[-1] and 'ebf' in stats[-1]
+        engine.send('quit')
+        assert engine.process.wait(timeout=5) == 0
+    finally:
+        engine.process.kill()
+
+
+def test_uci_handshake_board_print_and_upper_case_promotion():
+    engine = EngineProcess()
+    try:
+        engine.send('uci')
+        lines = engine.read_until('uciok')
+        assert lines[0].startswith('id name') and any(line.startswith('option name Threads') for line in lines)
+        engine.send('position fen k7/3P4/8/8/8/8/8/K7 w - - 0 1 moves d7d8Q')
+        engine.send('d')
+        lines = engine.read_until('FEN')
+        assert ' | Q |' in lines[2] and lines[-1] == 'FEN: k2Q4/8/8/8/8/8/8/K7 b - - 0 1'
+        engine.send('quit')
+        assert engine.process.wait(timeout=5) == 0
+    finally:
+        engine.process.kill()
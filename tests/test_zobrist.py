@@ -0,0 +1,48 @@
+import pytest
+from board import Board
+from fen import fen_to_board, board_to_fen
+from make_move import make_move, unmake_move
+from perft import perft
+from uci import uci_to_move
+from zobrist import compute_hash
+from constants import STARTING_FEN, KIWIPETE_FEN, POS3_FEN, POS4_FEN, POS5_FEN
+
+
+@pytest.mark.parametrize("fen", [KIWIPETE_FEN, POS3_FEN, POS4_FEN, POS5_FEN])
+def test_incremental_key_matches_recompute(fen):
+    b = Board()
+    fen_to_board(b, fen)
+    # perft raises if the incremental key ever drifts from a full recompute
+    perft(b, 2, check_hash=True)
+    assert b.hash_key == compute_hash(b)
+
+
+def test_transpositions_share_key():
+    a = Board()
+    fen_to_board(a, STARTING_FEN)
+    for uci in ['g1f3', 'g8f6', 'b1c3']:
+        make_move(a, uci_to_move(a, uci))
+    b = Board()
+    fen_to_board(b, STARTING_FEN)
+    for uci in ['b1c3', 'g8f6', 'g1f3']:
+        make_move(b, uci_to_move(b, uci))
+    assert a.hash_key == b.hash_key
+
+
+def test_side_castling_and_en_passant_change_key():
+    b = Board()
+    fen_to_board(b, STARTING_FEN)
+    start = b.hash_key
+    make_move(b, uci_to_move(b, 'e2e4'))
+    assert board_to_fen(b).split()[3] == 'e3'
+    assert b.hash_key != start
+    unmake_move(b)
+    assert b.hash_key == start
+
+    c = Board()
+    fen_to_board(c, 'r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1')
+    d = Board()
+    fen_to_board(d, 'r3k2r/8/8/8/8/8/8/R3K2R w Kkq - 0 1')
+    e = Board()
+    fen_to_board(e, 'r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1')
+    assert len({c.hash_key, d.hash_key, e.hash_key}) == 3
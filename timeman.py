@@ -0,0 +1,76 @@
+"""Time management for clock games.
+
+allocate_time splits the clock into a soft limit, the time a move should
+normally take, and a hard limit the search is stopped at whatever it is
+doing. Between iterations TimeManager decides whether another one is worth
+starting: not once the soft limit is used up, and not when the time the last
+iterations grew by says it would run past the hard limit, since a partial
+iteration rarely changes the move. The soft limit is stretched for a while
+each time the best move changes, an unsettled search is worth more time.
+"""
+from constants import DEFAULT_MOVES_TO_GO, MIN_THINK_TIME_MS, INCREMENT_SHARE, HARD_TIME_FACTOR, MAX_TIME_SHARE
+
+DEFAULT_GROWTH = 3.0       #Iteration time ratio assumed before two iterations were timed
+MAX_GROWTH = 10.0
+MIN_TIMED_ITERATION_MS = 1 #Faster iterations are too noisy to estimate the growth from
+BEST_MOVE_CHANGE_BONUS = 0.5 #Soft limit stretch per best move change, halved every iteration
+
+
+def allocate_time(time_left: int, increment: int = 0, moves_to_go: int = None, overhead: int = 0) -> tuple:
+    """(soft, hard) limits in ms for a move with time_left on the clock.
+
+    overhead is lost per move between the GUI and the engine, it is taken off
+    the clock before anything is planned.
+    """
+    moves_left = moves_to_go if moves_to_go else DEFAULT_MOVES_TO_GO
+    available = max(0, time_left - overhead)
+    soft = available / moves_left + increment * INCREMENT_SHARE
+    #The last move before a time control may use the whole clock, otherwise keep some back
+    share = 1.0 if moves_left == 1 else MAX_TIME_SHARE
+    hard = min(soft * HARD_TIME_FACTOR, available * share)
+    soft = min(soft, hard)
+    return max(MIN_THINK_TIME_MS, int(soft)), max(MIN_THINK_TIME_MS, int(hard))
+
+
+class TimeManager:
+    """Soft and hard limits of one search plus what the finished iterations took."""
+
+    def __init__(self, soft_ms: int, hard_ms: int):
+        self.soft_ms = soft_ms
+        self.hard_ms = hard_ms
+        self.iteration_ms = [] #Time each finished iteration took
+        self.last_finish_ms = 0
+        self.best_move = None
+        self.instability = 0.0 #Grows with best move changes, stretches the soft limit
+
+    def growth(self) -> float:
+        """Ratio of an iteration's time to the one before, from the last iterations timed."""
+        times = self.iteration_ms[-3:]
+        ratios = [later / earlier for earlier, later in zip(times, times[1:]) if earlier >= MIN_TIMED_ITERATION_MS]
+        if not ratios:
+            return DEFAULT_GROWTH
+        return min(MAX_GROWTH, max(1.0, sum(ratios) / len(ratios)))
+
+    def soft_limit(self) -> float:
+        return self.soft_ms * (1 + self.instability)
+
+    def predicted_ms(self) -> float:
+        """Expected time of the next iteration."""
+        if not self.iteration_ms:
+            return 0.0
+        return self.iteration_ms[-1] * self.growth()
+
+    def should_start_iteration(self, elapsed_ms: float) -> bool:
+        """Is there time for another iteration, elapsed_ms counted from the start of the move."""
+        if elapsed_ms >= self.soft_limit():
+            return False
+        return elapsed_ms + self.predicted_ms() <= self.hard_ms
+
+    def iteration_done(self, elapsed_ms: float, best_move: int):
+        """Record a finished iteration and its best move."""
+        self.iteration_ms.append(elapsed_ms - self.last_finish_ms)
+        self.last_finish_ms = elapsed_ms
+        self.instability /= 2
+        if self.best_move is not None and best_move != self.best_move:
+            self.instability += BEST_MOVE_CHANGE_BONUS
+        self.best_move = best_move
@@ -0,0 +1,214 @@
+"""Transposition table for the search.
+
+Each entry holds the position key, the depth it was searched to, the score,
+what kind of bound the score is and the best move found. Like the perft
+table the size is fixed up front and entries live in flat arrays, two per
+bucket: the first is replaced only by a search at least as deep or by any
+store once the entry is left over from an earlier search, the second always
+takes the latest store.
+
+Mate scores count plies from the root, but a stored position can be reached
+again at another ply. They are stored relative to the node (score_to_tt) and
+turned back relative to the root of the probing search (score_from_tt).
+
+SharedTranspositionTable is the same table in shared memory for the Lazy SMP
+processes (see smp.py). It takes no locks, each entry is two 64-bit words,
+the packed data and the key xor the data, so an entry torn by two processes
+writing at once fails the key check and reads as missing.
+"""
+from array import array
+from multiprocessing import shared_memory
+from move_encoding import NULL_MOVE
+
+BOUND_EXACT = 1
+BOUND_LOWER = 2 #Score is at least this (failed high)
+BOUND_UPPER = 3 #Score is at most this (failed low)
+
+ENTRY_BYTES = 17 #8 byte key, 4 byte score, 2 byte move, depth, bound, age
+DEFAULT_HASH_MB = 16
+MAX_HASH_MB = 4096
+HASHFULL_SAMPLE = 1000 #Entries looked at for the UCI hashfull permille
+
+
+def score_to_tt(score: int, ply: int, mate_bound: int) -> int:
+    """Mate scores relative to the node at ply instead of the root."""
+    if score >= mate_bound:
+        return score + ply
+    if score <= -mate_bound:
+        return score - ply
+    return score
+
+
+def score_from_tt(score: int, ply: int, mate_bound: int) -> int:
+    """Undo score_to_tt for a node at ply."""
+    if score >= mate_bound:
+        return score - ply
+    if score <= -mate_bound:
+        return score + ply
+    return score
+
+
+class TranspositionTable:
+    """Fixed size table of search results with depth-preferred and always-replace entries."""
+
+    __slots__ = ('mask', 'keys', 'scores', 'moves', 'depths', 'bounds', 'ages', 'age')
+
+    def __init__(self, size_mb: int = DEFAULT_HASH_MB):
+        buckets = max(1, size_mb * 2**20 // (2 * ENTRY_BYTES))
+        buckets = 1 << (buckets.bit_length() - 1) #Power of two so the key can be masked
+        self.mask = buckets - 1
+        self.keys = array('Q', bytes(16 * buckets))
+        self.scores = array('i', bytes(8 * buckets))
+        self.moves = array('H', bytes(4 * buckets))
+        self.depths = bytearray(2 * buckets)
+        self.bounds = bytearray(2 * buckets) #0 marks an empty entry
+        self.ages = bytearray(2 * buckets)
+        self.age = 0
+
+    def __len__(self) -> int:
+        return len(self.bounds)
+
+    def clear(self):
+        """Forget every entry (ucinewgame)."""
+        size = len(self.bounds)
+        self.bounds = bytearray(size)
+        self.ages = bytearray(size)
+        self.age = 0
+
+    def new_search(self):
+        """Mark the entries stored so far as old, they stay usable but are the first to go."""
+        self.age = (self.age + 1) & 255
+
+    def probe(self, key: int) -> tuple:
+        """(move, depth, score, bound) stored for the key, None when missing."""
+        i = (key & self.mask) << 1
+        keys = self.keys
+        if keys[i] != key or not self.bounds[i]:
+            i += 1
+            if keys[i] != key or not self.bounds[i]:
+                return None
+        return self.moves[i], self.depths[i], self.scores[i], self.bounds[i]
+
+    def store(self, key: int, depth: int, score: int, bound: int, move: int):
+        i = (key & self.mask) << 1
+        if self.keys[i] == key:
+            #Same position, keep the old best move if this search found none
+            if move == NULL_MOVE:
+                move = self.moves[i]
+        elif self.bounds[i] and depth < self.depths[i] and self.ages[i] == self.age:
+            i += 1
+            if self.keys[i] == key and move == NULL_MOVE:
+                move = self.moves[i]
+        self.keys[i] = key
+        self.depths[i] = depth
+        self.scores[i] = score
+        self.bounds[i] = bound
+        self.moves[i] = move
+        self.ages[i] = self.age
+
+    def hashfull(self) -> int:
+        """Permille of the first entries filled by the current search, as UCI reports it."""
+        sample = min(HASHFULL_SAMPLE, len(self.bounds))
+        bounds = self.bounds
+        ages = self.ages
+        age = self.age
+        used = sum(1 for i in range(sample) if bounds[i] and ages[i] == age)
+        return used * 1000 // sample
+
+
+SHARED_BUCKET_BYTES = 32 #Two entries of two 64-bit words
+SHARED_HEADER_WORDS = 2  #Search age, then padding so buckets stay 16 byte aligned
+SCORE_OFFSET = 1 << 31   #Scores are stored unsigned in the high 32 bits
+AGE_MASK = 63            #Ages share the low byte with the bound
+
+
+class SharedTranspositionTable:
+    """TranspositionTable in a shared memory block, probed and stored without locks.
+
+    Created with a size by the main process and attached by name in the helpers.
+    Entry data: score << 32 | move << 16 | depth << 8 | bound << 6 | age.
+    """
+
+    __slots__ = ('shm', 'words', 'mask', 'owner')
+
+    def __init__(self, size_mb: int = DEFAULT_HASH_MB, name: str = None):
+        if name is None:
+            buckets = max(1, size_mb * 2**20 // SHARED_BUCKET_BYTES)
+            buckets = 1 << (buckets.bit_length() - 1)
+            self.shm = shared_memory.SharedMemory(create=True, size=8 * SHARED_HEADER_WORDS + buckets * SHARED_BUCKET_BYTES)
+            self.owner = True
+        else:
+            #Helpers are children of the creating process and share its resource tracker, which frees the block
+            #only if every process died without close()
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.words = self.shm.buf.cast('Q')
+        self.mask = (len(self.words) - SHARED_HEADER_WORDS) // 4 - 1
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def age(self) -> int:
+        return self.words[0]
+
+    def __len__(self) -> int:
+        return (self.mask + 1) * 2
+
+    def clear(self):
+        """Forget every entry (ucinewgame)."""
+        self.shm.buf[:] = bytes(len(self.shm.buf))
+
+    def new_search(self):
+        """Mark the entries stored so far as old, for every process sharing the table."""
+        self.words[0] = (self.words[0] + 1) & AGE_MASK
+
+    def probe(self, key: int) -> tuple:
+        """(move, depth, score, bound) stored for the key, None when missing or torn."""
+        words = self.words
+        i = ((key & self.mask) << 2) + SHARED_HEADER_WORDS
+        data = words[i + 1]
+        if not data or words[i] ^ data != key:
+            i += 2
+            data = words[i + 1]
+            if not data or words[i] ^ data != key:
+                return None
+        return (data >> 16) & 0xFFFF, (data >> 8) & 255, (data >> 32) - SCORE_OFFSET, (data >> 6) & 3
+
+    def store(self, key: int, depth: int, score: int, bound: int, move: int):
+        words = self.words
+        age = words[0]
+        i = ((key & self.mask) << 2) + SHARED_HEADER_WORDS
+        data = words[i + 1]
+        if data and words[i] ^ data == key:
+            #Same position, keep the old best move if this search found none
+            if move == NULL_MOVE:
+                move = (data >> 16) & 0xFFFF
+        elif data and depth < (data >> 8) & 255 and data & AGE_MASK == age:
+            i += 2
+            data = words[i + 1]
+            if data and words[i] ^ data == key and move == NULL_MOVE:
+                move = (data >> 16) & 0xFFFF
+        data = (score + SCORE_OFFSET) << 32 | move << 16 | depth << 8 | bound << 6 | age
+        words[i] = key ^ data
+        words[i + 1] = data
+
+    def hashfull(self) -> int:
+        """Permille of the first entries filled by the current search, as UCI reports it."""
+        words = self.words
+        age = words[0]
+        sample = min(HASHFULL_SAMPLE, len(self))
+        used = 0
+        for entry in range(sample):
+            data = words[SHARED_HEADER_WORDS + 2 * entry + 1]
+            if data and data & AGE_MASK == age:
+                used += 1
+        return used * 1000 // sample
+
+    def close(self):
+        """Detach from the block, the creating process also frees it."""
+        self.words.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
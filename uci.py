@@ -1,69 +1,73 @@
+import multiprocessing
 import sys
+import threading
 import time
 from board import Board
 from fen import fen_to_board, board_to_fen
-from move_gen import generate_legal_moves
+from move_gen import legal_moves
 from make_move import make_move
-from perft import perft, index_to_algebraic
-from constants import STARTING_FEN, DEFAULT_MOVES_TO_GO, TIME_SAFETY_MARGIN_MS, MIN_THINK_TIME_MS
+from move_encoding import new_move_buffer, encode_move, square_name, square_from_name
+from backends import get_backend, BACKEND_NAMES, DEFAULT_BACKEND
+from perft_table import PerftTable, DEFAULT_PERFT_HASH_MB
+from tt import TranspositionTable, DEFAULT_HASH_MB, MAX_HASH_MB
+from search import SearchControl, PRUNING_OPTIONS, MAX_DEPTH
+from smp import LazySMP, MAX_THREADS
+from timeman import TimeManager, allocate_time
+from bitbase import Bitbases
+from constants import QUIET, PROMO_FLAG, PIECE_CHARS, STARTING_FEN, TIME_SAFETY_MARGIN_MS, MIN_THINK_TIME_MS
 
 ENGINE_NAME = "SCE"
 ENGINE_AUTHOR = "I-AM-SENTIENT"
 
 
-def algebraic_to_index(alg: str) -> int:
-    """Convert algebraic notation to 120-index."""
-    file = ord(alg[0]) - ord('a')  # 0-7
-    rank = int(alg[1])  # 1-8
-    #Directly convert to 120 index
-    return 21 + (8 - rank) * 10 + file
+PROMO_CHARS = 'nbrq' #Indexed by the low 2 bits of a promotion flag
 
 
-def move_to_uci(move: tuple) -> str:
-    """Convert internal move tuple to UCI string (e.g., 'e2e4')."""
-    from_sq = index_to_algebraic(move[0])
-    to_sq = index_to_algebraic(move[1])
+def move_to_uci(move: int) -> str:
+    """Convert packed move to UCI string (e.g., 'e2e4')."""
+    uci = square_name(move & 63) + square_name((move >> 6) & 63)
     
     #Handle promotion
-    if len(move) > 2 and move[2]:
-        flag = move[2]
-        if flag.startswith('promo_'):
-            promo_piece = flag[-1]  #'q', 'r', 'b', 'n'
-            return from_sq + to_sq + promo_piece
+    if move & (PROMO_FLAG << 12):
+        uci += PROMO_CHARS[(move >> 12) & 3]
     
-    return from_sq + to_sq
+    return uci
 
 
-def uci_to_move(board: Board, uci_str: str) -> tuple:
-    """Convert UCI string to internal move tuple."""
-    from_sq = algebraic_to_index(uci_str[0:2])
-    to_sq = algebraic_to_index(uci_str[2:4])
+def uci_to_move(board: Board, uci_str: str) -> int:
+    """Convert UCI string to packed move, the promotion letter in either case."""
+    uci_str = uci_str.lower()
+    from_sq = square_from_name(uci_str[0:2])
+    to_sq = square_from_name(uci_str[2:4])
     
     #Check for promotion
     promo = None
     if len(uci_str) == 5:
-        promo_char = uci_str[4]
-        promo = f'promo_{promo_char}'
+        promo = PROMO_CHARS.index(uci_str[4])
     
     #Find matching legal move (to get correct flags)
-    legal_moves = generate_legal_moves(board)
-    for move in legal_moves:
-        if move[0] == from_sq and move[1] == to_sq:
-            if promo:
-                if len(move) > 2 and move[2] == promo:
+    for move in legal_moves(board):
+        if move & 63 == from_sq and (move >> 6) & 63 == to_sq:
+            flag = move >> 12
+            if promo is not None:
+                if flag & PROMO_FLAG and flag & 3 == promo:
                     return move
             else:
                 #For non-promotion moves, return first match
                 #This handles castling, en passant, double push flags
-                if len(move) <= 2 or not move[2].startswith('promo_'):
+                if not flag & PROMO_FLAG:
                     return move
     
     #Fallback (shouldn't happen with legal input)
-    return (from_sq, to_sq, promo) if promo else (from_sq, to_sq)
+    return encode_move(from_sq, to_sq, (PROMO_FLAG | promo) if promo is not None else QUIET)
 
 
 def parse_position(board: Board, tokens: list):
-    """Parse 'position' command."""
+    """Parse 'position' command.
+
+    The moves are made on the board, so their keys stay on its undo stack where
+    the search finds the repetitions of the game.
+    """
     if not tokens:
         return
     token_index = 0
@@ -89,15 +93,107 @@ def parse_position(board: Board, tokens: list):
             token_index += 1
 
 
-def parse_go(board: Board, tokens: list) -> str:
-    """Parse 'go' command and return best move."""
+#(min, max) of each spin option, setoption clamps values into them
+SPIN_LIMITS = {
+    'Hash': (1, MAX_HASH_MB),
+    'PerftHash': (0, 4096),
+    'Threads': (1, MAX_THREADS),
+    'MoveOverhead': (0, 5000),
+}
+
+
+def default_options() -> dict:
+    """Values of the UCI options before any setoption."""
+    options = {
+        'Backend': DEFAULT_BACKEND,
+        'Hash': DEFAULT_HASH_MB,            #MB of search transposition table
+        'PerftHash': DEFAULT_PERFT_HASH_MB, #MB of perft transposition table, 0 turns it off
+        'Threads': 1,                       #Search processes, more than one searches with Lazy SMP (smp.py)
+        'MoveOverhead': TIME_SAFETY_MARGIN_MS, #ms lost per move to the GUI and the connection, kept off the clock
+        'Bitbases': True,                   #Look up endgames of three pieces or fewer (bitbase.py)
+    }
+    #Check options switching each part of the selective search on or off
+    options.update(dict.fromkeys(PRUNING_OPTIONS, True))
+    return options
+
+
+def print_options():
+    """The option lines of the reply to 'uci'."""
+    defaults = default_options()
+    send(f"option name Backend type combo default {DEFAULT_BACKEND} " + ' '.join(f"var {name}" for name in BACKEND_NAMES))
+    for name, (low, high) in SPIN_LIMITS.items():
+        send(f"option name {name} type spin default {defaults[name]} min {low} max {high}")
+    for name in ('Bitbases', *PRUNING_OPTIONS):
+        send(f"option name {name} type check default {str(defaults[name]).lower()}")
+
+
+def parse_setoption(options: dict, tokens: list):
+    """Parse 'setoption name <id> [value <x>]' into the options dict."""
+    if 'name' not in tokens:
+        return
+    name_index = tokens.index('name') + 1
+    value_index = tokens.index('value') if 'value' in tokens else len(tokens)
+    name = ' '.join(tokens[name_index:value_index])
+    value = ' '.join(tokens[value_index + 1:])
+    for option in options:
+        #Option names are case-insensitive in UCI
+        if option.lower() == name.lower():
+            if option == 'Backend' and value not in BACKEND_NAMES:
+                return
+            if isinstance(options[option], bool):
+                #Check options, 'true' or 'false'
+                if value.lower() not in ('true', 'false'):
+                    return
+                value = value.lower() == 'true'
+            elif isinstance(options[option], int):
+                #Spin options, ignore values that are not numbers
+                try:
+                    low, high = SPIN_LIMITS[option]
+                    value = min(high, max(low, int(value)))
+                except ValueError:
+                    return
+            options[option] = value
+            return
+
+
+OUTPUT_LOCK = threading.Lock() #The search thread and the input loop both write to stdout
+
+
+def send(line: str):
+    """Write one line to the GUI, whole even while another thread writes."""
+    with OUTPUT_LOCK:
+        print(line, flush=True)
+
+
+def parse_go(board: Board, tokens: list, options: dict = None, tt: TranspositionTable = None) -> str:
+    """Parse 'go' command and return best move.
+
+    tt is the search's transposition table, the caller keeps it between go commands.
+    """
+    return go(board, tokens, options, tt)[0]
+
+
+def go(board: Board, tokens: list, options: dict = None, tt: TranspositionTable = None, control: SearchControl = None,
+       smp: LazySMP = None, debug: bool = False, bitbases: Bitbases = None) -> tuple:
+    """Run a 'go' command, returning (best move, ponder move) in UCI notation, None for missing ones.
+
+    control lets another thread stop the search, without one go infinite never ends.
+    smp searches with its helper processes and its shared table instead of tt.
+    debug adds the search stats to the info of each iteration ('debug on').
+    bitbases are probed by the search while the Bitbases option is on.
+    """
     from search import search
+    if options is None:
+        options = default_options()
+    backend = options['Backend']
     
     #Check for perft
     if tokens and tokens[0] == 'perft':
         depth = int(tokens[1]) if len(tokens) > 1 else 1
-        run_perft_from_uci(board, depth)
-        return None
+        #go perft <depth> [jobs <n>], jobs > 1 counts the subtrees in worker processes
+        jobs = int(tokens[tokens.index('jobs') + 1]) if 'jobs' in tokens[:-1] else 1
+        run_perft_from_uci(board, depth, backend, options['PerftHash'], jobs)
+        return None, None
     
     #Parse time parameters
     wtime = None
@@ -108,6 +204,7 @@ def parse_go(board: Board, tokens: list) -> str:
     movetime = None
     depth = None
     infinite = False
+    ponder = False
     
     i = 0
     while i < len(tokens):
@@ -135,70 +232,144 @@ def parse_go(board: Board, tokens: list) -> str:
         elif tokens[i] == 'infinite':
             infinite = True
             i += 1
+        elif tokens[i] == 'ponder':
+            #Same limits as a normal go, the clock starts at ponderhit (see SearchControl)
+            ponder = True
+            i += 1
         else:
             i += 1
     
-    #Calculate allocated time
+    #Calculate allocated time, the time manager stops deepening in time and the search itself at its hard limit
+    overhead = options['MoveOverhead']
+    time_manager = None
     if movetime is not None:
-        time_to_use = movetime
+        time_to_use = max(MIN_THINK_TIME_MS, movetime - overhead)
+        time_manager = TimeManager(time_to_use, time_to_use)
     elif infinite:
         time_to_use = None  # No time limit
     elif wtime is not None and btime is not None:
         #Determine our time
         our_time = wtime if board.side_to_move == 0 else btime
         our_inc = winc if board.side_to_move == 0 else binc
-        
-        #Moves to go
-        moves_left = movestogo if movestogo else DEFAULT_MOVES_TO_GO
-        
-        #Simple time allocation: remaining_time / moves_left + increment * 0.9
-        time_to_use = max(
-            MIN_THINK_TIME_MS,
-            (our_time // moves_left) + int(our_inc * 0.9) - TIME_SAFETY_MARGIN_MS
-        )
+        soft_ms, time_to_use = allocate_time(our_time, our_inc, movestogo, overhead)
+        time_manager = TimeManager(soft_ms, time_to_use)
     else:
         time_to_use = None
+    #Searches ended by the clock or by stop deepen as far as they get
+    if depth is None and (time_to_use is not None or infinite or ponder):
+        depth = MAX_DEPTH
     
     #Define info callback for UCI output during search
-    def uci_info(depth, score, nodes, nps, time_ms):
-        print(f"info depth {depth} score cp {score} nodes {nodes} nps {nps} time {time_ms}")
+    last_pv = []
+    def uci_info(depth, score, nodes, nps, time_ms, qnodes, hashfull, cutoff_rate, pv, stats):
+        last_pv[:] = pv
+        pv_uci = ' '.join(move_to_uci(move) for move in pv)
+        send(f"info depth {depth} score cp {score} nodes {nodes} nps {nps} hashfull {hashfull} time {time_ms} pv {pv_uci}")
+        #qnodes and the cutoff rate are not UCI info fields, report them as a string
+        send(f"info string qnodes {qnodes} of {nodes} nodes, {cutoff_rate:.1%} of cutoffs on the first move")
+        if debug:
+            send(f"info string stats {stats}")
     
     #Search for best move
-    best_move, score, search_depth = search(board, depth, time_to_use, uci_info)
+    pruning = {name: options[name] for name in PRUNING_OPTIONS}
+    if not options['Bitbases']:
+        bitbases = None
+    if smp is not None:
+        best_move, score, search_depth = smp.search(board, depth, time_to_use, uci_info, backend, pruning, control, time_manager,
+                                                    bitbases)
+    else:
+        best_move, score, search_depth = search(board, depth, time_to_use, uci_info, backend, tt, pruning, control,
+                                                time_manager=time_manager, bitbases=bitbases)
     
-    if best_move:
-        return move_to_uci(best_move)
-    return None
+    if not best_move:
+        return None, None
+    #The reply the principal variation expects is the move to ponder on
+    ponder_move = last_pv[1] if len(last_pv) > 1 and last_pv[0] == best_move else None
+    return move_to_uci(best_move), move_to_uci(ponder_move) if ponder_move else None
 
 
-def run_perft_from_uci(board: Board, depth: int):
-    """Run perft and print results in UCI format."""
+def search_thread(board: Board, tokens: list, options: dict, tt: TranspositionTable, control: SearchControl,
+                  smp: LazySMP = None, debug: bool = False, bitbases: Bitbases = None):
+    """Body of the search thread of uci_loop, sends bestmove once the search is over and released."""
+    best_move, ponder_move = go(board, tokens, options, tt, control, smp, debug, bitbases)
+    #Pondering and go infinite keep the result until ponderhit or stop
+    control.released.wait()
+    if best_move is None:
+        send("bestmove 0000")
+    elif ponder_move:
+        send(f"bestmove {best_move} ponder {ponder_move}")
+    else:
+        send(f"bestmove {best_move}")
+
+
+def run_perft_from_uci(board: Board, depth: int, backend: str = DEFAULT_BACKEND, hash_mb: int = 0, jobs: int = 1):
+    """Run perft and print results in UCI format, hashed when hash_mb > 0.
+
+    With jobs > 1 the subtrees are counted by a pool of processes, the output is the same.
+    """
     import time
+    from perft import parallel_divide
     
-    moves = generate_legal_moves(board)
+    ops = get_backend(backend)
+    position = ops.from_board(board)
+    table = PerftTable(hash_mb) if hash_mb > 0 else None
+    moves = new_move_buffer()
     total = 0
     start = time.time()
     
-    for move in moves:
-        undo = make_move(board, move)
-        nodes = perft(board, depth - 1) if depth > 1 else 1
-        from make_move import unmake_move
-        unmake_move(board, undo)
-        
-        print(f"{move_to_uci(move)}: {nodes}")
+    if jobs > 1:
+        counts, hits, probes = parallel_divide(board_to_fen(board), depth, backend, jobs, hash_mb)
+        if table:
+            table.hits, table.probes = hits, probes
+    else:
+        counts = {}
+        for move in moves[:ops.generate_legal_moves(position, moves)]:
+            ops.make_move(position, move)
+            counts[move] = ops.perft(position, depth - 1, table=table) if depth > 1 else 1
+            ops.unmake_move(position)
+    
+    for move, nodes in counts.items():
+        send(f"{move_to_uci(move)}: {nodes}")
         total += nodes
     
     elapsed = time.time() - start
-    print(f"\nNodes searched: {total}")
-    print(f"Time: {elapsed:.3f}s")
+    send(f"\nNodes searched: {total}")
+    send(f"Time: {elapsed:.3f}s")
     if elapsed > 0:
-        print(f"NPS: {int(total / elapsed):,}")
+        send(f"NPS: {int(total / elapsed):,}")
+    if table:
+        send(f"Hash hits: {table.hits:,} of {table.probes:,} probes ({table.hit_rate():.1%})")
 
 
 def uci_loop():
-    """Main UCI communication loop."""
+    """Main UCI communication loop.
+
+    Searches run on a thread of their own so stop, ponderhit, isready and quit
+    are read while it thinks. Commands that change the board or the options
+    wait for the running search to stop first.
+    """
     board = Board()
     fen_to_board(board, STARTING_FEN)
+    options = default_options()
+    tt = TranspositionTable(options['Hash'])
+    smp = None #LazySMP while Threads is above 1, tt is then its shared table
+    bitbases = Bitbases()
+    debug = False
+    thread = None
+    control = None
+
+    def prepare_bitbases():
+        """Generate or map the bitbases on a background thread while the option is on, the search finds nothing until then."""
+        if options['Bitbases']:
+            bitbases.start()
+
+    def stop_search():
+        """Stop the running search if any, returning once its bestmove is out."""
+        nonlocal thread
+        if thread is not None:
+            control.stop()
+            thread.join()
+            thread = None
     
     while True:
         try:
@@ -215,55 +386,111 @@ def uci_loop():
         cmd = tokens[0]
         
         if cmd == 'uci':
-            print(f"id name {ENGINE_NAME}")
-            print(f"id author {ENGINE_AUTHOR}")
-            #Add options here later
-            print("uciok")
+            send(f"id name {ENGINE_NAME}")
+            send(f"id author {ENGINE_AUTHOR}")
+            print_options()
+            send("uciok")
         
         elif cmd == 'isready':
-            print("readyok")
+            prepare_bitbases()
+            send("readyok")
+        
+        elif cmd == 'debug':
+            #debug on|off, the search stats go out as info strings while on
+            debug = len(tokens) > 1 and tokens[1] == 'on'
+        
+        elif cmd == 'stop':
+            stop_search()
+        
+        elif cmd == 'ponderhit':
+            if thread is not None:
+                control.ponderhit()
+        
+        elif cmd == 'quit':
+            stop_search()
+            break
+        
+        elif cmd == 'setoption':
+            stop_search()
+            hash_mb, threads = options['Hash'], options['Threads']
+            parse_setoption(options, tokens[1:])
+            if options['Hash'] != hash_mb or options['Threads'] != threads:
+                if smp is not None:
+                    smp.close()
+                    smp = None
+                if options['Threads'] > 1:
+                    smp = LazySMP(options['Threads'], options['Hash'])
+                    tt = smp.tt
+                else:
+                    tt = TranspositionTable(options['Hash'])
+            prepare_bitbases()
         
         elif cmd == 'ucinewgame':
+            stop_search()
             board = Board()
             fen_to_board(board, STARTING_FEN)
+            tt.clear()
+            prepare_bitbases()
         
         elif cmd == 'position':
+            stop_search()
             parse_position(board, tokens[1:])
         
         elif cmd == 'go':
-            best_move = parse_go(board, tokens[1:])
-            if best_move:
-                print(f"bestmove {best_move}")
+            stop_search()
+            if len(tokens) > 1 and tokens[1] == 'perft':
+                go(board, tokens[1:], options, tt)
+            else:
+                prepare_bitbases()
+                control = SearchControl(pondering='ponder' in tokens, infinite='infinite' in tokens)
+                thread = threading.Thread(target=search_thread,
+                                          args=(board, tokens[1:], options, tt, control, smp, debug, bitbases), daemon=True)
+                thread.start()
+        
+        elif cmd == 'bench':
+            stop_search()
+            #bench [depth], fixed-depth search of the test positions, the node count is the engine's signature
+            from search import bench, BENCH_DEPTH
+            depth = int(tokens[1]) if len(tokens) > 1 else BENCH_DEPTH
+            nodes, elapsed = bench(depth, options['Backend'])
+            send(f"Nodes searched: {nodes}")
+            send(f"Time: {elapsed:.3f}s")
+            if elapsed > 0:
+                send(f"NPS: {int(nodes / elapsed):,}")
         
         elif cmd == 'd':
+            stop_search()
             #Debug: print board and FEN
             print_board(board)
-            print(f"\nFEN: {board_to_fen(board)}")
-        
-        elif cmd == 'quit':
-            break
+            send(f"\nFEN: {board_to_fen(board)}")
         
         #Flush output for GUI communication
         sys.stdout.flush()
+    stop_search()
+    if smp is not None:
+        smp.close()
+    bitbases.close()
 
 
 def print_board(board: Board):
-    """Print board for debugging."""
-    print("\n  +---+---+---+---+---+---+---+---+")
+    """Print board for debugging, each line through send()."""
+    send("\n  +---+---+---+---+---+---+---+---+")
     for rank in range(8):
-        print(" |", end="")
+        row = " |"
         for file in range(8):
             square_index = rank * 8 + file
             sq120 = board.mailbox64[square_index]
             piece = board.board_play[sq120]
-            char = piece if piece != 0 else ' '
-            print(f" {char} |", end="")
-        print("\n  +---+---+---+---+---+---+---+---+")
-    print("    a   b   c   d   e   f   g   h\n")
+            char = PIECE_CHARS[piece] if piece != 0 else ' '
+            row += f" {char} |"
+        send(row)
+        send("  +---+---+---+---+---+---+---+---+")
+    send("    a   b   c   d   e   f   g   h\n")
     
     side = "White" if board.side_to_move == 0 else "Black"
-    print(f"Side to move: {side}")
+    send(f"Side to move: {side}")
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     uci_loop()
\ No newline at end of file
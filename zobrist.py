@@ -0,0 +1,45 @@
+"""Zobrist keys for SCE positions.
+
+The key tables are filled from a fixed seed so that a position always hashes
+to the same 64-bit value between runs (needed for stored tables and tests).
+"""
+import random
+from constants import PIECE_CODES, NUM_PIECE_CODES
+
+_rng = random.Random(0x5CE5CE)
+
+#One key per piece code per 120-square so make_move can index without converting
+PIECE_KEYS = [[0] * 120 for _ in range(NUM_PIECE_CODES)]
+for _piece in PIECE_CODES:
+    PIECE_KEYS[_piece] = [_rng.getrandbits(64) for _ in range(120)]
+
+SIDE_KEY = _rng.getrandbits(64) #XORed in when black is to move
+
+#Castling keys in order: white short, white long, black short, black long
+CASTLE_KEYS = [_rng.getrandbits(64) for _ in range(4)]
+
+#Combined key for each value of the castling rights bitmask
+CASTLE_HASH = [0] * 16
+for _rights in range(16):
+    for _bit in range(4):
+        if _rights & (1 << _bit):
+            CASTLE_HASH[_rights] ^= CASTLE_KEYS[_bit]
+
+#En passant keys by file a-h
+EN_PASSANT_KEYS = [_rng.getrandbits(64) for _ in range(8)]
+
+
+def compute_hash(board) -> int:
+    """Compute the key of a position from scratch."""
+    key = 0
+    for index64 in range(64):
+        sq120 = board.mailbox64[index64]
+        piece = board.board_play[sq120]
+        if piece != 0:
+            key ^= PIECE_KEYS[piece][sq120]
+    if board.side_to_move == 1:
+        key ^= SIDE_KEY
+    key ^= CASTLE_HASH[board.castling]
+    if board.ep_square != -1:
+        key ^= EN_PASSANT_KEYS[(board.ep_square % 10) - 1]
+    return key